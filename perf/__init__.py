@@ -25,3 +25,14 @@ __all__.extend(('is_significant', 'python_implementation', 'python_has_jit'))
 
 from perf._bench import Run, Benchmark, BenchmarkSuite, add_runs  # noqa
 __all__.extend(('Run', 'Benchmark', 'BenchmarkSuite', 'add_runs'))
+
+from perf._sample_file import SampleFile  # noqa
+__all__.append('SampleFile')
+
+from perf._stats import (bootstrap_median_ci, bootstrap_ratio_ci,  # noqa
+                         geometric_mean_speed)
+__all__.extend(('bootstrap_median_ci', 'bootstrap_ratio_ci',
+                'geometric_mean_speed'))
+
+from perf._store import ResultStore  # noqa
+__all__.append('ResultStore')
@@ -6,18 +6,30 @@ import errno
 import os.path
 import sys
 
-from perf._metadata import _common_metadata
-from perf._cli import (display_runs, display_stats, display_metadata,
-                       warn_if_bench_unstable, display_histogram,
-                       display_benchmark)
-from perf._utils import (format_timedelta, format_seconds, parse_run_list,
-                         get_isolated_cpus, parse_cpu_list, set_cpu_affinity)
-import perf.text_runner
+import perf
+from perf._utils import (format_timedelta, format_seconds, format_number,
+                         parse_run_list, get_isolated_cpus, parse_cpu_list,
+                         set_cpu_affinity, parse_iso8601, UNIT_FORMATTERS,
+                         FORMATS, SIGNIFICANCE_TESTS, _is_significant_summary,
+                         _is_significant_welch_summary, _welch_tscore_summary,
+                         _is_significant_mann_whitney)
 
 
-def create_parser():
+def _create_runner(name, cmd):
+    import perf.text_runner
+    return perf.text_runner.TextRunner(name=name, _argparser=cmd)
+
+
+def create_parser(action=None):
+    # Only create the TextRunner of the action: TextRunner adds its options
+    # to the parser of the command, and perf.text_runner is slow to import.
+    # Return (parser, runner) where runner is None if the action doesn't
+    # run a benchmark.
+    from perf._stats import OUTLIER_METHODS, CORRECTION_METHODS
+
     parser = argparse.ArgumentParser(description='Display benchmark results.',
                                      prog='-m perf')
+    runner = None
     subparsers = parser.add_subparsers(dest='action')
 
     def input_filenames(cmd):
@@ -27,6 +39,19 @@ def create_parser():
                          type=str, nargs='+',
                          help='Benchmark file')
 
+    def output_format(cmd):
+        cmd.add_argument('--format', choices=FORMATS, default='text',
+                         help='Output format: human readable text (default), '
+                              'JSON Lines or CSV')
+
+    def inner_loops_type(value):
+        if value == 'auto':
+            return value
+        value = int(value)
+        if value <= 0:
+            raise ValueError("value must be > 0")
+        return value
+
     # show
     cmd = subparsers.add_parser('show', help='Display a benchmark')
     cmd.add_argument('-q', '--quiet',
@@ -39,6 +64,10 @@ def create_parser():
                      help='display statistics (min, max, ...)')
     cmd.add_argument('-d', '--dump', action="store_true",
                      help='display benchmark run results')
+    cmd.add_argument('--check', action="store_true",
+                     help='warn if the distribution of samples has '
+                          'multiple modes')
+    output_format(cmd)
     input_filenames(cmd)
 
     # hist
@@ -57,6 +86,15 @@ def create_parser():
                          help='enable quiet mode')
         cmd.add_argument('-v', '--verbose', action="store_true",
                          help='enable verbose mode')
+        cmd.add_argument('--test', choices=sorted(SIGNIFICANCE_TESTS),
+                         default='student',
+                         help="Significance test: Student's t-test, Welch's "
+                              "t-test (unequal variances) or Mann-Whitney U "
+                              "test (non-parametric) (default: student)")
+        cmd.add_argument('--correction', choices=list(CORRECTION_METHODS),
+                         help='Correct p-values for multiple comparisons: '
+                              'Holm-Bonferroni (holm) or Benjamini-Hochberg '
+                              'false discovery rate (fdr)')
         if command == 'compare_to':
             cmd.add_argument('-G', '--group-by-speed', action="store_true",
                              help='group slower/faster/same speed')
@@ -64,10 +102,16 @@ def create_parser():
                              help='Absolute minimum of speed in percent to '
                                   'consider that a benchmark is significant '
                                   '(default: 0%%)')
+            cmd.add_argument('--weights', metavar='FILENAME',
+                             help='JSON file mapping benchmark names to '
+                                  'their weight in the geometric mean of '
+                                  'speeds (default: 1.0)')
+        output_format(cmd)
         input_filenames(cmd)
 
     # stats
     cmd = subparsers.add_parser('stats', help='Compute statistics')
+    output_format(cmd)
     input_filenames(cmd)
 
     # metadata
@@ -78,10 +122,38 @@ def create_parser():
 
     # timeit
     cmd = subparsers.add_parser('timeit', help='Quick Python microbenchmark')
-    timeit_runner = perf.text_runner.TextRunner(name='timeit', _argparser=cmd)
+    if action == 'timeit':
+        runner = _create_runner('timeit', cmd)
     cmd.add_argument('-s', '--setup', action='append', default=[],
                      help='setup statements')
-    cmd.add_argument('stmt', nargs='+', help='executed statements')
+    cmd.add_argument('--statement', nargs=2, metavar=('NAME', 'STMT'),
+                     action='append', default=[],
+                     help='named statement: benchmark multiple statements '
+                          'sharing the same setup in the same processes')
+    cmd.add_argument('--inner-loops', type=inner_loops_type, default=None,
+                     help='number of copies of the statement in the loop, '
+                          '"auto" means computed from the overhead '
+                          'of the loop (default: 1)')
+    cmd.add_argument('stmt', nargs='*', help='executed statements')
+
+    # command
+    cmd = subparsers.add_parser('command',
+                                help='Benchmark an external command')
+    if action == 'command':
+        runner = _create_runner('command', cmd)
+    cmd.add_argument('command', nargs='*',
+                     help='command and its arguments, '
+                          'ex: "-- python3 -c pass"')
+
+    # import
+    cmd = subparsers.add_parser('import',
+                                help='Benchmark the cold import of a module')
+    if action == 'import':
+        runner = _create_runner('import', cmd)
+    cmd.add_argument('--top', type=int, default=10,
+                     help='number of heaviest imported modules stored '
+                          'and displayed (default: 10)')
+    cmd.add_argument('module', help='name of the imported module')
 
     # convert
     cmd = subparsers.add_parser('convert', help='Modify benchmarks')
@@ -101,7 +173,17 @@ def create_parser():
     cmd.add_argument('--include-runs', help='Only keep benchmark runs RUNS')
     cmd.add_argument('--exclude-runs', help='Remove specified benchmark runs')
     cmd.add_argument('--remove-outliers', action='store_true',
-                     help='Remove outlier runs')
+                     help='Remove outlier samples')
+    cmd.add_argument('--outlier-method', default='iqr',
+                     choices=tuple(OUTLIER_METHODS), metavar='METHOD',
+                     help='Method used by --remove-outliers: %s '
+                          '(default: iqr)' % ', '.join(OUTLIER_METHODS))
+    cmd.add_argument('--outlier-threshold', type=float, metavar='THRESHOLD',
+                     help='Threshold of the outlier method: factor of the '
+                          'IQR (default: %s) or of the MAD (default: %s), '
+                          'or percent of samples trimmed on each side '
+                          '(default: %s)'
+                          % tuple(OUTLIER_METHODS.values()))
     cmd.add_argument('--indent', action='store_true',
                      help='Indent JSON (rather using compact JSON)')
     cmd.add_argument('--remove-warmups', action='store_true',
@@ -117,6 +199,77 @@ def create_parser():
                      help='Update metadata: METADATA is a comma-separated '
                           'list of KEY=VALUE')
 
+    # compact
+    cmd = subparsers.add_parser('compact',
+                                help='Merge the records of a benchmark '
+                                     'journal file')
+    cmd.add_argument('filename', metavar='file.json',
+                     help='Benchmark file written by --append')
+    cmd.add_argument('--indent', action='store_true',
+                     help='Indent JSON (rather using compact JSON)')
+
+    # store
+    cmd = subparsers.add_parser('store',
+                                help='Store benchmark suites into a SQLite '
+                                     'database')
+    cmd.add_argument('database', help='SQLite database filename')
+    cmd.add_argument('filenames', metavar='file.json',
+                     type=str, nargs='+',
+                     help='Benchmark file')
+
+    # query
+    cmd = subparsers.add_parser('query',
+                                help='Query benchmarks of a SQLite database')
+    cmd.add_argument('database', help='SQLite database filename')
+    cmd.add_argument('-b', '--name',
+                     help='only display the benchmark called NAME')
+    cmd.add_argument('--hostname',
+                     help='only display benchmarks run on HOSTNAME')
+    cmd.add_argument('--python-version', metavar='VERSION',
+                     help='only display benchmarks run on Python VERSION '
+                          '(ex: "3.5" or "3.5.2")')
+    since = cmd.add_mutually_exclusive_group()
+    since.add_argument('--since', metavar='DATE',
+                       help='only display benchmarks run since DATE '
+                            '(ISO 8601 format, ex: 2016-09-30)')
+    since.add_argument('--days', type=int,
+                       help='only display benchmarks run in the last DAYS '
+                            'days')
+    cmd.add_argument('--until', metavar='DATE',
+                     help='only display benchmarks run before DATE '
+                          '(ISO 8601 format)')
+    cmd.add_argument('-o', '--output', metavar='DIRECTORY',
+                     help='Write benchmark suites as JSON files into '
+                          'DIRECTORY rather than displaying a table')
+
+    # plan
+    cmd = subparsers.add_parser('plan',
+                                help='Recommend the number of processes, '
+                                     'samples and loops')
+    cmd.add_argument('--effect', type=float, default=5.0, metavar='PERCENT',
+                     help='Minimum detectable effect in percent '
+                          '(default: 5%%)')
+    cmd.add_argument('--power', type=float, default=0.8,
+                     help='Probability to detect the effect '
+                          '(default: 0.8)')
+    input_filenames(cmd)
+
+    # trend
+    cmd = subparsers.add_parser('trend',
+                                help='Detect changes of benchmarks over '
+                                     'time')
+    cmd.add_argument('-v', '--verbose', action='store_true',
+                     help='display the median of each result')
+    cmd.add_argument('--min-shift', type=float, default=5.0,
+                     metavar='PERCENT',
+                     help='Minimum shift of the median in percent to report '
+                          'a change (default: 5%%)')
+    cmd.add_argument('-b', '--name',
+                     help='only display the benchmark called NAME')
+    cmd.add_argument('filenames', metavar='file.json',
+                     type=str, nargs='+',
+                     help='Benchmark file, or directory of benchmark files')
+
     # dump
     cmd = subparsers.add_parser('dump', help='Dump the runs')
     cmd.add_argument('-v', '--verbose', action='store_true',
@@ -131,9 +284,10 @@ def create_parser():
     cmd = subparsers.add_parser('slowest', help='List benchmarks which took most of the time')
     cmd.add_argument('-n', type=int, default=5,
                      help='Number of slow benchmarks to display (default: 5)')
+    output_format(cmd)
     input_filenames(cmd)
 
-    return parser, timeit_runner
+    return parser, runner
 
 
 DataItem = collections.namedtuple('DataItem', 'suite filename benchmark name title is_last')
@@ -164,17 +318,67 @@ def format_filename_func(suites):
     return format_filename
 
 
+# Minimum number of files to load them in a pool of processes
+_LOAD_POOL_MIN_FILES = 20
+# Minimum number of files to display the progress of the loading
+_LOAD_PROGRESS_MIN_FILES = 50
+
+
+def _load_suite(filename):
+    return perf.BenchmarkSuite.load(filename)
+
+
 class Benchmarks:
     def __init__(self):
         self.suites = []
+        # see _get_index()
+        self._index = None
 
     def load_benchmark_suite(self, filename):
         suite = perf.BenchmarkSuite.load(filename)
         self.suites.append(suite)
-
-    def load_benchmark_suites(self, filenames):
-        for filename in filenames:
-            self.load_benchmark_suite(filename)
+        self._index = None
+
+    def load_benchmark_suites(self, filenames, processes=None):
+        # Decoding JSON and creating runs is CPU-bound: load many files in a
+        # pool of processes. Suites are appended in the order of filenames.
+        import multiprocessing
+
+        filenames = list(filenames)
+        nfile = len(filenames)
+        if processes is None:
+            processes = multiprocessing.cpu_count()
+        # stdin can only be read by the main process
+        use_pool = (processes > 1 and nfile >= _LOAD_POOL_MIN_FILES
+                    and '-' not in filenames)
+        progress = (nfile >= _LOAD_PROGRESS_MIN_FILES
+                    and sys.stderr.isatty())
+
+        self._index = None
+        pool = None
+        try:
+            if use_pool:
+                pool = multiprocessing.Pool(min(processes, nfile))
+                chunksize = max(nfile // (processes * 4), 1)
+                suites = pool.imap(_load_suite, filenames, chunksize)
+            else:
+                suites = (_load_suite(filename) for filename in filenames)
+
+            for index, suite in enumerate(suites, 1):
+                self.suites.append(suite)
+                if progress:
+                    sys.stderr.write("\rLoading files: %s/%s" % (index, nfile))
+                    sys.stderr.flush()
+
+            if pool is not None:
+                pool.close()
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+            if progress:
+                sys.stderr.write("\n")
+                sys.stderr.flush()
 
     def include_benchmark(self, name):
         for suite in self.suites:
@@ -182,6 +386,21 @@ class Benchmarks:
                 suite._convert_include_benchmark(name)
             except KeyError:
                 fatal_missing_benchmark(suite, name)
+        self._index = None
+
+    def summarize(self):
+        from perf._bench import _summarize_benchmarks
+
+        # Compute statistics of all benchmarks at once
+        _summarize_benchmarks(bench
+                              for suite in self.suites for bench in suite)
+
+    def bootstrap(self):
+        from perf._bench import _bootstrap_benchmarks
+
+        # Compute confidence intervals of all benchmarks at once
+        _bootstrap_benchmarks(bench
+                              for suite in self.suites for bench in suite)
 
     def get_nsuite(self):
         return len(self.suites)
@@ -220,35 +439,43 @@ class Benchmarks:
 
                 yield DataItem(suite, filename, benchmark, name, title, is_last)
 
+    def _get_index(self):
+        # Index of benchmarks of all suites built in a single pass:
+        # name => list of benchmarks, one per suite (None if the suite has
+        # no benchmark with this name)
+        if self._index is not None:
+            return self._index
+
+        nsuite = len(self.suites)
+        index = {}
+        for suite_index, suite in enumerate(self.suites):
+            for name, benchmark in suite._get_index().items():
+                benchmarks = index.get(name)
+                if benchmarks is None:
+                    benchmarks = index[name] = [None] * nsuite
+                benchmarks[suite_index] = benchmark
+        self._index = index
+        return index
+
     def _group_by_name_names(self):
-        def suite_to_name_set(suite):
-            result = set()
-            for  bench in suite:
-                name = bench.get_name()
-                if name:
-                    result.add(name)
-            return result
-
-        names = suite_to_name_set(self.suites[0])
-        for suite in self.suites[1:]:
-            names &= suite_to_name_set(suite)
-        return names
+        return {name for name, benchmarks in self._get_index().items()
+                if all(benchmark is not None for benchmark in benchmarks)}
 
     def group_by_name(self):
         format_filename = format_filename_func(self.suites)
+        filenames = [format_filename(suite.filename) for suite in self.suites]
 
         show_filename = (self.get_nsuite() > 1)
 
+        index = self._get_index()
         names = self._group_by_name_names()
         names = sorted(names)
         show_name = (len(names) > 1)
 
         groups = []
-        for index, name in enumerate(names):
+        for name_index, name in enumerate(names):
             benchmarks = []
-            for suite in self.suites:
-                benchmark = suite.get_benchmark(name)
-                filename = format_filename(suite.filename)
+            for benchmark, filename in zip(index[name], filenames):
                 if show_name:
                     if not show_filename:
                         title = name
@@ -259,7 +486,7 @@ class Benchmarks:
                     title = None
                 benchmarks.append(GroupItem(benchmark, title, filename))
 
-            is_last = (index == (len(names) - 1))
+            is_last = (name_index == (len(names) - 1))
             group = GroupItem2(name, benchmarks, is_last)
             groups.append(group)
 
@@ -295,6 +522,9 @@ def display_title(title, level=1):
 
 
 def _display_common_metadata(metadatas):
+    from perf._cli import display_metadata
+    from perf._metadata import _common_metadata
+
     if len(metadatas) < 2:
         return
 
@@ -320,30 +550,79 @@ class CompareData:
     def __init__(self, name, benchmark):
         self.name = name
         self.benchmark = benchmark
+        self._samples = None
+        self._summary = None
+        self._text = None
+
+    # Samples, summary and text are only computed once: the reference is
+    # shared by all comparisons of a benchmark
+
+    @property
+    def samples(self):
+        if self._samples is None:
+            self._samples = self.benchmark.get_samples()
+        return self._samples
+
+    @property
+    def summary(self):
+        if self._summary is None:
+            self._summary = self.benchmark._get_summary()
+        return self._summary
+
+    @property
+    def text(self):
+        if self._text is None:
+            self._text = self.benchmark.format()
+        return self._text
+
+
+def format_speed_ci(speed, low, high):
+    # Format the confidence interval of a speed in the direction of the speed:
+    # bounds of a slowdown are inverted
+    if speed >= 1.0:
+        return "95%% CI: %.2fx .. %.2fx faster" % (low, high)
+    else:
+        return "95%% CI: %.2fx .. %.2fx slower" % (1.0 / high, 1.0 / low)
 
 
 class CompareResult(object):
-    def __init__(self, ref, changed):
+    def __init__(self, ref, changed, test='student'):
         self.ref = ref
         self.changed = changed
+        # name of the significance test
+        self.test = test
         self._significant = None
         self._t_score = None
         self._speed = None
+        self._speed_ci = None
+        self._shift = None
+        self._p_value = None
+        # p-value adjusted for multiple comparisons, see apply_correction()
+        self.correction = None
+        self.adjusted_p_value = None
 
     def _get_significant(self):
-        ref_samples = self.ref.benchmark.get_samples()
-        changed_samples = self.changed.benchmark.get_samples()
+        ref_summary = self.ref.summary
+        changed_summary = self.changed.summary
 
-        if len(ref_samples) == 1 and len(changed_samples) == 1:
+        if ref_summary.nsample == 1 and changed_summary.nsample == 1:
             # FIXME: is it ok to consider that comparison between two samples
             # is significant?
             self._significant = True
-            self._tscore = None
+            self._t_score = None
             return
 
         try:
-            significant, t_score = perf.is_significant(ref_samples,
-                                                       changed_samples)
+            if self.test == 'mann-whitney':
+                significant, t_score = _is_significant_mann_whitney(
+                    self.ref.samples,
+                    self.changed.samples)
+            elif self.test == 'welch':
+                significant, t_score = _is_significant_welch_summary(
+                    ref_summary, changed_summary)
+            else:
+                significant, t_score = _is_significant_summary(
+                    ref_summary, changed_summary)
             self._significant = significant
             self._t_score = t_score
         except Exception:
@@ -353,6 +632,8 @@ class CompareResult(object):
 
     @property
     def significant(self):
+        if self.adjusted_p_value is not None:
+            return self.adjusted_p_value < 0.05
         if self._significant is None:
             self._get_significant()
         return self._significant
@@ -363,6 +644,26 @@ class CompareResult(object):
             self._get_significant()
         return self._t_score
 
+    @property
+    def p_value(self):
+        from perf._stats import t_test_pvalue, normal_pvalue
+
+        # two-tailed p-value of the significance test, None if the test
+        # failed
+        if self._p_value is None and self.t_score is not None:
+            ref_summary = self.ref.summary
+            changed_summary = self.changed.summary
+            if self.test == 'mann-whitney':
+                self._p_value = normal_pvalue(self.t_score)
+            elif self.test == 'welch':
+                t_score, deg_freedom = _welch_tscore_summary(ref_summary,
+                                                             changed_summary)
+                self._p_value = t_test_pvalue(t_score, deg_freedom)
+            else:
+                deg_freedom = ref_summary.nsample + changed_summary.nsample - 2
+                self._p_value = t_test_pvalue(self.t_score, deg_freedom)
+        return self._p_value
+
     @property
     def speed(self):
         if self._speed is None:
@@ -371,9 +672,32 @@ class CompareResult(object):
             self._speed = ref_avg / changed_avg
         return self._speed
 
+    @property
+    def shift(self):
+        from perf._stats import hodges_lehmann
+
+        # Hodges-Lehmann estimate of the shift from ref to changed samples
+        if self._shift is None:
+            self._shift = hodges_lehmann(self.ref.samples,
+                                         self.changed.samples)
+        return self._shift
+
+    @property
+    def speed_ci(self):
+        # bootstrap confidence interval of the speed
+        if self._speed_ci is None:
+            self._speed_ci = perf.bootstrap_ratio_ci(
+                self.ref.samples,
+                self.changed.samples)
+        return self._speed_ci
+
+    def format_speed_ci(self):
+        low, high = self.speed_ci
+        return "Speed %s" % format_speed_ci(self.speed, low, high)
+
     def oneliner(self, verbose=True):
-        ref_text = self.ref.benchmark.format()
-        chg_text = self.changed.benchmark.format()
+        ref_text = self.ref.text
+        chg_text = self.changed.text
         if verbose:
             text = ("Median +- std dev: [%s] %s -> [%s] %s"
                     % (self.ref.name, ref_text,
@@ -391,6 +715,8 @@ class CompareResult(object):
         return text
 
     def format(self, verbose=True):
+        from perf._stats import CORRECTION_METHODS
+
         text = self.oneliner()
         lines = [text]
 
@@ -398,14 +724,29 @@ class CompareResult(object):
         if self.t_score is None:
             lines.append("ERROR when testing if samples are significant")
 
+        test = SIGNIFICANCE_TESTS[self.test]
+        if self.t_score is not None:
+            score_name = 'z' if self.test == 'mann-whitney' else 't'
+            test = "%s: %s=%.2f" % (test, score_name, self.t_score)
+        if self.adjusted_p_value is not None:
+            test = ("%s, p=%.3g, %s adjusted p=%.3g"
+                    % (test, self.p_value,
+                       CORRECTION_METHODS[self.correction],
+                       self.adjusted_p_value))
         if self.significant:
             if verbose:
-                if self.t_score is not None:
-                    lines.append("Significant (t=%.2f)" % self.t_score)
-                else:
-                    lines.append("Significant")
+                lines.append("Significant (%s)" % test)
         else:
-            lines.append("Not significant!")
+            lines.append("Not significant! (%s)" % test)
+
+        if verbose:
+            if self.test == 'mann-whitney':
+                shift = self.shift
+                text = self.ref.benchmark.format_sample(shift)
+                if shift >= 0:
+                    text = '+' + text
+                lines.append("Hodges-Lehmann shift: %s" % text)
+            lines.append(self.format_speed_ci())
         return lines
 
 
@@ -419,7 +760,7 @@ class CompareResults(list):
         self.name = name
 
 
-def compare_benchmarks(name, benchmarks):
+def compare_benchmarks(name, benchmarks, test='student'):
     results = CompareResults(name)
 
     ref_item = benchmarks[0]
@@ -427,24 +768,37 @@ def compare_benchmarks(name, benchmarks):
 
     for item in benchmarks[1:]:
         changed = CompareData(item.filename, item.benchmark)
-        result = CompareResult(ref, changed)
+        result = CompareResult(ref, changed, test)
         results.append(result)
 
     return results
 
 
+def apply_correction(all_results, method):
+    from perf._stats import adjust_pvalues
+
+    # Adjust p-values of all comparisons at once. Comparisons without
+    # p-value (single samples, failed test) are not corrected.
+    results = [result for results in all_results for result in results
+               if result.p_value is not None]
+    pvalues = [result.p_value for result in results]
+    for result, pvalue in zip(results, adjust_pvalues(pvalues, method)):
+        result.correction = method
+        result.adjusted_p_value = pvalue
+
+
 def compare_suites_list(all_results, show_name, args):
     not_significant = []
     for index, results in enumerate(all_results):
         significant = any(result.significant for result in results)
-        lines = []
-        for result in results:
-            lines.extend(result.format(args.verbose))
-
         if not(significant or args.verbose):
             not_significant.append(results.name)
             continue
 
+        lines = []
+        for result in results:
+            lines.extend(result.format(args.verbose))
+
         if len(lines) != 1:
             if show_name:
                 display_title(results.name)
@@ -504,14 +858,102 @@ def compare_suites_by_speed(all_results, show_name, args):
             print("- %s: %s" % (name, text))
         print()
 
-
-
     if not args.quiet and not_significant:
         print("Benchmark hidden because not significant (%s): %s"
               % (len(not_significant), ', '.join(not_significant)))
 
 
+def _load_weights(filename):
+    import json
+
+    try:
+        with open(filename) as fp:
+            weights = json.load(fp)
+        if not isinstance(weights, dict):
+            raise ValueError("expected a JSON object")
+        for name, weight in weights.items():
+            if not isinstance(weight, (int, float)) or weight < 0:
+                raise ValueError("invalid weight of %s: %r" % (name, weight))
+    except (IOError, OSError, ValueError) as exc:
+        print("ERROR: failed to load weights from %s: %s" % (filename, exc),
+              file=sys.stderr)
+        sys.exit(1)
+    return weights
+
+
+def geometric_means(all_results, weights):
+    from perf._stats import geometric_mean_speed
+
+    # all_results is a list of results, one per benchmark: results[index]
+    # compares the reference to the changed file index + 1.
+    #
+    # Yield (changed, nbench, mean, error) for each changed file: mean is
+    # None and error is the error message if the mean cannot be computed.
+    ncompare = len(all_results[0])
+    for index in range(ncompare):
+        pairs = []
+        pair_weights = []
+        for results in all_results:
+            result = results[index]
+            pairs.append((result.ref.samples,
+                          result.changed.samples))
+            pair_weights.append(weights.get(results.name, 1.0))
+        changed = all_results[0][index].changed
+        nbench = sum(1 for weight in pair_weights if weight)
+
+        try:
+            mean = geometric_mean_speed(pairs, pair_weights)
+        except ValueError as exc:
+            yield (changed, nbench, None, str(exc))
+        else:
+            yield (changed, nbench, mean, None)
+
+
+def display_geometric_mean(all_results, weights):
+    ncompare = len(all_results[0])
+    for changed, nbench, mean, error in geometric_means(all_results, weights):
+        if mean is None:
+            print("ERROR: cannot compute the geometric mean: %s" % error)
+            continue
+
+        if mean.speed == 1.0:
+            text = "no change"
+        elif mean.speed > 1.0:
+            text = "%.2fx faster" % mean.speed
+        else:
+            text = "%.2fx slower" % (1.0 / mean.speed)
+        prefix = "Geometric mean"
+        if ncompare > 1:
+            prefix = "%s [%s]" % (prefix, changed.name)
+        print("%s (%s benchmarks): %s (speed %s)"
+              % (prefix, nbench, text,
+                 format_speed_ci(mean.speed, mean.low, mean.high)))
+
+
+def write_compare_report(all_results, weights, args):
+    from perf._report import create_writer
+
+    writer = create_writer(args.format, _COMPARE_FIELDS)
+    for results in all_results:
+        for result in results:
+            writer.write(_compare_record(results.name, result))
+
+    if weights is None:
+        return
+    for changed, nbench, mean, error in geometric_means(all_results, weights):
+        if mean is None:
+            continue
+        writer.write({'kind': 'geometric_mean',
+                      'ref_file': all_results[0][0].ref.name,
+                      'changed_file': changed.name,
+                      'speed': mean.speed,
+                      'speed_ci_low': mean.low,
+                      'speed_ci_high': mean.high})
+
+
 def compare_suites(benchmarks, sort_benchmarks, by_speed, args):
+    from perf._stats import bootstrap_cis
+
     grouped_by_name = benchmarks.group_by_name()
     if not grouped_by_name:
         print("ERROR: Benchmark suites have no benchmark in common",
@@ -523,15 +965,43 @@ def compare_suites(benchmarks, sort_benchmarks, by_speed, args):
         cmp_benchmarks = item.benchmarks
         if sort_benchmarks:
             cmp_benchmarks.sort(key=_bench_sort_key)
-        results = compare_benchmarks(item.name, cmp_benchmarks)
+        results = compare_benchmarks(item.name, cmp_benchmarks, args.test)
         all_results.append(results)
 
+    if args.correction:
+        apply_correction(all_results, args.correction)
+
+    if args.verbose:
+        # Compute confidence intervals of all results at once
+        results = [result for results in all_results for result in results]
+        tasks = [(result.ref.samples,
+                  result.changed.samples)
+                 for result in results]
+        for result, ci in zip(results, bootstrap_cis(tasks)):
+            result._speed_ci = ci
+
+    # the geometric mean requires the same reference for all benchmarks
+    if not sort_benchmarks and len(all_results) > 1:
+        if args.weights:
+            weights = _load_weights(args.weights)
+        else:
+            weights = {}
+    else:
+        weights = None
+
+    if args.format != 'text':
+        write_compare_report(all_results, weights, args)
+        return
+
     show_name = (len(grouped_by_name) > 1)
     if by_speed:
         compare_suites_by_speed(all_results, show_name, args)
     else:
         compare_suites_list(all_results, show_name, args)
 
+    if weights is not None:
+        display_geometric_mean(all_results, weights)
+
     if not args.quiet:
         for suite, hidden in benchmarks.group_by_name_ignored():
             if not hidden:
@@ -546,6 +1016,7 @@ def cmd_compare(args):
     if data.get_nsuite() < 2:
         print("ERROR: need at least two benchmark files")
         sys.exit(1)
+    data.summarize()
 
     if args.action == 'compare_to':
         by_speed = args.group_by_speed
@@ -560,6 +1031,7 @@ def cmd_compare(args):
 
 
 def cmd_metadata(args):
+    from perf._cli import display_metadata
     from perf._metadata import Metadata
     from perf._collect_metadata import collect_metadata
 
@@ -582,8 +1054,91 @@ def cmd_metadata(args):
     display_metadata(metadata)
 
 
+# Fields of --format=json and --format=csv reports. Numbers are in the unit
+# of the benchmark (ex: seconds), not formatted.
+_SHOW_FIELDS = ('file', 'benchmark', 'unit', 'nrun', 'nsample',
+                'median', 'stdev', 'mean')
+_STATS_FIELDS = _SHOW_FIELDS + ('min', 'max',
+                                'median_ci_low', 'median_ci_high',
+                                'nwarmup', 'loops', 'inner_loops',
+                                'duration', 'nmode')
+_COMPARE_FIELDS = ('kind', 'benchmark', 'ref_file', 'changed_file',
+                   'ref_median', 'ref_stdev', 'ref_nsample',
+                   'changed_median', 'changed_stdev', 'changed_nsample',
+                   'speed', 'speed_ci_low', 'speed_ci_high',
+                   'test', 'score', 'p_value', 'adjusted_p_value',
+                   'significant')
+_SLOWEST_FIELDS = ('file', 'rank', 'benchmark', 'duration')
+
+
+def _benchmark_record(item):
+    bench = item.benchmark
+    summary = bench._get_summary()
+    return {'file': item.filename,
+            'benchmark': item.name,
+            'unit': bench.get_unit(),
+            'nrun': bench.get_nrun(),
+            'nsample': summary.nsample,
+            'median': summary.median,
+            'stdev': summary.stdev,
+            'mean': summary.mean}
+
+
+def _benchmark_stats_record(item):
+    bench = item.benchmark
+    record = _benchmark_record(item)
+    samples = bench.get_samples()
+    record['min'] = min(samples)
+    record['max'] = max(samples)
+    if len(samples) >= 2:
+        record['median_ci_low'], record['median_ci_high'] = bench.median_ci()
+    record['nwarmup'] = bench._get_nwarmup()
+    record['loops'] = bench._get_loops()
+    record['inner_loops'] = bench._get_inner_loops()
+    record['duration'] = bench.get_total_duration()
+    record['nmode'] = len(bench._get_modes())
+    return record
+
+
+def _compare_record(name, result):
+    ref = result.ref
+    changed = result.changed
+    record = {'kind': 'benchmark',
+              'benchmark': name,
+              'ref_file': ref.name,
+              'changed_file': changed.name,
+              'ref_median': ref.summary.median,
+              'ref_stdev': ref.summary.stdev,
+              'ref_nsample': ref.summary.nsample,
+              'changed_median': changed.summary.median,
+              'changed_stdev': changed.summary.stdev,
+              'changed_nsample': changed.summary.nsample,
+              'speed': result.speed,
+              'test': result.test,
+              'score': result.t_score,
+              'p_value': result.p_value,
+              'adjusted_p_value': result.adjusted_p_value,
+              'significant': result.significant}
+    if result._speed_ci is not None:
+        record['speed_ci_low'], record['speed_ci_high'] = result._speed_ci
+    return record
+
+
 def cmd_show(args):
+    from perf._cli import (display_benchmark, display_metadata,
+                           warn_if_bench_unstable)
+    from perf._report import create_writer
+
     data = load_benchmarks(args)
+    data.summarize()
+
+    if args.format != 'text':
+        writer = create_writer(args.format, _SHOW_FIELDS)
+        for item in data:
+            writer.write(_benchmark_record(item))
+        return
+    if args.stats:
+        data.bootstrap()
 
     if args.metadata:
         metadatas = [item.benchmark.get_metadata() for item in data]
@@ -595,7 +1150,8 @@ def cmd_show(args):
         use_title = False
         if not args.quiet:
             for index, item in enumerate(data):
-                warnings = warn_if_bench_unstable(item.benchmark)
+                warnings = warn_if_bench_unstable(item.benchmark,
+                                                  args.check)
 
                 if warnings:
                     use_title = True
@@ -624,7 +1180,8 @@ def cmd_show(args):
                               hist=args.hist,
                               stats=args.stats,
                               dump=args.dump,
-                              check_unstable=not args.quiet)
+                              check_unstable=not args.quiet,
+                              check_modes=args.check)
 
             if not item.is_last:
                 print()
@@ -647,6 +1204,8 @@ def cmd_show(args):
 
 
 def cmd_dump(args):
+    from perf._cli import display_runs
+
     data = load_benchmarks(args)
 
     use_titles = (data.get_nsuite() > 1) or (len(data.suites[0]) > 1)
@@ -675,8 +1234,33 @@ def cmd_timeit(args, timeit_runner):
     perf._timeit.main(timeit_runner)
 
 
+def cmd_command(args, command_runner):
+    import perf._command
+    command_runner.args = args
+    command_runner._process_args()
+    perf._command.main(command_runner)
+
+
+def cmd_import(args, import_runner):
+    import perf._import
+    import_runner.args = args
+    import_runner._process_args()
+    perf._import.main(import_runner)
+
+
 def cmd_stats(args):
+    from perf._cli import display_stats
+    from perf._report import create_writer
+
     data = load_benchmarks(args)
+    data.summarize()
+    data.bootstrap()
+
+    if args.format != 'text':
+        writer = create_writer(args.format, _STATS_FIELDS)
+        for item in data:
+            writer.write(_benchmark_stats_record(item))
+        return
 
     use_titles = (data.get_nsuite() > 1) or (len(data.suites[0]) > 1)
     suite = None
@@ -705,6 +1289,8 @@ def cmd_stats(args):
 
 
 def cmd_hist(args):
+    from perf._cli import display_histogram
+
     data = load_benchmarks(args)
 
     ignored = list(data.group_by_name_ignored())
@@ -835,10 +1421,11 @@ def cmd_convert(args):
     if args.remove_outliers:
         for benchmark in suite:
             try:
-                benchmark._remove_outliers()
-            except ValueError:
-                print("ERROR: Benchmark %r has no more run after removing "
-                      "outliers" % get_benchmark_name(benchmark),
+                benchmark._remove_outliers(args.outlier_method,
+                                           args.outlier_threshold)
+            except ValueError as exc:
+                print("ERROR: Failed to remove outliers of benchmark %r: %s"
+                      % (get_benchmark_name(benchmark), exc),
                       file=sys.stderr)
                 sys.exit(1)
 
@@ -849,13 +1436,267 @@ def cmd_convert(args):
         suite.dump(sys.stdout, compact=compact)
 
 
+def cmd_compact(args):
+    filename = args.filename
+    suite = perf.BenchmarkSuite.load(filename)
+
+    # Write into a temporary file of the same directory and then replace the
+    # journal, to not lose runs if the process is interrupted
+    import tempfile
+
+    dirname = os.path.dirname(filename)
+    fd, tmp_filename = tempfile.mkstemp(suffix='.json', dir=dirname or None)
+    os.close(fd)
+    try:
+        # mkstemp() creates the file with the 0600 mode: keep the mode
+        os.chmod(tmp_filename, os.stat(filename).st_mode & 0o7777)
+        suite.dump(tmp_filename, compact=not args.indent)
+        replace = getattr(os, 'replace', os.rename)
+        replace(tmp_filename, filename)
+    except BaseException:
+        os.unlink(tmp_filename)
+        raise
+
+
+def _parse_date_arg(date):
+    import datetime
+
+    try:
+        if 'T' in date:
+            return parse_iso8601(date)
+        else:
+            return datetime.datetime.strptime(date, '%Y-%m-%d')
+    except ValueError:
+        print("ERROR: invalid date: %r" % date, file=sys.stderr)
+        sys.exit(1)
+
+
+def cmd_store(args):
+    from perf._store import ResultStore
+
+    with ResultStore(args.database) as store:
+        for filename in args.filenames:
+            suite = perf.BenchmarkSuite.load(filename)
+            added = store.add_suite(suite)
+            print("%s: %s benchmarks stored, %s ignored (already stored)"
+                  % (filename, added, len(suite) - added))
+
+
+def cmd_query(args):
+    from perf._store import ResultStore
+
+    start = end = None
+    if args.since:
+        start = _parse_date_arg(args.since)
+    if args.until:
+        end = _parse_date_arg(args.until)
+    if args.days is not None:
+        import datetime
+        start = datetime.datetime.now() - datetime.timedelta(days=args.days)
+
+    query = dict(name=args.name, hostname=args.hostname,
+                 python_version=args.python_version,
+                 start=start, end=end)
+
+    with ResultStore(args.database) as store:
+        if args.output:
+            suites = store.get_suites(**query)
+            for index, suite in enumerate(suites, 1):
+                dates = suite.get_dates()
+                if dates:
+                    name = dates[0].strftime('%Y-%m-%dT%H-%M-%S')
+                else:
+                    name = 'nodate'
+                filename = os.path.join(args.output,
+                                        '%s-%s.json' % (name, index))
+                suite.dump(filename)
+                print("Write %s" % filename)
+            return
+
+        entries = store.query(**query)
+
+    if not entries:
+        print("No benchmark found")
+        return
+
+    show_name = (len({entry.name for entry in entries}) > 1)
+    name = None
+    for entry in entries:
+        if show_name and entry.name != name:
+            if name is not None:
+                print()
+            name = entry.name
+            display_title(name, 2)
+
+        formatter = UNIT_FORMATTERS[entry.unit]
+        if entry.stdev is not None:
+            median, stdev = formatter((entry.median, entry.stdev))
+            text = '%s +- %s' % (median, stdev)
+        else:
+            text = formatter((entry.median,))[0]
+
+        if entry.start_date is not None:
+            date = entry.start_date.isoformat()
+        else:
+            date = '<no date>'
+        # omit unknown metadata
+        infos = []
+        if entry.hostname:
+            infos.append(entry.hostname)
+        if entry.python_version:
+            infos.append('Python %s' % entry.python_version)
+        if infos:
+            date = '%s [%s]' % (date, ', '.join(infos))
+        print("%s: %s" % (date, text))
+
+
+def display_plan(bench, effect, power):
+    from perf._plan import (estimate_variances, estimate_costs,
+                            detectable_effect, plan)
+
+    try:
+        variances = estimate_variances(bench)
+    except ValueError as exc:
+        print("ERROR: %s" % exc)
+        return
+    costs = estimate_costs(bench)
+
+    def format_stdev(variance):
+        stdev = variance ** 0.5
+        return ('%s (%.1f%%)'
+                % (bench.format_sample(stdev),
+                   stdev * 100 / variances.mean))
+
+    def format_plan(processes, samples, loops):
+        return ('%s, %s, %s'
+                % (format_number(processes, 'process', 'processes'),
+                   format_number(samples, 'sample'),
+                   format_number(loops, 'loop')))
+
+    print("Mean: %s" % bench.format_sample(variances.mean))
+    print("Std dev between processes: %s" % format_stdev(variances.between))
+    print("Std dev within processes: %s" % format_stdev(variances.within))
+
+    processes = bench.get_nrun()
+    samples = bench._get_nsample_per_run()
+    loops = bench._get_loops()
+    current_effect = detectable_effect(variances, processes,
+                                       samples, loops, power)
+    print("Current: %s: detectable effect %.1f%%, duration %s"
+          % (format_plan(processes, samples, loops), current_effect * 100,
+             format_seconds(bench.get_total_duration())))
+
+    try:
+        result = plan(variances, costs, effect / 100, power)
+    except ValueError as exc:
+        print("ERROR: %s" % exc)
+        return
+    print("Recommended: %s: estimated duration %s"
+          % (format_plan(result.processes, result.samples, result.loops),
+             format_seconds(result.duration)))
+
+
+def cmd_plan(args):
+    data = load_benchmarks(args)
+    data.summarize()
+
+    print("Minimum detectable effect: %.1f%% (power: %.0f%%)"
+          % (args.effect, args.power * 100))
+    print()
+
+    for item in data:
+        if item.title:
+            display_title(item.title, 2)
+        display_plan(item.benchmark, args.effect, args.power)
+        if not item.is_last:
+            print()
+
+
+def _trend_filenames(paths):
+    filenames = []
+    for path in paths:
+        if os.path.isdir(path):
+            names = sorted(name for name in os.listdir(path)
+                           if name.endswith('.json'))
+            filenames.extend(os.path.join(path, name) for name in names)
+        else:
+            filenames.append(path)
+    return filenames
+
+
+def cmd_trend(args):
+    from perf._trend import build_series, change_points
+
+    data = Benchmarks()
+    data.load_benchmark_suites(_trend_filenames(args.filenames))
+    if not data.suites:
+        print("ERROR: no benchmark file", file=sys.stderr)
+        sys.exit(1)
+
+    series = build_series(data.suites)
+    if args.name:
+        if args.name not in series:
+            print("ERROR: no result of the benchmark %r" % args.name,
+                  file=sys.stderr)
+            sys.exit(1)
+        series = {args.name: series[args.name]}
+    format_filename = format_filename_func(data.suites)
+    # any benchmark of the series can be used to format samples
+    formatters = {bench.get_name(): bench
+                  for suite in data.suites for bench in suite}
+
+    names = sorted(series)
+    for index, name in enumerate(names):
+        points = series[name]
+        bench = formatters[name]
+
+        if len(names) > 1:
+            display_title(name)
+
+        print("Results: %s (%s .. %s)"
+              % (len(points),
+                 points[0].date.isoformat(), points[-1].date.isoformat()))
+        if args.verbose:
+            for point in points:
+                print("- %s: %s (%s)"
+                      % (point.date.isoformat(),
+                         bench.format_sample(point.median),
+                         format_filename(point.filename)))
+
+        changes = change_points([point.median for point in points],
+                                args.min_shift / 100)
+        if changes:
+            print("Change points:")
+            for change in changes:
+                point = points[change.index]
+                percent = (change.after - change.before) * 100 / change.before
+                print("- %s (%s): %s -> %s (%+.1f%%)"
+                      % (point.date.isoformat(),
+                         format_filename(point.filename),
+                         bench.format_sample(change.before),
+                         bench.format_sample(change.after),
+                         percent))
+        else:
+            print("No change point")
+
+        if index != len(names) - 1:
+            print()
+
+
 def cmd_slowest(args):
+    from perf._report import create_writer
+
     data = load_benchmarks(args)
     nslowest = args.n
 
+    if args.format != 'text':
+        writer = create_writer(args.format, _SLOWEST_FIELDS)
+    else:
+        writer = None
+
     use_title = (data.get_nsuite() > 1)
     for item in data.iter_suites():
-        if use_title:
+        if use_title and writer is None:
             display_title(item.filename, 1)
 
         benchs = []
@@ -864,15 +1705,27 @@ def cmd_slowest(args):
             benchs.append((duration, bench))
         benchs.sort(key=lambda item: item[0], reverse=True)
 
-        for index, item in enumerate(benchs[:nslowest], 1):
-            duration, bench = item
+        for index, bench_item in enumerate(benchs[:nslowest], 1):
+            duration, bench = bench_item
             name = get_benchmark_name(bench)
-            print("#%s: %s (%s)"
-                  % (index, name, format_timedelta(duration)))
+            if writer is not None:
+                writer.write({'file': item.filename, 'rank': index,
+                              'benchmark': name, 'duration': duration})
+            else:
+                print("#%s: %s (%s)"
+                      % (index, name, format_timedelta(duration)))
+
+
+def _get_action(argv):
+    # The action is the first positional argument
+    for arg in argv:
+        if not arg.startswith('-'):
+            return arg
+    return None
 
 
 def main():
-    parser, timeit_runner = create_parser()
+    parser, runner = create_parser(_get_action(sys.argv[1:]))
     args = parser.parse_args()
     action = args.action
     try:
@@ -883,8 +1736,15 @@ def main():
             'hist': functools.partial(cmd_hist, args),
             'stats': functools.partial(cmd_stats, args),
             'metadata': functools.partial(cmd_metadata, args),
-            'timeit': functools.partial(cmd_timeit, args, timeit_runner),
+            'timeit': functools.partial(cmd_timeit, args, runner),
+            'command': functools.partial(cmd_command, args, runner),
+            'import': functools.partial(cmd_import, args, runner),
             'convert': functools.partial(cmd_convert, args),
+            'compact': functools.partial(cmd_compact, args),
+            'store': functools.partial(cmd_store, args),
+            'query': functools.partial(cmd_query, args),
+            'plan': functools.partial(cmd_plan, args),
+            'trend': functools.partial(cmd_trend, args),
             'dump': functools.partial(cmd_dump, args),
             'slowest': functools.partial(cmd_slowest, args),
         }
@@ -1,19 +1,40 @@
 from __future__ import division, print_function, absolute_import
 
-import datetime
-import json
 import math
 import os.path
 import sys
 
 import six
-import statistics
 
+from perf import _stats
 from perf._metadata import (NUMBER_TYPES, parse_metadata, Metadata,
                             _common_metadata, get_metadata_info)
+from perf._sample_file import SampleFile, ChainedSamples
 from perf._utils import parse_iso8601, UNIT_FORMATTERS
 
 
+# Metadata which must be the same in all runs of a benchmark
+_CHECKED_METADATA = ('aslr',
+                     'cpu_count',
+                     'cpu_model_name',
+                     'hostname',
+                     'inner_loops',
+                     'name',
+                     'platform',
+                     'python_executable',
+                     'python_implementation',
+                     'python_unicode',
+                     'python_version',
+                     'unit')
+# ignored:
+# - cpu_affinity
+# - cpu_config
+# - cpu_freq
+# - cpu_temp
+# - date
+# - duration
+# - timer
+
 # Format format history:
 # 4 - warmups are now a lists of (loops, raw_sample) rather than lists of
 #     samples
@@ -21,6 +42,8 @@ from perf._utils import parse_iso8601, UNIT_FORMATTERS
 # 2 - support multiple benchmarks per file
 # 1 - first version
 _JSON_VERSION = 4
+# Size of the first read of a journal file to decode its first record
+_JOURNAL_CHUNK = 64 * 1024
 
 
 def _check_warmups(warmups):
@@ -44,6 +67,31 @@ def _check_warmups(warmups):
     return True
 
 
+def _json_decode_records(text):
+    import json
+    import re
+
+    whitespace = re.compile(r'\s*')
+    decoder = json.JSONDecoder()
+    end = len(text)
+    pos = whitespace.match(text, 0).end()
+    while pos < end:
+        record, pos = decoder.raw_decode(text, pos)
+        yield record
+        pos = whitespace.match(text, pos).end()
+
+
+def _dump_json(data, fp, compact):
+    import json
+
+    if compact:
+        json.dump(data, fp, separators=(',', ':'), sort_keys=True)
+    else:
+        json.dump(data, fp, indent=4, sort_keys=True)
+    fp.write("\n")
+    fp.flush()
+
+
 class Run(object):
     # Run is immutable, so it can be shared/exchanged between two benchmarks
 
@@ -54,17 +102,27 @@ class Run(object):
                              "where loops is a int >= 1 and sample "
                              "is a float >= 0.0")
 
-        if (not samples
-           or any(not(isinstance(sample, NUMBER_TYPES) and sample > 0)
-                  for sample in samples)):
-            raise ValueError("samples must be a non-empty sequence "
-                             "of number > 0.0")
+        if isinstance(samples, SampleFile):
+            # don't copy samples of a memory-mapped file
+            if min(samples) <= 0:
+                raise ValueError("samples must be a non-empty sequence "
+                                 "of number > 0.0")
+        else:
+            if (not samples
+               or any(not(isinstance(sample, NUMBER_TYPES) and sample > 0)
+                      for sample in samples)):
+                raise ValueError("samples must be a non-empty sequence "
+                                 "of number > 0.0")
+            samples = tuple(samples)
 
         if warmups:
             self._warmups = tuple(warmups)
         else:
             self._warmups = None
-        self._samples = tuple(samples)
+        self._samples = samples
+        # Name of the sample file read from a JSON file, relative to the
+        # directory of the JSON file
+        self._samples_file = None
 
         if collect_metadata:
             from perf._collect_metadata import collect_metadata as collect_func
@@ -97,6 +155,8 @@ class Run(object):
             metadata = self._metadata
         run = Run(samples, warmups=warmups, collect_metadata=False)
         run._metadata = metadata
+        if samples is self._samples:
+            run._samples_file = self._samples_file
         return run
 
     def _get_metadata(self, name, default):
@@ -158,7 +218,12 @@ class Run(object):
         duration = self._get_metadata('duration', None)
         if duration is not None:
             return duration
-        raw_samples = self._get_raw_samples(warmups=True)
+        if isinstance(self._samples, SampleFile):
+            raw_samples = [raw_sample for loops, raw_sample in self.warmups]
+            raw_samples.append(math.fsum(self._samples)
+                               * self.get_total_loops())
+        else:
+            raw_samples = self._get_raw_samples(warmups=True)
         return math.fsum(raw_samples)
 
     def _get_date(self):
@@ -167,8 +232,43 @@ class Run(object):
             return None
         return parse_iso8601(date)
 
-    def _as_json(self, common_metadata):
-        data = {'samples': self._samples}
+    def _get_dates(self):
+        import datetime
+
+        start = self._get_date()
+        if start is None:
+            return None
+
+        duration = self._get_duration()
+        duration = int(math.ceil(duration))
+        end = start + datetime.timedelta(seconds=duration)
+        return (start, end)
+
+    def _get_raw_sample_range(self):
+        # (min, max) of raw samples: iterate on samples without copying them
+        total_loops = self.get_total_loops()
+        return (min(self._samples) * total_loops,
+                max(self._samples) * total_loops)
+
+    def _get_samples_file(self, dirname):
+        # The path of the sample file is written relative to the directory
+        # of the JSON file, dirname is None if the directory is unknown
+        filename = self._samples.filename
+        if dirname is None:
+            if self._samples_file is not None:
+                return self._samples_file
+            return filename
+        try:
+            return os.path.relpath(filename, dirname or os.curdir)
+        except ValueError:
+            # Windows: the sample file is on a different drive
+            return os.path.abspath(filename)
+
+    def _as_json(self, common_metadata, dirname=None):
+        if isinstance(self._samples, SampleFile):
+            data = {'samples_file': self._get_samples_file(dirname)}
+        else:
+            data = {'samples': self._samples}
         if self._warmups:
             data['warmups'] = self._warmups
 
@@ -185,7 +285,7 @@ class Run(object):
         return data
 
     @classmethod
-    def _json_load(cls, run_data, common_metadata, version):
+    def _json_load(cls, run_data, common_metadata, version, dirname=None):
         metadata = run_data.get('metadata', None)
         if common_metadata:
             metadata2 = dict(common_metadata)
@@ -207,12 +307,22 @@ class Run(object):
                 total_loops = loops * inner_loops
                 warmups = [(loops, sample * total_loops)
                            for sample in warmups]
-        samples = run_data['samples']
+        samples_file = run_data.get('samples_file')
+        if samples_file is not None:
+            # the path is relative to the directory of the JSON file
+            filename = samples_file
+            if dirname:
+                filename = os.path.join(dirname, filename)
+            samples = SampleFile(filename)
+        else:
+            samples = run_data['samples']
 
-        return cls(samples,
-                   warmups=warmups,
-                   metadata=metadata,
-                   collect_metadata=False)
+        run = cls(samples,
+                  warmups=warmups,
+                  metadata=metadata,
+                  collect_metadata=False)
+        run._samples_file = samples_file
+        return run
 
     def _extract_metadata(self, name):
         value = self._get_metadata(name, None)
@@ -258,6 +368,9 @@ class Benchmark(object):
         self._clear_runs_cache()
         # list of Run objects
         self._runs = []
+        # Suites containing the benchmark: their name index is invalidated
+        # when the benchmark is renamed
+        self._suites = []
 
     def get_name(self):
         if not self._runs:
@@ -303,58 +416,124 @@ class Benchmark(object):
 
     def _clear_runs_cache(self):
         self._samples = None
+        # samples of runs added since get_samples() was called
+        self._new_samples = []
+        self._sorted_samples = None
         self._median = None
+        self._summary = None
+        self._median_cis = {}
+        self._modes = None
         self._common_metadata = None
+        self._checked_metadata = None
         self._dates = None
 
+    def _update_runs_cache(self, run):
+        # Update caches in-place for the new run, rather than recomputing
+        # them from all runs: add_run() must be O(1) for metadata
+        if self._common_metadata is not None:
+            run_metadata = run._metadata or {}
+            for key, obj in list(self._common_metadata.items()):
+                if run_metadata.get(key, None) != obj.value:
+                    del self._common_metadata[key]
+
+        self._median = None
+        self._summary = None
+        self._median_cis.clear()
+        self._modes = None
+        if isinstance(run.samples, SampleFile):
+            # samples of memory-mapped files are not cached in memory
+            self._samples = None
+            self._new_samples = []
+            self._sorted_samples = None
+
+        # New samples are only appended to lists: concatenating tuples or
+        # inserting samples one by one would make the creation of a
+        # benchmark run by run quadratic. get_samples() and median() merge
+        # them in a single pass.
+        if self._samples is not None:
+            self._new_samples.extend(run.samples)
+
+        if self._sorted_samples is not None:
+            self._sorted_samples.extend(run.samples)
+
+        if self._dates is not None:
+            dates = run._get_dates()
+            if dates is not None:
+                if self._dates:
+                    self._dates = (min(self._dates[0], dates[0]),
+                                   max(self._dates[1], dates[1]))
+                else:
+                    self._dates = dates
+
     def median(self):
         if self._median is None:
-            self._median = statistics.median(self.get_samples())
+            samples = self.get_samples()
+            if self._summary is not None:
+                self._median = self._summary.median
+            elif not _stats.is_in_memory(samples):
+                self._median = _stats.median(samples)
+            else:
+                # keep sorted samples to update the median in add_run()
+                if self._sorted_samples is None:
+                    self._sorted_samples = sorted(samples)
+                else:
+                    # samples of new runs are appended unsorted: timsort
+                    # merges them with the sorted samples in linear time
+                    self._sorted_samples.sort()
+                self._median = _stats.median_sorted(self._sorted_samples)
             # add_run() ensures that all samples are greater than zero
             assert self._median != 0
         return self._median
 
+    def median_ci(self, confidence=0.95):
+        ci = self._median_cis.get(confidence)
+        if ci is None:
+            ci = _stats.bootstrap_median_ci(self.get_samples(), confidence)
+            self._median_cis[confidence] = ci
+        return ci
+
+    def _get_modes(self):
+        if self._modes is None:
+            self._modes = _stats.find_modes(self.get_samples())
+        return self._modes
+
+    def _get_summary(self):
+        if self._summary is None:
+            self._summary = _stats.summarize([self.get_samples()])[0]
+        return self._summary
+
+    def _get_checked_metadata(self):
+        if self._checked_metadata is None:
+            metadata = self.get_metadata()
+            self._checked_metadata = {key: metadata[key].value
+                                      for key in _CHECKED_METADATA
+                                      if key in metadata}
+        return self._checked_metadata
+
     def add_run(self, run):
         if not isinstance(run, Run):
             raise TypeError("Run expected, got %s" % type(run).__name__)
 
-        keys = ('aslr',
-                'cpu_count',
-                'cpu_model_name',
-                'hostname',
-                'inner_loops',
-                'name',
-                'platform',
-                'python_executable',
-                'python_implementation',
-                'python_unicode',
-                'python_version',
-                'unit')
-        # ignored:
-        # - cpu_affinity
-        # - cpu_config
-        # - cpu_freq
-        # - cpu_temp
-        # - date
-        # - duration
-        # - timer
-
         # FIXME: check loops? or maybe emit a warning in show?
 
         # don't check the first run
         if self._runs:
-            metadata = self.get_metadata()
-            run_metata = run.get_metadata()
-            for key in keys:
+            metadata = self._get_checked_metadata()
+            for key in _CHECKED_METADATA:
                 value = metadata.get(key, None)
-                run_value = run_metata.get(key, None)
+                run_value = run._get_metadata(key, None)
                 if run_value != value:
                     raise ValueError("incompatible benchmark, metadata %s is "
                                      "different: current=%s, run=%s"
                                      % (key, value, run_value))
 
-        self._clear_runs_cache()
-        self._runs.append(run)
+            self._runs.append(run)
+            self._update_runs_cache(run)
+        else:
+            self._clear_runs_cache()
+            self._runs.append(run)
+            # the benchmark gets its name from its first run
+            self._renamed()
 
     def get_unit(self):
         unit = 'second'
@@ -379,14 +558,23 @@ class Benchmark(object):
 
     def get_nsample(self):
         if self._samples is not None:
-            return len(self._samples)
+            return len(self._samples) + len(self._new_samples)
         else:
             return sum(len(run.samples) for run in self._runs)
 
     def get_samples(self):
         if self._samples is not None:
+            if self._new_samples:
+                self._samples += tuple(self._new_samples)
+                self._new_samples = []
             return self._samples
 
+        if any(isinstance(run.samples, SampleFile) for run in self._runs):
+            # Don't load samples of memory-mapped files in memory
+            if len(self._runs) == 1:
+                return self._runs[0].samples
+            return ChainedSamples(run.samples for run in self._runs)
+
         samples = []
         for run in self._runs:
             samples.extend(run.samples)
@@ -400,16 +588,19 @@ class Benchmark(object):
             raw_samples.extend(run._get_raw_samples(warmups))
         return raw_samples
 
+    def _get_raw_sample_range(self):
+        ranges = [run._get_raw_sample_range() for run in self._runs]
+        return (min(low for low, high in ranges),
+                max(high for low, high in ranges))
+
     def format(self):
         nrun = self.get_nrun()
         if not nrun:
             return '<no run>'
 
         if self.get_nsample() >= 2:
-            samples = self.get_samples()
-            numbers = [self.median()]
-            numbers.append(statistics.stdev(samples))
-            numbers = self.format_samples(numbers)
+            summary = self._get_summary()
+            numbers = self.format_samples((summary.median, summary.stdev))
             text = '%s +- %s' % numbers
         else:
             text = self.format_sample(self.median())
@@ -423,12 +614,12 @@ class Benchmark(object):
             return 'Median: %s' % text
 
     @classmethod
-    def _json_load(cls, data, version):
+    def _json_load(cls, data, version, dirname=None):
         bench = cls()
         common_metadata = data.get('common_metadata', None)
 
         for run_data in data['runs']:
-            run = Run._json_load(run_data, common_metadata, version)
+            run = Run._json_load(run_data, common_metadata, version, dirname)
             # Don't call add_run() to avoid O(n) complexity:
             # expect that runs were already validated before being written
             # into a JSON file
@@ -441,13 +632,14 @@ class Benchmark(object):
             bench._common_metadata = {}
         return bench
 
-    def _as_json(self):
+    def _as_json(self, dirname=None):
         data = {}
         common_metadata = self.get_metadata()
         if common_metadata:
             data['common_metadata'] = {name: obj.value
                                        for name, obj in common_metadata.items()}
-        data['runs'] = [run._as_json(common_metadata) for run in self._runs]
+        data['runs'] = [run._as_json(common_metadata, dirname)
+                        for run in self._runs]
         return data
 
     @staticmethod
@@ -487,24 +679,34 @@ class Benchmark(object):
                     del runs[index]
         if not runs:
             raise ValueError("no more runs")
+        self._clear_runs_cache()
         self._runs = runs
 
     def _remove_warmups(self):
+        self._clear_runs_cache()
         self._runs = [run._remove_warmups() for run in self._runs]
 
-    def _remove_outliers(self):
-        median = self.median()
-        min_sample = median * 0.95
-        max_sample = median * 1.05
+    def _remove_outliers(self, method='iqr', threshold=None):
+        low, high = _stats.outlier_bounds(self.get_samples(),
+                                          method, threshold)
 
         new_runs = []
         for run in self._runs:
-            # FIXME: only remove outliers, not whole runs
-            if all(min_sample <= sample <= max_sample
-                   for sample in run.samples):
-                new_runs.append(run)
+            samples = run.samples
+            kept = [sample for sample in samples if low <= sample <= high]
+            if not kept:
+                continue
+            # number of samples removed from the run by all conversions
+            nremoved = (run._get_metadata('removed_outliers', 0)
+                        + len(samples) - len(kept))
+            if len(kept) == len(samples):
+                kept = samples
+            metadata = dict(run._metadata or {}, removed_outliers=nremoved)
+            new_runs.append(run._replace(samples=kept, metadata=metadata))
         if not new_runs:
             raise ValueError("no more runs")
+
+        self._clear_runs_cache()
         self._runs[:] = new_runs
 
     def add_runs(self, benchmark):
@@ -529,13 +731,11 @@ class Benchmark(object):
         start = None
         end = None
         for run in self._runs:
-            run_start = run._get_date()
-            if run_start is None:
+            dates = run._get_dates()
+            if dates is None:
                 continue
 
-            duration = run._get_duration()
-            duration = int(math.ceil(duration))
-            run_end = run_start + datetime.timedelta(seconds=duration)
+            run_start, run_end = dates
             if start is None or run_start < start:
                 start = run_start
             if end is None or run_end > end:
@@ -565,14 +765,25 @@ class Benchmark(object):
         if not self._runs:
             raise ValueError("benchmark has no run")
 
+        old_name = self.get_name()
         self._clear_runs_cache()
         self._runs = [run._update_metadata(metadata) for run in self._runs]
+        if self.get_name() != old_name:
+            self._renamed()
+
+    def _renamed(self):
+        for suite in self._suites:
+            suite._clear_index()
 
 
 class BenchmarkSuite(object):
     def __init__(self, filename=None):
         self.filename = filename
         self._benchmarks = []
+        # Index of benchmarks: name => Benchmark, see _get_index()
+        self._index = None
+        # Cache of get_benchmarks(): benchmarks sorted by name
+        self._sorted_benchmarks = None
 
     def get_benchmark_names(self):
         names = []
@@ -621,46 +832,80 @@ class BenchmarkSuite(object):
             raise TypeError("expect Benchmark or BenchmarkSuite, got %s"
                             % type(result).__name__)
 
+    def _get_index(self):
+        if self._index is None:
+            self._index = {}
+            self._index_benchmarks(self._benchmarks)
+        return self._index
+
+    def _index_benchmarks(self, benchmarks):
+        for bench in benchmarks:
+            name = bench.get_name()
+            if name:
+                self._index.setdefault(name, bench)
+
+    def _clear_index(self):
+        # Called by Benchmark when a benchmark of the suite is renamed: when
+        # its first run is added, or by update_metadata()
+        self._index = None
+        self._sorted_benchmarks = None
 
     def get_benchmark(self, name):
         if not name:
             raise ValueError("name is empty")
-        for bench in self._benchmarks:
-            if bench.get_name() == name:
-                return bench
-        raise KeyError("there is no benchmark called %r" % name)
+        try:
+            return self._get_index()[name]
+        except KeyError:
+            raise KeyError("there is no benchmark called %r" % name)
 
     def get_benchmarks(self):
-        return sorted(self._benchmarks,
-                      key=lambda bench: bench.get_name() or '')
+        if self._sorted_benchmarks is None:
+            self._sorted_benchmarks = sorted(self._benchmarks,
+                                             key=lambda bench: bench.get_name() or '')
+        return list(self._sorted_benchmarks)
 
-    def add_benchmark(self, benchmark):
-        if benchmark in self._benchmarks:
-            raise ValueError("benchmark already part of the suite")
+    def _set_benchmarks(self, benchmarks):
+        kept = set(benchmarks)
+        for bench in self._benchmarks:
+            if bench not in kept:
+                bench._suites.remove(self)
+        self._benchmarks = benchmarks
+        self._clear_index()
 
+    def add_benchmark(self, benchmark):
         name = benchmark.get_name()
         if name:
-            try:
-                self.get_benchmark(name)
-            except KeyError:
-                pass
-            else:
+            existing = self._get_index().get(name)
+            if existing is benchmark:
+                raise ValueError("benchmark already part of the suite")
+            if existing is not None:
                 raise ValueError("the suite has already a benchmark called %r"
                                  % name)
+        elif benchmark in self._benchmarks:
+            raise ValueError("benchmark already part of the suite")
 
         self._benchmarks.append(benchmark)
+        benchmark._suites.append(self)
+        if self._index is not None:
+            self._index_benchmarks((benchmark,))
+        self._sorted_benchmarks = None
 
     @classmethod
-    def _json_load(cls, filename, bench_file):
+    def _json_load_record(cls, filename, bench_file):
         version = bench_file.get('version')
         if version in (3, _JSON_VERSION):
             benchmarks_json = bench_file['benchmarks']
         else:
             raise ValueError("file format version %r not supported" % version)
 
+        if filename and filename != '<stdin>':
+            dirname = os.path.dirname(filename)
+        else:
+            dirname = None
+
         suite = cls(filename)
         for bench_data in benchmarks_json:
-            benchmark = Benchmark._json_load(bench_data, version)
+            benchmark = Benchmark._json_load(bench_data, version, dirname)
             suite.add_benchmark(benchmark)
 
         if not suite:
@@ -668,6 +913,23 @@ class BenchmarkSuite(object):
 
         return suite
 
+    @classmethod
+    def _json_load(cls, filename, text):
+        # A file is a journal of one or more records: perf.add_runs() appends
+        # new runs as a new record at the end of the file. Records are merged
+        # in order.
+        suite = None
+        for bench_file in _json_decode_records(text):
+            record = cls._json_load_record(filename, bench_file)
+            if suite is None:
+                suite = record
+            else:
+                suite.add_runs(record)
+
+        if suite is None:
+            raise ValueError("the file doesn't contain any benchmark")
+        return suite
+
     @classmethod
     def load(cls, file):
         if isinstance(file, (bytes, six.text_type)):
@@ -678,53 +940,46 @@ class BenchmarkSuite(object):
                 else:
                     fp = open(file, "rb")
                 with fp:
-                    bench_file = json.load(fp)
+                    text = fp.read()
             else:
                 filename = '<stdin>'
-                bench_file = json.load(sys.stdin)
+                text = sys.stdin.read()
         else:
             # file is a file object
             filename = getattr(file, 'name', None)
-            bench_file = json.load(file)
+            text = file.read()
 
-        return cls._json_load(filename, bench_file)
+        return cls._json_load(filename, text)
 
     @classmethod
     def loads(cls, string):
-        bench_file = json.loads(string)
-        return cls._json_load(None, bench_file)
+        return cls._json_load(None, string)
 
-    def dump(self, file, compact=True):
-        benchmarks = [benchmark._as_json() for benchmark in self._benchmarks]
-        data = {'version': _JSON_VERSION, 'benchmarks': benchmarks}
-
-        def dump(data, fp, compact):
-            if compact:
-                json.dump(data, fp, separators=(',', ':'), sort_keys=True)
-            else:
-                json.dump(data, fp, indent=4, sort_keys=True)
-            fp.write("\n")
-            fp.flush()
+    def _as_json(self, dirname=None):
+        benchmarks = [benchmark._as_json(dirname)
+                      for benchmark in self._benchmarks]
+        return {'version': _JSON_VERSION, 'benchmarks': benchmarks}
 
+    def dump(self, file, compact=True):
         if isinstance(file, (bytes, six.text_type)):
+            # paths of sample files are relative to the JSON file
+            data = self._as_json(os.path.dirname(file))
             if six.PY3:
                 fp = open(file, "w", encoding="utf-8")
             else:
                 fp = open(file, "wb")
             with fp:
-                dump(data, fp, compact)
+                _dump_json(data, fp, compact)
         else:
             # file is a file object
-            dump(data, file, compact)
+            data = self._as_json()
+            _dump_json(data, file, compact)
 
     def _convert_include_benchmark(self, name):
-        benchmarks = []
-        for bench in self:
-            if bench.get_name() == name:
-                benchmarks.append(bench)
-        if not benchmarks:
+        bench = self._get_index().get(name)
+        if bench is None:
             raise KeyError("benchmark %r not found" % name)
-        self._benchmarks = benchmarks
+        self._set_benchmarks([bench])
 
     def _convert_exclude_benchmark(self, name):
         benchmarks = []
@@ -733,7 +988,7 @@ class BenchmarkSuite(object):
                 benchmarks.append(bench)
         if not benchmarks:
             raise ValueError("empty suite")
-        self._benchmarks = benchmarks
+        self._set_benchmarks(benchmarks)
 
     def get_total_duration(self):
         durations = [benchmark.get_total_duration() for benchmark in self]
@@ -756,10 +1011,81 @@ class BenchmarkSuite(object):
             return ()
 
 
+def _summarize_benchmarks(benchmarks):
+    # Compute statistics of all benchmarks at once, see perf._stats.summarize()
+    benchmarks = [bench for bench in benchmarks
+                  if bench._summary is None and bench._runs]
+    summaries = _stats.summarize([bench.get_samples()
+                                  for bench in benchmarks])
+    for bench, summary in zip(benchmarks, summaries):
+        bench._summary = summary
+
+
+def _bootstrap_benchmarks(benchmarks, confidence=0.95):
+    # Compute confidence intervals of the median of all benchmarks at once,
+    # see perf._stats.bootstrap_cis()
+    benchmarks = [bench for bench in benchmarks
+                  if confidence not in bench._median_cis and bench._runs]
+    cis = _stats.bootstrap_cis([(bench.get_samples(),)
+                                for bench in benchmarks],
+                               confidence)
+    for bench, ci in zip(benchmarks, cis):
+        bench._median_cis[confidence] = ci
+
+
+def _load_first_record(filename):
+    # Load the first record of a journal file. Only read the file until the
+    # first record can be decoded: the journal can be much longer.
+    import json
+
+    decoder = json.JSONDecoder()
+    if six.PY3:
+        fp = open(filename, "r", encoding="utf-8")
+    else:
+        fp = open(filename, "rb")
+    with fp:
+        text = ''
+        size = _JOURNAL_CHUNK
+        while True:
+            chunk = fp.read(size)
+            text += chunk
+            try:
+                bench_file = decoder.raw_decode(text.lstrip())[0]
+                break
+            except ValueError:
+                # incomplete record: read more until the end of the file
+                if not chunk:
+                    if not text.strip():
+                        raise ValueError("the file doesn't contain "
+                                         "any benchmark")
+                    raise
+            # double the size to decode a long record in linear time
+            size *= 2
+    return BenchmarkSuite._json_load_record(filename, bench_file)
+
+
 def add_runs(filename, result):
+    # Validate the result: same checks than BenchmarkSuite.add_runs()
+    suite = BenchmarkSuite()
+    suite.add_runs(result)
+
     if os.path.exists(filename):
-        suite = BenchmarkSuite.load(filename)
+        # Check the compatibility with runs of the first record, the merge
+        # of records would fail at load. The record is only used for the
+        # check, runs are added to a copy of its benchmarks.
+        first_record = _load_first_record(filename)
+        for benchmark in suite:
+            try:
+                existing = first_record.get_benchmark(benchmark.get_name())
+            except KeyError:
+                continue
+            existing.add_runs(benchmark)
+
+    # Append-only journal: only write new runs as a new record at the end
+    # of the file, BenchmarkSuite.load() merges records
+    if six.PY3:
+        fp = open(filename, "a", encoding="utf-8")
     else:
-        suite = BenchmarkSuite()
-    suite.add_runs(result)
-    suite.dump(filename)
+        fp = open(filename, "ab")
+    with fp:
+        _dump_json(suite._as_json(os.path.dirname(filename)), fp, True)
@@ -1,10 +1,16 @@
 from __future__ import division, print_function, absolute_import
 
-import statistics
+import bisect
+import collections
 
 from perf._utils import format_seconds, format_number
 
 
+# Minimum fraction of samples in the main mode of their run to consider that
+# modes depend on the worker process
+_MODES_BY_PROCESS = 0.9
+
+
 def display_run(bench, run_index, run,
                  common_metadata=None, raw=False, verbose=0, file=None):
     show_warmup = (verbose >= 0)
@@ -93,6 +99,31 @@ def display_runs(bench, quiet=False, verbose=False, raw=False, file=None):
                     verbose=verbose, raw=raw, file=file)
 
 
+def _modes_by_process(bench, modes):
+    # Fraction of samples in the main mode of their run: close to 100% if
+    # the mode depends on the process (hash randomization, ASLR, ...).
+    # Runs with a single sample are ignored.
+    highs = [mode.high for mode in modes[:-1]]
+    nsample = 0
+    nmain = 0
+    for run in bench.get_runs():
+        if len(run.samples) < 2:
+            continue
+        counter = collections.Counter(bisect.bisect_right(highs, sample)
+                                      for sample in run.samples)
+        nsample += len(run.samples)
+        nmain += max(counter.values())
+    if not nsample:
+        return None
+    return nmain / nsample
+
+
+def _format_modes(bench, modes):
+    return ', '.join('%s (%.0f%%)'
+                     % (bench.format_sample(mode.location), mode.weight * 100)
+                     for mode in modes)
+
+
 def display_stats(bench, file=None):
     fmt = bench.format_sample
     samples = bench.get_samples()
@@ -115,10 +146,10 @@ def display_stats(bench, file=None):
         print("End date: %s" % end.isoformat())
 
     # Raw sample minimize/maximum
-    raw_samples = bench._get_raw_samples()
-    print("Raw sample minimum: %s" % bench.format_sample(min(raw_samples)),
+    raw_min, raw_max = bench._get_raw_sample_range()
+    print("Raw sample minimum: %s" % bench.format_sample(raw_min),
           file=file)
-    print("Raw sample maximum: %s" % bench.format_sample(max(raw_samples)),
+    print("Raw sample maximum: %s" % bench.format_sample(raw_max),
           file=file)
     print(file=file)
 
@@ -173,12 +204,18 @@ def display_stats(bench, file=None):
     # Median +- std dev
     print(str(bench), file=file)
 
+    # Bootstrap confidence interval of the median
+    if len(samples) >= 2:
+        print("Median 95%% CI: %s .. %s (bootstrap)"
+              % bench.format_samples(bench.median_ci()),
+              file=file)
+
     # Mean +- std dev
-    mean = statistics.mean(samples)
+    summary = bench._get_summary()
+    mean = summary.mean
     if len(samples) > 2:
-        stdev = statistics.stdev(samples, mean)
         print("Mean +- std dev: %s +- %s"
-              % bench.format_samples((mean, stdev)),
+              % bench.format_samples((mean, summary.stdev)),
               file=file)
     else:
         print("Mean: %s" % bench.format_sample(mean), file=file)
@@ -186,6 +223,15 @@ def display_stats(bench, file=None):
     # Maximum
     print("Maximum: %s" % format_limit(median, max(samples)), file=file)
 
+    # Modes of multimodal distributions
+    modes = bench._get_modes()
+    if len(modes) > 1:
+        print("Modes: %s" % _format_modes(bench, modes), file=file)
+        by_process = _modes_by_process(bench, modes)
+        if by_process is not None:
+            print("Samples in the main mode of their run: %.0f%%"
+                  % (by_process * 100), file=file)
+
 
 def display_histogram(benchmarks, bins=20, extend=False, file=None):
     import collections
@@ -202,11 +248,10 @@ def display_histogram(benchmarks, bins=20, extend=False, file=None):
         if not extend:
             bins = min(bins, 25)
 
-    all_samples = []
-    for bench, title in benchmarks:
-        all_samples.extend(bench.get_samples())
-    all_min = min(all_samples)
-    all_max = max(all_samples)
+    # iterate on samples without copying them: samples can be stored in a
+    # memory-mapped file
+    all_min = min(min(bench.get_samples()) for bench, title in benchmarks)
+    all_max = max(max(bench.get_samples()) for bench, title in benchmarks)
     sample_k = float(all_max - all_min) / bins
     if not sample_k:
         sample_k = 1.0
@@ -224,8 +269,8 @@ def display_histogram(benchmarks, bins=20, extend=False, file=None):
 
         samples = bench.get_samples()
 
-        buckets = [sample_bucket(value) for value in samples]
-        counter = collections.Counter(buckets)
+        counter = collections.Counter(sample_bucket(value)
+                                      for value in samples)
         count_max = max(counter.values())
         count_width = len(str(count_max))
 
@@ -252,7 +297,7 @@ def display_histogram(benchmarks, bins=20, extend=False, file=None):
             print(file=file)
 
 
-def warn_if_bench_unstable(bench):
+def warn_if_bench_unstable(bench, check_modes=False):
     # FIXME: modify Benchmark constructor to avoid this annoying case?
     if not bench.get_nrun():
         raise ValueError("benchmark has no run")
@@ -265,7 +310,7 @@ def warn_if_bench_unstable(bench):
     median = bench.median()
     # Avoid division by zero
     if median and len(samples) > 1:
-        k = statistics.stdev(samples) / median
+        k = bench._get_summary().stdev / median
         if k > 0.10:
             if k > 0.20:
                 warn("ERROR: the benchmark is very unstable, the standard "
@@ -279,8 +324,31 @@ def warn_if_bench_unstable(bench):
                  "and/or loops")
             warn("")
 
+    # Check that the distribution has a single mode: the kernel density
+    # estimation is expensive, only run it on demand
+    if check_modes:
+        modes = bench._get_modes()
+    else:
+        modes = ()
+    if len(modes) > 1:
+        warn("WARNING: the benchmark has %s modes, the median is not "
+             "representative" % len(modes))
+        warn("Modes: %s" % _format_modes(bench, modes))
+        by_process = _modes_by_process(bench, modes)
+        if by_process is not None:
+            if by_process >= _MODES_BY_PROCESS:
+                warn("Modes depend on the worker process: %.0f%% of samples "
+                     "are in the main mode of their run" % (by_process * 100))
+                warn("Try to rerun the benchmark with more processes "
+                     "(hash randomization, memory layout, ...)")
+            else:
+                warn("Modes don't depend on the worker process: %.0f%% of "
+                     "samples are in the main mode of their run"
+                     % (by_process * 100))
+        warn("")
+
     # Check that the shortest sample took at least 1 ms
-    shortest = min(bench._get_raw_samples())
+    shortest = bench._get_raw_sample_range()[0]
     text = bench.format_sample(shortest)
     if shortest < 1e-3:
         if shortest < 1e-6:
@@ -304,8 +372,21 @@ def display_metadata(metadata, header="Metadata:", file=None):
         print("- %s: %s" % (key, value), file=file)
 
 
+def display_ranking(benchmarks, file=None):
+    # Rank benchmarks from the fastest to the slowest, the speed is relative
+    # to the fastest benchmark
+    benchmarks = sorted(benchmarks, key=lambda bench: bench.median())
+    fastest = benchmarks[0].median()
+    print("Ranking (fastest first):", file=file)
+    for rank, bench in enumerate(benchmarks, 1):
+        text = "%s. %s: %s" % (rank, bench.get_name(), bench.format())
+        if rank > 1:
+            text = "%s: %.2fx slower" % (text, bench.median() / fastest)
+        print(text, file=file)
+
+
 def display_benchmark(bench, file=None, check_unstable=True, metadata=False,
-                       dump=False, stats=False, hist=False):
+                       dump=False, stats=False, hist=False, check_modes=False):
     if metadata:
         display_metadata(bench.get_metadata(), file=file)
         print(file=file)
@@ -323,7 +404,7 @@ def display_benchmark(bench, file=None, check_unstable=True, metadata=False,
         print(file=file)
 
     if check_unstable:
-        warnings = warn_if_bench_unstable(bench)
+        warnings = warn_if_bench_unstable(bench, check_modes)
         for line in warnings:
             print(line, file=file)
 
@@ -2,12 +2,12 @@ from __future__ import division, print_function, absolute_import
 
 import collections
 import datetime
+import json
 import os
-import platform
 import re
 import socket
-import subprocess
 import sys
+import tempfile
 import time
 try:
     import resource
@@ -29,25 +29,150 @@ if MS_WINDOWS:
     from perf._win_memory import check_tracking_memory, get_peak_pagefile_usage
 
 
+# Static metadata of the current process, see get_static_metadata()
+_static_metadata = None
+# Cache of metadata which don't change until the next boot, see _get_cache()
+_cache = None
+_cache_modified = False
+
+
+def _get_boot_id():
+    boot_id = None
+    if sys.platform.startswith('linux'):
+        try:
+            boot_id = first_line('/proc/sys/kernel/random/boot_id')
+        except IOError:
+            pass
+    if not boot_id and psutil is not None:
+        boot_id = str(psutil.boot_time())
+    return boot_id
+
+
+def _get_cache_filename():
+    if not hasattr(os, 'getuid'):
+        return None
+    return os.path.join(tempfile.gettempdir(),
+                        'perf-metadata-%s.json' % os.getuid())
+
+
+def _get_cache():
+    # The cache is a JSON file in the temporary directory, it is ignored after
+    # a reboot or if it was written by another perf version. Use an
+    # in-memory cache if the boot cannot be identified.
+    global _cache
+
+    if _cache is not None:
+        return _cache
+
+    boot_id = _get_boot_id()
+    filename = _get_cache_filename()
+    _cache = {'boot_id': boot_id, 'perf_version': perf.__version__}
+    if not boot_id or not filename:
+        return _cache
+
+    try:
+        # don't trust a file created by another user
+        if os.stat(filename).st_uid != os.getuid():
+            return _cache
+        with open(filename) as fp:
+            data = json.load(fp)
+    except (OSError, IOError, ValueError):
+        return _cache
+
+    if (isinstance(data, dict)
+       and data.get('boot_id') == boot_id
+       and data.get('perf_version') == perf.__version__):
+        _cache = data
+    return _cache
+
+
+def _save_cache():
+    global _cache_modified
+
+    if not _cache_modified:
+        return
+    _cache_modified = False
+
+    filename = _get_cache_filename()
+    if not _cache.get('boot_id') or not filename:
+        return
+
+    # write a temporary file and rename it to not write a partial file
+    try:
+        fd, tmp_filename = tempfile.mkstemp(dir=os.path.dirname(filename),
+                                            prefix='perf-metadata-')
+        try:
+            with os.fdopen(fd, 'w') as fp:
+                json.dump(_cache, fp)
+            os.rename(tmp_filename, filename)
+        except (OSError, IOError, ValueError):
+            os.unlink(tmp_filename)
+            raise
+    except (OSError, IOError, ValueError):
+        # the cache is an optimization: ignore errors
+        pass
+
+
+def _cached(section, key, func):
+    global _cache_modified
+
+    values = _get_cache().setdefault(section, {})
+    if key not in values:
+        values[key] = func()
+        _cache_modified = True
+    return values[key]
+
+
 def normalize_text(text):
     text = str(text)
     text = re.sub(r'\s+', ' ', text)
     return text.strip()
 
 
+def _get_python_info():
+    # platform.architecture() runs the "file" program, platform.platform()
+    # reads the Python executable to get the libc version and importing
+    # platform and sysconfig are slow: cache the result per Python executable,
+    # the executable is identified by its modification time and its size
+    def get_info():
+        import platform
+
+        info = {'platform': platform.platform(True, False),
+                'bits': platform.architecture()[0],
+                'version': platform.python_version()}
+        try:
+            import sysconfig
+        except ImportError:
+            pass
+        else:
+            cflags = sysconfig.get_config_var('CFLAGS')
+            if cflags:
+                info['cflags'] = normalize_text(cflags)
+        return info
+
+    executable = sys.executable
+    try:
+        stat = os.stat(executable)
+    except (OSError, TypeError):
+        return get_info()
+    key = '%s:%s:%s' % (executable, stat.st_mtime, stat.st_size)
+    return _cached('python', key, get_info)
+
+
 def collect_python_metadata(metadata):
     # Implementation
     impl = perf.python_implementation()
     metadata['python_implementation'] = impl
 
     # Version
-    version = platform.python_version()
+    python_info = _get_python_info()
+    version = python_info['version']
 
     match = re.search(r'\[(PyPy [^ ]+)', sys.version)
     if match:
         version = '%s (Python %s)' % (match.group(1), version)
 
-    bits = platform.architecture()[0]
+    bits = python_info['bits']
     if bits:
         if bits == '64bit':
             bits = '64-bit'
@@ -107,15 +232,8 @@ def collect_python_metadata(metadata):
             metadata['python_hash_seed'] = hash_seed
 
     # CFLAGS
-    try:
-        import sysconfig
-    except ImportError:
-        pass
-    else:
-        cflags = sysconfig.get_config_var('CFLAGS')
-        if cflags:
-            cflags = normalize_text(cflags)
-            metadata['python_cflags'] = cflags
+    if python_info.get('cflags'):
+        metadata['python_cflags'] = python_info['cflags']
 
 
 def open_text(path):
@@ -208,10 +326,17 @@ def get_logical_cpu_count():
 
 
 def collect_system_metadata(metadata):
-    metadata['platform'] = platform.platform(True, False)
+    metadata['platform'] = _get_python_info()['platform']
     if sys.platform.startswith('linux'):
         collect_linux_metadata(metadata)
 
+    # Hostname
+    hostname = socket.gethostname()
+    if hostname:
+        metadata['hostname'] = hostname
+
+
+def collect_system_load(metadata):
     # on linux, load average over 1 minute
     for line in read_proc("loadavg"):
         fields = line.split()
@@ -223,11 +348,6 @@ def collect_system_metadata(metadata):
             runnable_threads = int(runnable_threads)
             metadata['runnable_threads'] = runnable_threads
 
-    # Hostname
-    hostname = socket.gethostname()
-    if hostname:
-        metadata['hostname'] = hostname
-
 
 def collect_memory_metadata(metadata):
     if resource is not None:
@@ -243,9 +363,17 @@ def collect_memory_metadata(metadata):
             metadata['mem_peak_pagefile_usage'] = usage
 
 def get_cpu_boost(cpu):
+    # Boost support doesn't change until the next boot, but cpupower is run
+    # once per CPU: cache the result
+    return _cached('cpu_boost', str(cpu), lambda: _read_cpu_boost(cpu))
+
+
+def _read_cpu_boost(cpu):
     if not get_cpu_boost.working:
         return
 
+    import subprocess
+
     env = dict(os.environ, LC_ALL='C')
     args = ['cpupower', '-c', str(cpu), 'frequency-info']
     try:
@@ -301,12 +429,14 @@ def format_cpu_infos(infos):
     return ', '.join(text)
 
 
-def collect_cpu_freq(metadata, cpus):
+def collect_cpu_freq(metadata, cpus, cpuinfo=None):
     # Parse /proc/cpuinfo: search for 'cpu MHz' (Intel) or 'clock' (Power8)
+    if cpuinfo is None:
+        cpuinfo = read_proc('cpuinfo')
     cpu_set = set(cpus)
     cpu_freq = {}
     cpu = None
-    for line in read_proc('cpuinfo'):
+    for line in cpuinfo:
         if line.startswith('processor'):
             value = line.split(':', 1)[-1].strip()
             cpu = int(value)
@@ -445,8 +575,10 @@ def collect_cpu_affinity(metadata, cpu_affinity, cpu_count):
     metadata['cpu_affinity'] = format_cpu_list(cpu_affinity)
 
 
-def collect_cpu_model(metadata):
-    for line in read_proc("cpuinfo"):
+def collect_cpu_model(metadata, cpuinfo=None):
+    if cpuinfo is None:
+        cpuinfo = read_proc('cpuinfo')
+    for line in cpuinfo:
         if line.startswith('model name'):
             model_name = line.split(':', 1)[1].strip()
             if model_name:
@@ -460,14 +592,9 @@ def collect_cpu_model(metadata):
             break
 
 
-def collect_cpu_metadata(metadata):
-    collect_cpu_model(metadata)
-
-    # CPU count
-    cpu_count = get_logical_cpu_count()
-    if cpu_count:
-        metadata['cpu_count'] = cpu_count
-
+def collect_cpu_metadata(metadata, cpuinfo=None):
+    # Dynamic CPU metadata, cpu_count metadata must be set
+    cpu_count = metadata.get('cpu_count')
     cpu_affinity = get_cpu_affinity()
     collect_cpu_affinity(metadata, cpu_affinity, cpu_count)
 
@@ -476,23 +603,51 @@ def collect_cpu_metadata(metadata):
         all_cpus = tuple(range(cpu_count))
 
     if all_cpus:
-        collect_cpu_freq(metadata, all_cpus)
+        collect_cpu_freq(metadata, all_cpus, cpuinfo)
         collect_cpu_config(metadata, all_cpus)
 
     collect_cpu_temperatures(metadata)
 
 
+def get_static_metadata(cpuinfo=None):
+    """Get metadata which don't change during the lifetime of the process.
+
+    Metadata are only collected at the first call, expensive metadata are
+    also cached on disk until the next boot.
+    """
+    global _static_metadata
+
+    if _static_metadata is None:
+        metadata = {}
+        metadata['perf_version'] = perf.__version__
+        collect_python_metadata(metadata)
+        collect_system_metadata(metadata)
+        collect_cpu_model(metadata, cpuinfo)
+
+        cpu_count = get_logical_cpu_count()
+        if cpu_count:
+            metadata['cpu_count'] = cpu_count
+        _static_metadata = metadata
+    return dict(_static_metadata)
+
+
 def collect_metadata(metadata):
-    metadata['perf_version'] = perf.__version__
+    start_time = perf.perf_counter()
+
+    # read /proc/cpuinfo once for static and dynamic metadata
+    cpuinfo = list(read_proc('cpuinfo'))
+    metadata.update(get_static_metadata(cpuinfo))
 
     date = datetime.datetime.now().isoformat()
     # FIXME: Move date to a regular run attribute with type datetime.datetime?
     metadata['date'] = date.split('.', 1)[0]
 
-    collect_python_metadata(metadata)
-    collect_system_metadata(metadata)
+    collect_system_load(metadata)
     collect_memory_metadata(metadata)
-    collect_cpu_metadata(metadata)
+    collect_cpu_metadata(metadata, cpuinfo)
+    _save_cache()
 
     # Note: Don't collect VmPeak of /proc/self/status on Linux because it is
     # not accurate. See perf._memory for more accurate memory metrics.
+
+    metadata['metadata_collect_time'] = perf.perf_counter() - start_time
@@ -0,0 +1,119 @@
+"""
+"perf command" benchmark command: measure the execution of an external
+command.
+
+Each execution of the command is spawned by the worker process. The sample is
+the wall time of the execution, the user and system times and the maximum
+resident set size of the child process are read from os.wait4() and stored in
+metadata.
+"""
+from __future__ import division, print_function, absolute_import
+
+import math
+import os
+import subprocess
+import sys
+
+import perf
+
+
+# Resource usage of children processes: ru_maxrss is in bytes on macOS, in
+# kilobytes on other platforms
+if sys.platform == 'darwin':
+    _MAX_RSS_SCALE = 1
+else:
+    _MAX_RSS_SCALE = 1024
+
+
+def _exitcode(status):
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def _run_command(command, devnull):
+    # Run the command once: return (wall_time, rusage), rusage is None
+    # if os.wait4() is not available
+    start_time = perf.perf_counter()
+    proc = subprocess.Popen(command, stdout=devnull)
+    if hasattr(os, 'wait4'):
+        pid, status, rusage = os.wait4(proc.pid, 0)
+        dt = perf.perf_counter() - start_time
+        # the process was reaped by os.wait4()
+        proc.returncode = _exitcode(status)
+    else:
+        proc.wait()
+        dt = perf.perf_counter() - start_time
+        rusage = None
+
+    if proc.returncode:
+        raise RuntimeError("%s failed with exit code %s"
+                           % (command[0], proc.returncode))
+    return (dt, rusage)
+
+
+class CommandBench(object):
+    """Sample function of a command, remembering the resource usage of
+    executions of each sample."""
+
+    def __init__(self, command):
+        self.command = command
+        # resource usages of each call to sample_func(): list of lists
+        self.rusages = []
+
+    def sample_func(self, loops):
+        rusages = []
+        total = 0.0
+        with open(os.devnull, 'wb') as devnull:
+            for _ in range(loops):
+                dt, rusage = _run_command(self.command, devnull)
+                total += dt
+                if rusage is not None:
+                    rusages.append(rusage)
+        self.rusages.append(rusages)
+        return total
+
+    def complete_metadata(self, runner, metadata):
+        # Samples are the last calls to sample_func(): ignore calibration and
+        # warmups
+        nsample = runner.args.samples
+        rusages = [rusage
+                   for call_rusages in self.rusages[-nsample:]
+                   for rusage in call_rusages]
+        if not rusages:
+            return
+
+        nexec = len(rusages)
+        metadata['command_user_time'] = math.fsum(
+            rusage.ru_utime for rusage in rusages) / nexec
+        metadata['command_sys_time'] = math.fsum(
+            rusage.ru_stime for rusage in rusages) / nexec
+        max_rss = max(rusage.ru_maxrss for rusage in rusages)
+        if max_rss:
+            metadata['command_max_rss'] = max_rss * _MAX_RSS_SCALE
+
+
+def prepare_args(runner, cmd):
+    cmd.append('--')
+    cmd.extend(runner.args.command)
+
+
+def main(runner):
+    args = runner.args
+    if not args.command:
+        print("ERROR: no command to benchmark")
+        sys.exit(1)
+
+    if not args.loops:
+        # don't calibrate: an execution of a command is expected to take
+        # longer than the minimum duration of a sample
+        args.loops = 1
+
+    command = list(args.command)
+    runner.metadata['command'] = ' '.join(command)
+    runner.program_args = (sys.executable, '-m', 'perf', 'command')
+    runner.prepare_subprocess_args = prepare_args
+
+    bench = CommandBench(command)
+    runner._complete_run_metadata = bench.complete_metadata
+    runner.bench_sample_func(bench.sample_func)
@@ -0,0 +1,260 @@
+"""
+"perf import" benchmark command: measure the cold import of a module.
+
+Each sample spawns a fresh Python process which imports the module: the
+sample is the time of the import statement measured by the child process.
+On Python 3.7 and newer, the child process is run with -X importtime: the
+cumulative import time of the heaviest modules is stored in run metadata
+("import_time:MODULE") and aggregated on all processes.
+"""
+from __future__ import division, print_function, absolute_import
+
+import math
+import re
+import subprocess
+import sys
+
+import perf
+from perf._metadata import IMPORT_TIME_PREFIX
+from perf._utils import format_seconds
+
+
+# Line written by the child process on stderr before importing the module:
+# -X importtime lines written before are imports of the Python startup
+_MARKER = 'perf import'
+# -X importtime requires Python 3.7
+_HAS_IMPORTTIME = (sys.version_info >= (3, 7))
+
+# sys.flags attributes implied by -I (isolated mode)
+_ISOLATED_FLAGS = ('ignore_environment', 'no_user_site', 'safe_path')
+# sys.flags attribute => command line option
+_FLAG_OPTIONS = (
+    ('debug', 'd'),
+    ('dont_write_bytecode', 'B'),
+    ('ignore_environment', 'E'),
+    ('no_user_site', 's'),
+    ('no_site', 'S'),
+    ('isolated', 'I'),
+    ('safe_path', 'P'),
+    ('optimize', 'O'),
+    ('verbose', 'v'),
+    ('bytes_warning', 'b'),
+    ('quiet', 'q'),
+)
+
+# Example: "import time:       340 |      48891 |   perf._utils"
+_IMPORTTIME_REGEX = re.compile(r'^import time: *([0-9]+) \| *([0-9]+) \| '
+                               r'( *)([^ ].*)$')
+
+_CHILD_CODE = """
+import sys, time
+timer = getattr(time, 'perf_counter', time.time)
+sys.stderr.write('\\n%s\\n')
+sys.stderr.flush()
+t0 = timer()
+__import__(%r)
+dt = timer() - t0
+sys.stdout.write('%%r\\n' %% dt)
+"""
+
+
+def parse_importtime(text):
+    """Parse the -X importtime output written after the marker.
+
+    Return a list of (module, depth, cumulative) tuples where cumulative is
+    the cumulative import time in seconds of the module including its
+    imports.
+    """
+    lines = text.splitlines()
+    if _MARKER in lines:
+        index = len(lines) - 1 - lines[::-1].index(_MARKER)
+        lines = lines[index + 1:]
+
+    imports = []
+    for line in lines:
+        match = _IMPORTTIME_REGEX.match(line)
+        if not match:
+            continue
+        cumulative = int(match.group(2)) / 1e6
+        depth = len(match.group(3)) // 2
+        imports.append((match.group(4), depth, cumulative))
+    return imports
+
+
+def _interpreter_args():
+    # Command line options of the worker process (ex: -E or -X options),
+    # rebuilt from sys.flags, sys.warnoptions and sys._xoptions
+    args = []
+    isolated = getattr(sys.flags, 'isolated', 0)
+    for name, option in _FLAG_OPTIONS:
+        if isolated and name in _ISOLATED_FLAGS:
+            continue
+        value = int(getattr(sys.flags, name, 0))
+        if value > 0:
+            args.append('-' + option * value)
+
+    warnoptions = list(sys.warnoptions)
+    # warning options added by -b, -bb and -X dev
+    bytes_warning = getattr(sys.flags, 'bytes_warning', 0)
+    implied = []
+    if bytes_warning > 1:
+        implied.append('error::BytesWarning')
+    elif bytes_warning:
+        implied.append('default::BytesWarning')
+    if getattr(sys.flags, 'dev_mode', False):
+        implied.append('default')
+    for option in implied:
+        if option in warnoptions:
+            warnoptions.remove(option)
+    for option in warnoptions:
+        args.append('-W' + option)
+
+    for name, value in getattr(sys, '_xoptions', {}).items():
+        if value is True:
+            args.extend(('-X', name))
+        else:
+            args.extend(('-X', '%s=%s' % (name, value)))
+    return args
+
+
+def create_command(module):
+    # the child process uses the same Python configuration than the worker
+    cmd = [sys.executable]
+    cmd.extend(_interpreter_args())
+    if _HAS_IMPORTTIME and 'importtime' not in sys._xoptions:
+        cmd.extend(('-X', 'importtime'))
+    cmd.extend(('-c', _CHILD_CODE % (_MARKER, module)))
+    return cmd
+
+
+def _run_import(command):
+    # Import the module once in a new process: return (import_time, imports)
+    proc = subprocess.Popen(command,
+                            stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE,
+                            universal_newlines=True)
+    stdout, stderr = proc.communicate()
+    if proc.returncode:
+        sys.stderr.write(stderr)
+        raise RuntimeError("import failed with exit code %s"
+                           % proc.returncode)
+    # the module can write on stdout: the import time is the last line
+    return (float(stdout.splitlines()[-1]), parse_importtime(stderr))
+
+
+class ImportBench(object):
+    """Sample function of a cold import, remembering the cumulative import
+    time of modules of each sample."""
+
+    def __init__(self, module, top):
+        self.module = module
+        self.top = top
+        self.command = create_command(module)
+        # cumulative import time of modules of each call to sample_func():
+        # list of lists of dictionaries
+        self.imports = []
+
+    def sample_func(self, loops):
+        imports = []
+        total = 0.0
+        for _ in range(loops):
+            dt, modules = _run_import(self.command)
+            total += dt
+            imports.append(dict((name, cumulative)
+                                for name, depth, cumulative in modules))
+        self.imports.append(imports)
+        return total
+
+    def complete_metadata(self, runner, metadata):
+        # Samples are the last calls to sample_func(): ignore calibration and
+        # warmups
+        nsample = runner.args.samples
+        times = {}
+        for call_imports in self.imports[-nsample:]:
+            for imports in call_imports:
+                for name, cumulative in imports.items():
+                    if name == self.module:
+                        continue
+                    times.setdefault(name, []).append(cumulative)
+
+        heaviest = sorted(times.items(),
+                          key=lambda item: math.fsum(item[1]) / len(item[1]),
+                          reverse=True)
+        for name, values in heaviest[:self.top]:
+            metadata[IMPORT_TIME_PREFIX + name] = math.fsum(values) / len(values)
+
+
+def get_import_times(bench):
+    """Get the mean cumulative import time of modules of all runs.
+
+    Return a list of (module, mean, nrun) sorted by mean, slowest first.
+    """
+    times = {}
+    for run in bench.get_runs():
+        for name, metadata in run.get_metadata().items():
+            if name.startswith(IMPORT_TIME_PREFIX):
+                name = name[len(IMPORT_TIME_PREFIX):]
+                times.setdefault(name, []).append(metadata.value)
+
+    modules = [(name, math.fsum(values) / len(values), len(values))
+               for name, values in times.items()]
+    modules.sort(key=lambda item: (-item[1], item[0]))
+    return modules
+
+
+def display_import_times(bench, top, file=None):
+    modules = get_import_times(bench)[:top]
+    if not modules:
+        return
+
+    nrun = bench.get_nrun()
+    print(file=file)
+    print("Heaviest imports (cumulative time, mean of %s runs):" % nrun,
+          file=file)
+    for name, mean, count in modules:
+        line = "- %s: %s" % (name, format_seconds(mean))
+        if count != nrun:
+            line += " (%s/%s runs)" % (count, nrun)
+        print(line, file=file)
+
+
+def prepare_args(runner, cmd):
+    cmd.extend(('--top', str(runner.args.top)))
+    cmd.append(runner.args.module)
+
+
+def main(runner):
+    args = runner.args
+    if args.top < 1:
+        print("ERROR: --top must be at least 1", file=sys.stderr)
+        sys.exit(1)
+
+    if not args.loops:
+        # don't calibrate: an import in a new process is expected to take
+        # longer than the minimum duration of a sample
+        args.loops = 1
+
+    module = args.module
+    runner.name = 'import %s' % module
+    runner.metadata['import_module'] = module
+    runner.program_args = (sys.executable, '-m', 'perf', 'import')
+    runner.prepare_subprocess_args = prepare_args
+
+    bench = ImportBench(module, args.top)
+    runner._complete_run_metadata = bench.complete_metadata
+    result = runner.bench_sample_func(bench.sample_func)
+
+    if args.worker or args.quiet:
+        return
+    stream = runner._stream()
+    if isinstance(result, perf.BenchmarkSuite):
+        benchmarks = list(result)
+    else:
+        benchmarks = [result]
+    for bench in benchmarks:
+        if len(benchmarks) > 1:
+            name = bench.get_name()
+            print(file=stream)
+            print(name, file=stream)
+            print('-' * len(name), file=stream)
+        display_import_times(bench, args.top, file=stream)
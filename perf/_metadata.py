@@ -66,9 +66,16 @@ METADATA = {
     'inner_loops': _MetadataInfo(format_number, six.integer_types, is_strictly_positive, 'integer'),
 
     'duration': _MetadataInfo(format_seconds, NUMBER_TYPES, is_positive, 'second'),
+    'metadata_collect_time': _MetadataInfo(format_seconds, NUMBER_TYPES, is_positive, 'second'),
+    'auto_warmups': _MetadataInfo(format_number, six.integer_types, is_positive, 'integer'),
+    'steady_state': _MetadataInfo(format_number, six.integer_types, is_positive, 'integer'),
+    'removed_outliers': _MetadataInfo(format_number, six.integer_types, is_positive, 'integer'),
     'load_avg_1min': _MetadataInfo(format_system_load, six.string_types + NUMBER_TYPES, is_positive, None),
 
     'mem_max_rss': BYTES,
+    'command_max_rss': BYTES,
+    'command_user_time': _MetadataInfo(format_seconds, NUMBER_TYPES, is_positive, 'second'),
+    'command_sys_time': _MetadataInfo(format_seconds, NUMBER_TYPES, is_positive, 'second'),
     'mem_peak_pagefile_usage': BYTES,
 
     'unit': _MetadataInfo(format_noop, six.string_types, UNIT_FORMATTERS.__contains__, None),
@@ -77,17 +84,28 @@ METADATA = {
 DEFAULT_METADATA_INFO = _MetadataInfo(format_metadata, METADATA_VALUE_TYPES, None, None)
 
 
+# Cumulative import time of a module measured by "perf import",
+# "import_time:MODULE" metadata
+IMPORT_TIME_PREFIX = 'import_time:'
+IMPORT_TIME = _MetadataInfo(format_seconds, NUMBER_TYPES, is_positive, 'second')
+
+
 def get_metadata_info(name):
-    return METADATA.get(name, DEFAULT_METADATA_INFO)
+    info = METADATA.get(name)
+    if info is not None:
+        return info
+    if name.startswith(IMPORT_TIME_PREFIX):
+        return IMPORT_TIME
+    return DEFAULT_METADATA_INFO
 
 
 def check_metadata(name, value):
-    info = get_metadata_info(name)
-
     if not isinstance(name, six.string_types):
         raise TypeError("metadata name must be a string, got %s"
                         % type(name).__name__)
 
+    info = get_metadata_info(name)
+
     if not isinstance(value, info.types):
         raise ValueError("invalid metadata %r value type: got %r"
                         % (name, type(value).__name__))
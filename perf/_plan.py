@@ -0,0 +1,169 @@
+"""
+Planning of the number of processes, samples and loops of a benchmark.
+
+The variance of the mean of a benchmark has two components: the variance
+between processes (address space layout, hash randomization, ...) which is
+only reduced by spawning more processes, and the variance of samples within a
+process which is also reduced by computing more samples and more loops per
+sample. Both components are estimated from the runs of an existing benchmark.
+"""
+from __future__ import division, print_function, absolute_import
+
+import collections
+import math
+
+from perf import _stats
+
+
+# Two-tailed test with alpha=0.05, as perf.is_significant()
+_ALPHA = 0.05
+# Spawn at least 2 processes to be able to estimate the variance between
+# processes of the new results
+_MIN_PROCESSES = 2
+_MAX_PROCESSES = 1000
+_MAX_SAMPLES = 100
+# Number of loops: the current number of loops multiplied by 2**k, k in
+# range(_LOOPS_MAX_SHIFT + 1). Less loops are not considered since the
+# number of loops is calibrated for the minimum duration of a sample.
+_LOOPS_MAX_SHIFT = 10
+
+Variances = collections.namedtuple('Variances',
+                                   'mean between within loops')
+Costs = collections.namedtuple('Costs', 'process_overhead loop_time nwarmup')
+Plan = collections.namedtuple('Plan', 'processes samples loops duration')
+
+
+def _normal_quantile(p):
+    # Inverse of the cumulative distribution function of the standard normal
+    # distribution, computed by bisection: math.erfc() is precise enough
+    low = -10.0
+    high = 10.0
+    for _ in range(100):
+        middle = (low + high) / 2
+        if math.erfc(-middle / math.sqrt(2)) / 2 < p:
+            low = middle
+        else:
+            high = middle
+    return (low + high) / 2
+
+
+def estimate_variances(bench):
+    """Estimate the variance between processes and within processes.
+
+    Return Variances(mean, between, within, loops): variances of samples,
+    the within variance is the variance for the number of loops. Raise a
+    ValueError if the benchmark has less than 2 runs.
+    """
+    runs = bench.get_runs()
+    if len(runs) < 2:
+        raise ValueError("at least 2 runs are needed to estimate "
+                         "the variance between processes")
+
+    summaries = _stats.summarize([run.samples for run in runs])
+
+    # One-way analysis of variance: pooled variance of runs
+    sum_squares = math.fsum(summary.stdev ** 2 * (summary.nsample - 1)
+                            for summary in summaries
+                            if summary.nsample >= 2)
+    dof = sum(summary.nsample - 1 for summary in summaries)
+    if dof:
+        within = sum_squares / dof
+    else:
+        # a single sample per run: the variance cannot be split
+        within = 0.0
+
+    run_means = [summary.mean for summary in summaries]
+    mean = _stats.mean(run_means)
+    between = _stats.stdev(run_means, mean) ** 2
+    # the variance of run means includes the variance of samples
+    inv_nsample = math.fsum(1 / summary.nsample for summary in summaries)
+    between = max(between - within * inv_nsample / len(runs), 0.0)
+
+    return Variances(mean, between, within, bench._get_loops())
+
+
+def estimate_costs(bench):
+    """Estimate the cost of a process and of a loop iteration.
+
+    The cost of a process is its duration (``duration`` metadata) minus the
+    time spent to compute warmups and samples: spawn the process, import
+    modules, calibrate, etc.
+    """
+    runs = bench.get_runs()
+    overheads = []
+    for run in runs:
+        raw_time = math.fsum(run._get_raw_samples(warmups=True))
+        overheads.append(max(run._get_duration() - raw_time, 0.0))
+    overhead = math.fsum(overheads) / len(overheads)
+
+    # samples are the time of a single inner loop iteration
+    loop_time = bench._get_summary().mean * bench._get_inner_loops()
+    return Costs(overhead, loop_time, bench._get_nwarmup())
+
+
+def _run_variance(variances, samples, loops):
+    # Variance of the mean of a run. The variance within processes is
+    # assumed to decrease linearly with the number of loops: loop
+    # iterations are assumed to be independent.
+    within = variances.within * variances.loops / loops
+    return variances.between + within / samples
+
+
+def _duration(costs, processes, samples, loops):
+    return processes * (costs.process_overhead
+                        + (costs.nwarmup + samples) * loops * costs.loop_time)
+
+
+def _zscore(power):
+    return _normal_quantile(1 - _ALPHA / 2) + _normal_quantile(power)
+
+
+def detectable_effect(variances, processes, samples, loops, power=0.8):
+    """Minimum detectable effect of a comparison.
+
+    Return the relative difference of the means (ex: 0.02 for 2%) that a
+    comparison of two benchmarks run with the same parameters detects with
+    the probability power.
+    """
+    variance = _run_variance(variances, samples, loops) / processes
+    # the difference of two means has the variance of both means
+    return _zscore(power) * math.sqrt(2 * variance) / variances.mean
+
+
+def plan(variances, costs, effect, power=0.8):
+    """Find the cheapest parameters to detect a relative effect.
+
+    effect is the relative difference of means, ex: 0.02 for 2%. Return a
+    Plan(processes, samples, loops, duration) where duration is the
+    estimated duration in seconds. Raise a ValueError if no plan detects the
+    effect with at most 1000 processes.
+    """
+    if not 0 < power < 1:
+        raise ValueError("power must be in the range ]0; 1[")
+    if effect <= 0:
+        raise ValueError("effect must be greater than zero")
+
+    # maximum variance of the mean of a benchmark
+    max_variance = (effect * variances.mean / _zscore(power)) ** 2 / 2
+
+    best = None
+    min_loops = max(int(round(variances.loops)), 1)
+    for shift in range(_LOOPS_MAX_SHIFT + 1):
+        loops = min_loops << shift
+        for samples in range(1, _MAX_SAMPLES + 1):
+            run_variance = _run_variance(variances, samples, loops)
+            processes = max(int(math.ceil(run_variance / max_variance)),
+                            _MIN_PROCESSES)
+            if processes > _MAX_PROCESSES:
+                continue
+
+            duration = _duration(costs, processes, samples, loops)
+            key = (duration, processes, loops, samples)
+            if best is None or key < best[0]:
+                best = (key, Plan(processes, samples, loops, duration))
+
+    if best is None:
+        raise ValueError("an effect of %.1f%% cannot be detected "
+                         "with %s processes"
+                         % (effect * 100, _MAX_PROCESSES))
+    return best[1]
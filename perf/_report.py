@@ -0,0 +1,83 @@
+"""
+Machine-readable output of CLI commands: JSON Lines or CSV.
+
+A report is a stream of records with a fixed list of fields. Records are
+written as soon as they are computed: the report of a large benchmark suite
+is never built in memory.
+"""
+from __future__ import division, print_function, absolute_import
+
+import math
+import sys
+
+from perf._utils import FORMATS  # noqa
+
+
+class ReportWriter(object):
+    """Write records (dictionaries) into a file."""
+
+    def __init__(self, fields, file=None):
+        self.fields = tuple(fields)
+        if file is None:
+            file = sys.stdout
+        self._file = file
+
+    def write(self, record):
+        raise NotImplementedError
+
+    def write_records(self, records):
+        for record in records:
+            self.write(record)
+
+    def flush(self):
+        self._file.flush()
+
+
+class JSONWriter(ReportWriter):
+    """Write one JSON object per line (JSON Lines)."""
+
+    def write(self, record):
+        import json
+
+        # keep the order of fields, missing fields are written as null
+        items = []
+        for field in self.fields:
+            value = record.get(field)
+            if (isinstance(value, float)
+               and (math.isnan(value) or math.isinf(value))):
+                # NaN and infinity are not valid JSON: write null
+                value = None
+            items.append('%s: %s' % (json.dumps(field),
+                                     json.dumps(value, allow_nan=False)))
+        self._file.write('{%s}\n' % ', '.join(items))
+
+
+class CSVWriter(ReportWriter):
+    """Write a header line and then one line per record."""
+
+    def __init__(self, fields, file=None):
+        import csv
+
+        ReportWriter.__init__(self, fields, file)
+        self._writer = csv.writer(self._file, lineterminator='\n')
+        self._writer.writerow(self.fields)
+
+    def write(self, record):
+        row = []
+        for field in self.fields:
+            value = record.get(field)
+            if value is None:
+                value = ''
+            elif isinstance(value, float):
+                value = repr(value)
+            row.append(value)
+        self._writer.writerow(row)
+
+
+def create_writer(format, fields, file=None):
+    if format == 'json':
+        return JSONWriter(fields, file)
+    elif format == 'csv':
+        return CSVWriter(fields, file)
+    else:
+        raise ValueError("unknown report format: %r" % format)
@@ -0,0 +1,111 @@
+"""
+Storage of benchmark samples in a memory-mapped file of float64.
+
+SampleFile samples are read through a buffer: see perf._stats to compute
+statistics without loading all samples as Python float objects.
+"""
+from __future__ import division, print_function, absolute_import
+
+import array
+import bisect
+import itertools
+import mmap
+import os
+
+
+_ITEMSIZE = array.array('d').itemsize
+# Number of float64 written at once by SampleFile.create()
+_CHUNK_SIZE = 2 ** 16
+
+
+class SampleFile(object):
+    """Read-only sequence of samples stored in a file of float64.
+
+    Samples are stored in the native byte order.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+
+        with open(filename, "rb") as fp:
+            size = os.fstat(fp.fileno()).st_size
+            if size % _ITEMSIZE:
+                raise ValueError("invalid sample file size: %s bytes" % size)
+            if not size:
+                raise ValueError("sample file is empty")
+            self._mmap = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if hasattr(memoryview, 'cast'):
+            # Python 3.3 and newer
+            self._view = memoryview(self._mmap).cast('d')
+        else:
+            # Python 2: samples are copied into memory
+            self._view = array.array('d')
+            self._view.fromstring(self._mmap[:])
+
+    @classmethod
+    def create(cls, filename, samples):
+        """Write samples into filename and return a SampleFile."""
+        samples = iter(samples)
+        with open(filename, "wb") as fp:
+            while True:
+                chunk = array.array('d', itertools.islice(samples, _CHUNK_SIZE))
+                if not chunk:
+                    break
+                chunk.tofile(fp)
+        return cls(filename)
+
+    def buffer(self):
+        """Get a memoryview of samples (format 'd')."""
+        return memoryview(self._view)
+
+    def __len__(self):
+        return len(self._view)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return tuple(self._view[index])
+        return self._view[index]
+
+    def __iter__(self):
+        return iter(self._view)
+
+    def __reduce__(self):
+        # memory mappings cannot be pickled: reopen the file
+        return (SampleFile, (self.filename,))
+
+    def __repr__(self):
+        return ('<perf.SampleFile filename=%r samples=%s>'
+                % (self.filename, len(self)))
+
+
+class ChainedSamples(object):
+    """Read-only concatenation of sequences of samples."""
+
+    def __init__(self, sequences):
+        self._sequences = tuple(sequences)
+        self._offsets = []
+        offset = 0
+        for samples in self._sequences:
+            offset += len(samples)
+            self._offsets.append(offset)
+
+    def __len__(self):
+        if not self._offsets:
+            return 0
+        return self._offsets[-1]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return tuple(itertools.islice(self, *index.indices(len(self))))
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("sample index out of range")
+        seq_index = bisect.bisect_right(self._offsets, index)
+        if seq_index:
+            index -= self._offsets[seq_index - 1]
+        return self._sequences[seq_index][index]
+
+    def __iter__(self):
+        return itertools.chain.from_iterable(self._sequences)
@@ -0,0 +1,984 @@
+"""
+Statistics on benchmark samples.
+
+Functions use floats (math.fsum) rather than the statistics module which
+computes exact fractions and is slow on large sample sets. summarize()
+computes statistics of many sample sets at once using numpy, if available.
+
+Samples which are not in memory (perf.SampleFile) are read through a buffer
+without loading them as Python float objects.
+
+Confidence intervals are computed by bootstrap (percentile method) with a
+fixed seed to get reproducible results.
+"""
+from __future__ import division, print_function, absolute_import
+
+import collections
+import itertools
+import math
+import operator
+
+from perf._sample_file import SampleFile, ChainedSamples
+
+
+# Number of buckets used by _select() to compute the median
+_NBUCKET = 2 ** 12
+# Minimum total number of samples to use numpy in summarize(): below,
+# importing numpy takes longer than computing statistics with floats
+_NUMPY_MIN_SAMPLES = 10000
+
+# Number of resamples used to compute bootstrap confidence intervals
+_BOOTSTRAP_NRESAMPLE = 1000
+# Fixed seed: confidence intervals must be reproducible
+_BOOTSTRAP_SEED = 0
+# Maximum number of resampled samples stored at once by numpy
+_BOOTSTRAP_CHUNK = 2 ** 20
+# Minimum number of drawn indexes (nsample x nresample) to use numpy
+_BOOTSTRAP_NUMPY_MIN_DRAWS = 2 ** 20
+# Maximum number of drawn indexes (nsample x nresample): above, the middle
+# indexes of resamples are drawn directly from their distribution
+_BOOTSTRAP_MAX_DRAWS = 2 ** 24
+# Minimum number of confidence intervals to use a pool of processes
+_BOOTSTRAP_POOL_MIN_TASKS = 20
+# Maximum number of entries of _median_indexes_cache
+_BOOTSTRAP_CACHE_SIZE = 64
+# Maximum number of samples per sample set used by hodges_lehmann()
+_HODGES_LEHMANN_MAX_SAMPLES = 2000
+
+# Outlier detection methods: name => default threshold,
+# see outlier_bounds()
+OUTLIER_METHODS = collections.OrderedDict((
+    # Tukey's fences: factor of the interquartile range
+    ('iqr', 1.5),
+    # factor of the median absolute deviation (scaled to the standard
+    # deviation of a normal distribution)
+    ('mad', 3.0),
+    # percent of samples removed on each side
+    ('trim', 5.0),
+))
+# MAD of the standard normal distribution: 1 / 1.4826
+_MAD_SCALE = 1.4826
+
+# Minimum number of samples to search for multiple modes: the kernel
+# density of less samples has many spurious modes
+_MODES_MIN_SAMPLES = 50
+# Number of points of the grid of the kernel density estimation
+_KDE_MIN_NPOINT = 256
+_KDE_MAX_NPOINT = 4096
+# Maximum number of samples sorted to estimate the bandwidth of the kernel
+# density estimation: above, use evenly spaced samples
+_KDE_MAX_SORT = 2 ** 16
+# Minimum weight of a mode: fraction of samples
+_MODE_MIN_WEIGHT = 0.10
+# Maximum ratio between the density of the antimode separating two modes and
+# the density of the smallest mode: a shallower dip is a shoulder
+_MODE_MAX_DIP = 0.6
+
+# Multiple comparison corrections: name => title, see adjust_pvalues()
+CORRECTION_METHODS = collections.OrderedDict((
+    ('holm', 'Holm-Bonferroni'),
+    ('fdr', 'Benjamini-Hochberg FDR'),
+))
+
+# Number of last samples compared by is_steady_state()
+_STEADY_WINDOW = 10
+_STEADY_MIN_WINDOW = 4
+# Maximum relative difference between medians of the two halves of the window
+_STEADY_TOLERANCE = 0.01
+
+Summary = collections.namedtuple('Summary', 'nsample mean stdev median')
+Mode = collections.namedtuple('Mode', 'location weight low high')
+GeometricMean = collections.namedtuple('GeometricMean', 'speed low high')
+
+# (nsample, nresample, seed, use_numpy) => indexes, see
+# _bootstrap_median_indexes()
+_median_indexes_cache = {}
+
+
+def is_in_memory(samples):
+    return isinstance(samples, (tuple, list))
+
+
+def _get_numpy():
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def _as_array(numpy, samples):
+    if isinstance(samples, SampleFile):
+        return numpy.frombuffer(samples.buffer(), dtype=numpy.float64)
+    if isinstance(samples, ChainedSamples):
+        return numpy.concatenate([_as_array(numpy, item)
+                                  for item in samples._sequences])
+    return numpy.asarray(samples, dtype=numpy.float64)
+
+
+def _select(samples, first, last):
+    # Get sorted samples at indexes first..last (inclusive) without sorting
+    # all samples: count samples per bucket, and only sort samples of
+    # buckets containing the requested indexes.
+    low = min(samples)
+    high = max(samples)
+    if low == high:
+        return [low] * (last - first + 1)
+
+    # the last bucket is used for high
+    scale = (_NBUCKET - 1) / (high - low)
+
+    counts = [0] * _NBUCKET
+    for sample in samples:
+        counts[int((sample - low) * scale)] += 1
+
+    count = 0
+    first_bucket = last_bucket = None
+    for index, bucket_count in enumerate(counts):
+        if first_bucket is None and count + bucket_count > first:
+            first_bucket = index
+            skipped = count
+        count += bucket_count
+        if count > last:
+            last_bucket = index
+            break
+
+    selected = sorted(
+        sample for sample in samples
+        if first_bucket <= int((sample - low) * scale) <= last_bucket)
+    return selected[first - skipped:last - skipped + 1]
+
+
+def _statistics_error(message):
+    # importing the statistics module is slow: only import it on error
+    import statistics
+    return statistics.StatisticsError(message)
+
+
+def median_sorted(sorted_samples):
+    # same result than statistics.median()
+    nsample = len(sorted_samples)
+    if not nsample:
+        raise _statistics_error("no median for empty data")
+    index = nsample // 2
+    if nsample % 2 == 1:
+        return sorted_samples[index]
+    else:
+        return (sorted_samples[index - 1] + sorted_samples[index]) / 2
+
+
+def median(samples):
+    if is_in_memory(samples):
+        return median_sorted(sorted(samples))
+
+    numpy = _get_numpy()
+    if numpy is not None:
+        return float(numpy.median(_as_array(numpy, samples)))
+
+    nsample = len(samples)
+    if not nsample:
+        raise _statistics_error("no median for empty data")
+    index = nsample // 2
+    if nsample % 2 == 1:
+        return _select(samples, index, index)[0]
+    else:
+        low, high = _select(samples, index - 1, index)
+        return (low + high) / 2
+
+
+def mean(samples):
+    if not len(samples):
+        raise _statistics_error("mean requires at least one "
+                                "data point")
+
+    if not is_in_memory(samples):
+        numpy = _get_numpy()
+        if numpy is not None:
+            return float(_as_array(numpy, samples).mean())
+
+    return math.fsum(samples) / len(samples)
+
+
+def stdev(samples, mean_value=None):
+    """Sample standard deviation."""
+    if len(samples) < 2:
+        raise _statistics_error("stdev requires at least two "
+                                "data points")
+
+    if not is_in_memory(samples):
+        numpy = _get_numpy()
+        if numpy is not None:
+            return float(_as_array(numpy, samples).std(ddof=1))
+
+    if mean_value is None:
+        mean_value = mean(samples)
+    squares = math.fsum([(sample - mean_value) ** 2 for sample in samples])
+    return math.sqrt(squares / (len(samples) - 1))
+
+
+def _summarize(samples):
+    nsample = len(samples)
+    mean_value = mean(samples)
+    if nsample >= 2:
+        stdev_value = stdev(samples, mean_value)
+    else:
+        stdev_value = None
+    return Summary(nsample, mean_value, stdev_value, median(samples))
+
+
+def _summarize_numpy(numpy, samples_list):
+    # Group sample sets by number of samples to compute statistics of each
+    # group with a 2D array: one row per sample set
+    groups = collections.OrderedDict()
+    for index, samples in enumerate(samples_list):
+        groups.setdefault(len(samples), []).append(index)
+
+    summaries = [None] * len(samples_list)
+    for nsample, indexes in groups.items():
+        values = numpy.fromiter(
+            itertools.chain.from_iterable(samples_list[index]
+                                          for index in indexes),
+            dtype=numpy.float64, count=len(indexes) * nsample)
+        values = values.reshape((len(indexes), nsample))
+
+        means = values.mean(axis=1).tolist()
+        if nsample >= 2:
+            stdevs = values.std(axis=1, ddof=1).tolist()
+        else:
+            stdevs = [None] * len(indexes)
+        medians = numpy.median(values, axis=1).tolist()
+
+        for index, mean_value, stdev_value, median_value in zip(
+                indexes, means, stdevs, medians):
+            summaries[index] = Summary(nsample, mean_value, stdev_value,
+                                       median_value)
+    return summaries
+
+
+def summarize(samples_list):
+    """Compute statistics of many sample sets at once.
+
+    Return a list of Summary(nsample, mean, stdev, median): stdev is None
+    if there is less than 2 samples. Sample sets must not be empty.
+    """
+    samples_list = list(samples_list)
+    for samples in samples_list:
+        if not len(samples):
+            raise _statistics_error("no statistics for empty data")
+
+    in_memory = [index for index, samples in enumerate(samples_list)
+                 if is_in_memory(samples)]
+    summaries = [None] * len(samples_list)
+
+    numpy = None
+    nsample = sum(len(samples_list[index]) for index in in_memory)
+    if nsample >= _NUMPY_MIN_SAMPLES:
+        numpy = _get_numpy()
+    if numpy is not None:
+        results = _summarize_numpy(numpy, [samples_list[index]
+                                           for index in in_memory])
+        for index, summary in zip(in_memory, results):
+            summaries[index] = summary
+
+    for index, samples in enumerate(samples_list):
+        if summaries[index] is None:
+            summaries[index] = _summarize(samples)
+    return summaries
+
+
+def mann_whitney_u(samples1, samples2):
+    """Mann-Whitney U test.
+
+    Return (u, z): u is the U statistic of samples1 and z the score of the
+    normal approximation with tie and continuity corrections. z is positive
+    if samples1 tend to be greater than samples2.
+    """
+    nsample1 = len(samples1)
+    nsample2 = len(samples2)
+    if not nsample1 or not nsample2:
+        raise _statistics_error("Mann-Whitney U test requires "
+                                "at least one data point per sample")
+
+    # average rank of each value, sum of (t^3 - t) for ties
+    values = sorted(itertools.chain(samples1, samples2))
+    nvalue = len(values)
+    ranks = {}
+    ties = 0
+    start = 0
+    while start < nvalue:
+        value = values[start]
+        end = start + 1
+        while end < nvalue and values[end] == value:
+            end += 1
+        count = end - start
+        ranks[value] = (start + end + 1) / 2
+        ties += count ** 3 - count
+        start = end
+
+    rank_sum = math.fsum(ranks[value] for value in samples1)
+    u = rank_sum - nsample1 * (nsample1 + 1) / 2
+
+    mean_u = nsample1 * nsample2 / 2
+    variance = (nsample1 * nsample2 / 12
+                * ((nvalue + 1) - ties / (nvalue * (nvalue - 1))
+                   if nvalue > 1 else 0))
+    if variance <= 0:
+        # all values are equal
+        return (u, 0.0)
+
+    diff = u - mean_u
+    if diff > 0.5:
+        diff -= 0.5
+    elif diff < -0.5:
+        diff += 0.5
+    else:
+        diff = 0.0
+    return (u, diff / math.sqrt(variance))
+
+
+def _betacf(a, b, x):
+    # Continued fraction of the incomplete beta function (modified Lentz's
+    # method)
+    tiny = 1e-300
+    qab = a + b
+    qap = a + 1.0
+    qam = a - 1.0
+    c = 1.0
+    d = 1.0 - qab * x / qap
+    if abs(d) < tiny:
+        d = tiny
+    d = 1.0 / d
+    result = d
+    for m in range(1, 300):
+        m2 = 2 * m
+        aa = m * (b - m) * x / ((qam + m2) * (a + m2))
+        d = 1.0 + aa * d
+        if abs(d) < tiny:
+            d = tiny
+        c = 1.0 + aa / c
+        if abs(c) < tiny:
+            c = tiny
+        d = 1.0 / d
+        result *= d * c
+        aa = -(a + m) * (qab + m) * x / ((a + m2) * (qap + m2))
+        d = 1.0 + aa * d
+        if abs(d) < tiny:
+            d = tiny
+        c = 1.0 + aa / c
+        if abs(c) < tiny:
+            c = tiny
+        d = 1.0 / d
+        delta = d * c
+        result *= delta
+        if abs(delta - 1.0) < 1e-15:
+            break
+    return result
+
+
+def _betainc(a, b, x):
+    # Regularized incomplete beta function I_x(a, b)
+    if x <= 0.0:
+        return 0.0
+    if x >= 1.0:
+        return 1.0
+    log_front = (math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b)
+                 + a * math.log(x) + b * math.log1p(-x))
+    front = math.exp(log_front)
+    if x < (a + 1.0) / (a + b + 2.0):
+        return front * _betacf(a, b, x) / a
+    return 1.0 - front * _betacf(b, a, 1.0 - x) / b
+
+
+def t_test_pvalue(t_score, deg_freedom):
+    """Two-tailed p-value of a t score with deg_freedom degrees of freedom."""
+    if deg_freedom <= 0:
+        raise ValueError("degrees of freedom must be greater than zero")
+    return _betainc(deg_freedom / 2, 0.5,
+                    deg_freedom / (deg_freedom + t_score ** 2))
+
+
+def normal_pvalue(z_score):
+    """Two-tailed p-value of a z score of the standard normal distribution."""
+    return math.erfc(abs(z_score) / math.sqrt(2))
+
+
+def adjust_pvalues(pvalues, method):
+    """Adjust p-values for multiple comparisons.
+
+    method is 'holm' (Holm-Bonferroni, controls the family-wise error rate)
+    or 'fdr' (Benjamini-Hochberg, controls the false discovery rate).
+    Return the list of adjusted p-values in the same order.
+    """
+    if method not in CORRECTION_METHODS:
+        raise ValueError("unknown correction method: %r" % method)
+    npvalue = len(pvalues)
+    order = sorted(range(npvalue), key=pvalues.__getitem__)
+    adjusted = [None] * npvalue
+
+    if method == 'holm':
+        # step-down: p(i) * (n - i), made monotonic increasing
+        previous = 0.0
+        for rank, index in enumerate(order):
+            value = max(min(pvalues[index] * (npvalue - rank), 1.0), previous)
+            adjusted[index] = previous = value
+    else:
+        # step-up: p(i) * n / (i + 1), made monotonic from the largest
+        previous = 1.0
+        for rank in range(npvalue - 1, -1, -1):
+            index = order[rank]
+            value = min(pvalues[index] * npvalue / (rank + 1), previous)
+            adjusted[index] = previous = value
+    return adjusted
+
+
+def _thin(sorted_samples, size):
+    # Get size evenly spaced samples of sorted samples
+    nsample = len(sorted_samples)
+    if nsample <= size:
+        return sorted_samples
+    return [sorted_samples[index * (nsample - 1) // (size - 1)]
+            for index in range(size)]
+
+
+def hodges_lehmann(samples1, samples2):
+    """Hodges-Lehmann estimator of the shift from samples1 to samples2.
+
+    Median of all pairwise differences (sample2 - sample1). Large sample
+    sets are first reduced to evenly spaced quantiles to limit the number
+    of pairs.
+    """
+    if not len(samples1) or not len(samples2):
+        raise _statistics_error("no shift for empty data")
+
+    samples1 = _thin(sorted(samples1), _HODGES_LEHMANN_MAX_SAMPLES)
+    samples2 = _thin(sorted(samples2), _HODGES_LEHMANN_MAX_SAMPLES)
+
+    numpy = _get_numpy()
+    if numpy is not None and len(samples1) * len(samples2) >= _NUMPY_MIN_SAMPLES:
+        diffs = numpy.subtract.outer(numpy.asarray(samples2),
+                                     numpy.asarray(samples1))
+        return float(numpy.median(diffs))
+
+    diffs = sorted([sample2 - sample1
+                    for sample2 in samples2 for sample1 in samples1])
+    return median_sorted(diffs)
+
+
+def quantile_sorted(sorted_samples, q):
+    # Linear interpolation between closest ranks, as numpy.percentile()
+    nsample = len(sorted_samples)
+    if not nsample:
+        raise _statistics_error("no quantile for empty data")
+    if not 0.0 <= q <= 1.0:
+        raise ValueError("quantile must be in the range [0; 1]")
+    pos = q * (nsample - 1)
+    index = int(math.floor(pos))
+    if index + 1 >= nsample:
+        return sorted_samples[-1]
+    frac = pos - index
+    low = sorted_samples[index]
+    return low + (sorted_samples[index + 1] - low) * frac
+
+
+def outlier_bounds(samples, method='iqr', threshold=None):
+    """Get the range (low, high) of samples which are not outliers.
+
+    method is the name of a method of OUTLIER_METHODS:
+
+    * 'iqr': outside [Q1 - threshold * IQR; Q3 + threshold * IQR]
+    * 'mad': farther than threshold * MAD from the median, the median
+      absolute deviation is scaled to be consistent with the standard
+      deviation
+    * 'trim': the threshold percent lowest and highest samples
+
+    If threshold is None, use the default threshold of the method.
+    """
+    try:
+        default_threshold = OUTLIER_METHODS[method]
+    except KeyError:
+        raise ValueError("unknown outlier method: %r" % method)
+    if threshold is None:
+        threshold = default_threshold
+    if threshold < 0:
+        raise ValueError("outlier threshold must be positive")
+
+    sorted_samples = sorted(samples)
+    if method == 'iqr':
+        q1 = quantile_sorted(sorted_samples, 0.25)
+        q3 = quantile_sorted(sorted_samples, 0.75)
+        iqr = q3 - q1
+        return (q1 - threshold * iqr, q3 + threshold * iqr)
+    elif method == 'mad':
+        median_value = median_sorted(sorted_samples)
+        deviations = sorted(abs(sample - median_value)
+                            for sample in sorted_samples)
+        mad = median_sorted(deviations) * _MAD_SCALE
+        return (median_value - threshold * mad,
+                median_value + threshold * mad)
+    else:
+        if threshold >= 50:
+            raise ValueError("cannot trim %s%% of samples on each side"
+                             % threshold)
+        fraction = threshold / 100
+        return (quantile_sorted(sorted_samples, fraction),
+                quantile_sorted(sorted_samples, 1.0 - fraction))
+
+
+def _min_max(samples):
+    if not is_in_memory(samples):
+        numpy = _get_numpy()
+        if numpy is not None:
+            array = _as_array(numpy, samples)
+            return (float(array.min()), float(array.max()))
+    return (min(samples), max(samples))
+
+
+def _kde(samples, low, high):
+    # Gaussian kernel density estimation on a grid, with samples binned on
+    # the grid: O(nsample + npoint * kernel width).
+    # Return (first, step, counts, density), or None if evenly spaced samples
+    # have a null spread: other samples are too rare to form a mode.
+    nsample = len(samples)
+    if nsample > _KDE_MAX_SORT:
+        # the spread of evenly spaced samples is close to the spread of all
+        # samples: don't sort all samples
+        sorted_samples = sorted(samples[index * nsample // _KDE_MAX_SORT]
+                                for index in range(_KDE_MAX_SORT))
+    else:
+        sorted_samples = sorted(samples)
+    spread = stdev(sorted_samples)
+    iqr = (quantile_sorted(sorted_samples, 0.75)
+           - quantile_sorted(sorted_samples, 0.25))
+    if iqr:
+        spread = min(spread, iqr / 1.349)
+    # Silverman's rule of thumb
+    bandwidth = 0.9 * spread * nsample ** (-0.2)
+    # Samples quantized by the timer resolution must not create one mode per
+    # distinct value: the bandwidth is at least the median gap between
+    # distinct values
+    gaps = [sample2 - sample1
+            for sample1, sample2 in zip(sorted_samples, sorted_samples[1:])
+            if sample2 != sample1]
+    if not gaps:
+        return None
+    bandwidth = max(bandwidth, median_sorted(sorted(gaps)))
+
+    first = low - 3 * bandwidth
+    last = high + 3 * bandwidth
+    npoint = int(math.ceil((last - first) / (bandwidth / 4))) + 1
+    npoint = min(max(npoint, _KDE_MIN_NPOINT), _KDE_MAX_NPOINT)
+    step = (last - first) / (npoint - 1)
+
+    numpy = None
+    if nsample >= _NUMPY_MIN_SAMPLES:
+        numpy = _get_numpy()
+    if numpy is not None:
+        indexes = numpy.rint((_as_array(numpy, samples) - first) / step)
+        counts = numpy.bincount(indexes.astype(numpy.intp),
+                                minlength=npoint).tolist()
+    else:
+        counts = [0] * npoint
+        for sample in samples:
+            counts[int((sample - first) / step + 0.5)] += 1
+
+    width = int(math.ceil(4 * bandwidth / step))
+    kernel = [math.exp(-0.5 * (offset * step / bandwidth) ** 2)
+              for offset in range(width + 1)]
+    density = [0.0] * npoint
+    for index, count in enumerate(counts):
+        if not count:
+            continue
+        for offset in range(max(index - width, 0),
+                            min(index + width + 1, npoint)):
+            density[offset] += count * kernel[abs(offset - index)]
+    return (first, step, counts, density)
+
+
+def find_modes(samples):
+    """Find the modes of the distribution of samples.
+
+    Use a Gaussian kernel density estimation with the bandwidth of the
+    Silverman's rule of thumb. Modes with a weight smaller than 10% of
+    samples, or separated by a shallow dip, are merged into their neighbour.
+
+    Return a list of Mode(location, weight, low, high) sorted by location:
+    weight is the fraction of samples in the range [low; high[ of the mode.
+    Less than 50 samples, or samples with a null spread, have a single mode
+    at the median.
+    """
+    nsample = len(samples)
+    if not nsample:
+        raise _statistics_error("no mode for empty data")
+
+    def single():
+        return [Mode(median(samples), 1.0, float('-inf'), float('inf'))]
+
+    if nsample < _MODES_MIN_SAMPLES:
+        return single()
+    low, high = _min_max(samples)
+    if low == high:
+        return [Mode(low, 1.0, float('-inf'), float('inf'))]
+
+    kde = _kde(samples, low, high)
+    if kde is None:
+        return single()
+    first, step, counts, density = kde
+    npoint = len(density)
+
+    peaks = [index for index in range(npoint)
+             if (index == 0 or density[index - 1] < density[index])
+             and (index == npoint - 1 or density[index] >= density[index + 1])
+             and density[index]]
+    # valleys[i] is the antimode between peaks[i] and peaks[i + 1]
+    valleys = []
+    for left, right in zip(peaks, peaks[1:]):
+        valleys.append(min(range(left, right + 1), key=density.__getitem__))
+
+    def weights():
+        bounds = [-1] + valleys + [npoint - 1]
+        return [sum(counts[bounds[pos] + 1:bounds[pos + 1] + 1]) / nsample
+                for pos in range(len(peaks))]
+
+    # Merge weak modes, smallest weight first
+    while len(peaks) > 1:
+        mode_weights = weights()
+        weak = None
+        for pos, peak in enumerate(peaks):
+            dips = []
+            if pos > 0:
+                dips.append(density[valleys[pos - 1]])
+            if pos < len(valleys):
+                dips.append(density[valleys[pos]])
+            shallow = (max(dips) > _MODE_MAX_DIP * density[peak])
+            if (mode_weights[pos] < _MODE_MIN_WEIGHT or shallow) and (
+                    weak is None or mode_weights[pos] < mode_weights[weak]):
+                weak = pos
+        if weak is None:
+            break
+
+        # merge the mode through its shallowest side
+        if weak == 0:
+            valley = 0
+        elif weak == len(peaks) - 1:
+            valley = weak - 1
+        elif density[valleys[weak - 1]] >= density[valleys[weak]]:
+            valley = weak - 1
+        else:
+            valley = weak
+        del valleys[valley]
+        del peaks[weak]
+
+    if len(peaks) == 1:
+        return single()
+
+    modes = []
+    mode_weights = weights()
+    for pos, peak in enumerate(peaks):
+        if pos > 0:
+            low = first + (valleys[pos - 1] + 0.5) * step
+        else:
+            low = float('-inf')
+        if pos < len(valleys):
+            high = first + (valleys[pos] + 0.5) * step
+        else:
+            high = float('inf')
+        modes.append(Mode(first + peak * step, mode_weights[pos], low, high))
+    return modes
+
+
+def is_steady_state(samples, window=_STEADY_WINDOW,
+                    tolerance=_STEADY_TOLERANCE):
+    """Check if the last samples of a series reached a steady state.
+
+    Compare the medians of the two halves of the last samples: the last
+    window samples, or the last half of samples if it is longer. The
+    series is steady if the medians differ by less than tolerance (relative
+    to the median), or by less than two standard errors of the difference
+    for noisy samples. The noise is estimated from the deviations of the
+    differences of consecutive samples from their median, which are not
+    impacted by a slow trend.
+    """
+    if window < _STEADY_MIN_WINDOW:
+        raise ValueError("window must be at least %s samples"
+                         % _STEADY_MIN_WINDOW)
+    if len(samples) < window:
+        return False
+
+    # a slow trend is only visible on a long window
+    window = max(window, len(samples) // 2)
+    last = list(samples[-window:])
+    half = window // 2
+    median1 = median_sorted(sorted(last[:-half]))
+    median2 = median_sorted(sorted(last[-half:]))
+
+    diffs = sorted(last[index + 1] - last[index]
+                   for index in range(window - 1))
+    # the median difference is the slope of a linear trend
+    slope = median_sorted(diffs)
+    deviations = sorted(abs(diff - slope) for diff in diffs)
+    stdev = median_sorted(deviations) * _MAD_SCALE / math.sqrt(2)
+    # standard error of the median: 1.2533 * stdev / sqrt(n)
+    stderr = 1.2533 * stdev / math.sqrt(half)
+    threshold = max(tolerance * abs(median2),
+                    2 * math.sqrt(2) * stderr)
+    return abs(median2 - median1) <= threshold
+
+
+def _percentile_interval(values, confidence):
+    values = sorted(values)
+    alpha = (1.0 - confidence) / 2
+    nvalue = len(values)
+    low = int(math.floor(alpha * nvalue))
+    high = int(math.ceil((1.0 - alpha) * nvalue)) - 1
+    return (values[low], values[max(high, low)])
+
+
+def _median_order_statistics(nsample, nresample, seed):
+    # int(rand() * nsample) is increasing with rand(), so the k-th smallest
+    # of nsample drawn indexes is int(nsample * U(k)) where U(k), the k-th
+    # smallest of nsample uniform numbers, follows the Beta(k, nsample-k+1)
+    # distribution. Given U(k), U(k+1) is the minimum of nsample-k uniform
+    # numbers in [U(k); 1]. Draw these two order statistics rather than
+    # nsample indexes per resample.
+    import random as _random
+
+    rand = _random.Random(seed)
+    low_rank = (nsample - 1) // 2
+    high_rank = nsample // 2
+    lows = []
+    highs = []
+    for _ in range(nresample):
+        low = rand.betavariate(low_rank + 1, nsample - low_rank)
+        if high_rank != low_rank:
+            high = low + (1.0 - low) * (1.0 - (1.0 - rand.random())
+                                        ** (1.0 / (nsample - high_rank)))
+        else:
+            high = low
+        lows.append(min(int(low * nsample), nsample - 1))
+        highs.append(min(int(high * nsample), nsample - 1))
+    return (lows, highs)
+
+
+def _bootstrap_median_indexes(nsample, nresample, seed, numpy):
+    # Resamples are drawn from sorted samples, so the median of a resample is
+    # (sorted_samples[low] + sorted_samples[high]) / 2 where low and high are
+    # the two middle indexes of the sorted drawn indexes. Indexes only depend
+    # on the number of samples: they are cached.
+    #
+    # Use numpy only to draw many indexes: results don't depend on numpy
+    # for usual numbers of samples.
+    #
+    # With many samples, drawing nsample indexes per resample is too slow and
+    # uses too much memory: draw the middle indexes directly.
+    #
+    # Indexes are returned as numpy arrays if numpy is used.
+    key = (nsample, nresample, seed, numpy is not None)
+    indexes = _median_indexes_cache.get(key)
+    if indexes is not None:
+        return indexes
+
+    ndraw = nsample * nresample
+    low_rank = (nsample - 1) // 2
+    high_rank = nsample // 2
+    if ndraw > _BOOTSTRAP_MAX_DRAWS:
+        indexes = _median_order_statistics(nsample, nresample, seed)
+    elif numpy is not None and ndraw >= _BOOTSTRAP_NUMPY_MIN_DRAWS:
+        random = numpy.random.RandomState(seed)
+        # limit the memory usage: draw by chunks of rows
+        chunk = max(_BOOTSTRAP_CHUNK // nsample, 1)
+        lows = []
+        highs = []
+        for start in range(0, nresample, chunk):
+            size = min(chunk, nresample - start)
+            draws = random.randint(0, nsample, size=(size, nsample))
+            draws = numpy.partition(draws, sorted({low_rank, high_rank}),
+                                    axis=1)
+            # copy columns: a view would keep the whole chunk alive
+            lows.append(draws[:, low_rank].copy())
+            highs.append(draws[:, high_rank].copy())
+        indexes = (numpy.concatenate(lows), numpy.concatenate(highs))
+    else:
+        import random as _random
+
+        rand = _random.Random(seed).random
+        lows = []
+        highs = []
+        for _ in range(nresample):
+            draws = sorted([int(rand() * nsample) for _ in range(nsample)])
+            lows.append(draws[low_rank])
+            highs.append(draws[high_rank])
+        indexes = (lows, highs)
+    if numpy is not None:
+        indexes = tuple(numpy.asarray(item) for item in indexes)
+
+    if len(_median_indexes_cache) >= _BOOTSTRAP_CACHE_SIZE:
+        _median_indexes_cache.clear()
+    _median_indexes_cache[key] = indexes
+    return indexes
+
+
+def _bootstrap_median_array(numpy, samples, nresample, seed):
+    lows, highs = _bootstrap_median_indexes(len(samples), nresample, seed,
+                                            numpy)
+    sorted_samples = numpy.sort(_as_array(numpy, samples))
+    return (sorted_samples[lows] + sorted_samples[highs]) / 2
+
+
+def _bootstrap_medians(samples, nresample, seed):
+    # Medians of nresample resamples (with replacement) of samples
+    numpy = _get_numpy()
+    if numpy is not None:
+        return _bootstrap_median_array(numpy, samples, nresample,
+                                       seed).tolist()
+
+    lows, highs = _bootstrap_median_indexes(len(samples), nresample, seed,
+                                            None)
+    sorted_samples = sorted(samples)
+    return [(sorted_samples[low] + sorted_samples[high]) / 2
+            for low, high in zip(lows, highs)]
+
+
+def bootstrap_median_ci(samples, confidence=0.95,
+                        nresample=_BOOTSTRAP_NRESAMPLE, seed=_BOOTSTRAP_SEED):
+    """Bootstrap confidence interval of the median: return (low, high)."""
+    if not len(samples):
+        raise _statistics_error("no median for empty data")
+    medians = _bootstrap_medians(samples, nresample, seed)
+    return _percentile_interval(medians, confidence)
+
+
+def bootstrap_ratio_ci(samples1, samples2, confidence=0.95,
+                       nresample=_BOOTSTRAP_NRESAMPLE, seed=_BOOTSTRAP_SEED):
+    """Bootstrap confidence interval of median(samples1) / median(samples2).
+
+    Return (low, high).
+    """
+    if not len(samples1) or not len(samples2):
+        raise _statistics_error("no median for empty data")
+    medians1 = _bootstrap_medians(samples1, nresample, seed)
+    # use a different seed: sample sets are resampled independently
+    medians2 = _bootstrap_medians(samples2, nresample, seed + 1)
+    ratios = [median1 / median2
+              for median1, median2 in zip(medians1, medians2)]
+    return _percentile_interval(ratios, confidence)
+
+
+def _weighted_log_mean(logs, weights):
+    return math.fsum(map(operator.mul, logs, weights)) / math.fsum(weights)
+
+
+def geometric_mean_speed(pairs, weights=None, confidence=0.95,
+                         nresample=_BOOTSTRAP_NRESAMPLE, seed=_BOOTSTRAP_SEED):
+    """Weighted geometric mean of speeds and its bootstrap confidence interval.
+
+    pairs is a list of (ref_samples, changed_samples) tuples: the speed of a
+    pair is median(ref_samples) / median(changed_samples). weights is an
+    optional list of weights of pairs (default: 1.0); pairs with a weight of
+    zero are ignored.
+
+    Return GeometricMean(speed, low, high).
+    """
+    pairs = list(pairs)
+    if weights is None:
+        weights = [1.0] * len(pairs)
+    else:
+        weights = [float(weight) for weight in weights]
+        if len(weights) != len(pairs):
+            raise ValueError("need one weight per pair")
+        if any(weight < 0 for weight in weights):
+            raise ValueError("weights must be positive")
+    items = [(pair, weight) for pair, weight in zip(pairs, weights) if weight]
+    if not items:
+        raise ValueError("no pair with a non-zero weight")
+    weights = [weight for pair, weight in items]
+
+    logs = []
+    for (samples1, samples2), weight in items:
+        if not len(samples1) or not len(samples2):
+            raise _statistics_error("no median for empty data")
+        logs.append(math.log(median(samples1) / median(samples2)))
+    speed = math.exp(_weighted_log_mean(logs, weights))
+
+    # Resampled medians only depend on the number of samples and on the
+    # seed: pick the resampled medians of each pair at random indexes to
+    # resample pairs independently, without drawing new samples for each
+    # pair. Indexes of all pairs are drawn from a single random generator.
+    npair = len(items)
+    numpy = None
+    if npair * nresample >= _NUMPY_MIN_SAMPLES:
+        numpy = _get_numpy()
+    if numpy is not None:
+        random = numpy.random.RandomState(seed)
+        picks = random.randint(0, nresample, size=(npair, nresample))
+        resample_logs = numpy.empty((npair, nresample))
+        for index, ((samples1, samples2), weight) in enumerate(items):
+            medians1 = _bootstrap_median_array(numpy, samples1, nresample,
+                                               seed)
+            medians2 = _bootstrap_median_array(numpy, samples2, nresample,
+                                               seed + 1)
+            resample_logs[index] = numpy.log(medians1 / medians2)
+        resample_logs = resample_logs[numpy.arange(npair)[:, None], picks]
+        means = numpy.dot(weights, resample_logs) / math.fsum(weights)
+        means = numpy.exp(means).tolist()
+    else:
+        import random as _random
+
+        rand = _random.Random(seed).random
+        resample_logs = []
+        for (samples1, samples2), weight in items:
+            lows1, highs1 = _bootstrap_median_indexes(len(samples1),
+                                                      nresample, seed, None)
+            lows2, highs2 = _bootstrap_median_indexes(len(samples2),
+                                                      nresample, seed + 1,
+                                                      None)
+            sorted1 = sorted(samples1)
+            sorted2 = sorted(samples2)
+            picks = [int(rand() * nresample) for _ in range(nresample)]
+            # medians are (sorted[low] + sorted[high]) / 2: the divisions
+            # by 2 cancel out in the ratio
+            resample_logs.append([
+                math.log((sorted1[lows1[pick]] + sorted1[highs1[pick]])
+                         / (sorted2[lows2[pick]] + sorted2[highs2[pick]]))
+                for pick in picks])
+        means = [math.exp(_weighted_log_mean(resample, weights))
+                 for resample in zip(*resample_logs)]
+    low, high = _percentile_interval(means, confidence)
+    return GeometricMean(speed, low, high)
+
+
+def _bootstrap_task(task):
+    samples_list, confidence = task
+    if len(samples_list) == 1:
+        return bootstrap_median_ci(samples_list[0], confidence)
+    else:
+        return bootstrap_ratio_ci(samples_list[0], samples_list[1],
+                                  confidence)
+
+
+def bootstrap_cis(tasks, confidence=0.95, processes=None):
+    """Compute many bootstrap confidence intervals.
+
+    tasks is a list of (samples,) to compute the confidence interval of the
+    median, or (samples1, samples2) to compute the confidence interval of
+    the ratio of medians. Return a list of (low, high) tuples.
+
+    Use a pool of processes if there are many tasks. Results don't depend
+    on the number of processes, since each task uses the same seed.
+    """
+    import multiprocessing
+
+    tasks = [(tuple(task), confidence) for task in tasks]
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    if processes <= 1 or len(tasks) < _BOOTSTRAP_POOL_MIN_TASKS:
+        return [_bootstrap_task(task) for task in tasks]
+
+    pool = multiprocessing.Pool(processes)
+    try:
+        chunksize = max(len(tasks) // (processes * 4), 1)
+        results = pool.map(_bootstrap_task, tasks, chunksize)
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+    return results
@@ -0,0 +1,226 @@
+"""
+History of benchmark results stored in a SQLite database.
+
+Each benchmark of an ingested benchmark suite is stored as a row indexed by
+its name, hostname, Python version and dates, with its median and standard
+deviation: listing results doesn't need to decode the JSON of runs.
+
+Unknown hostname, Python version and dates are stored as empty strings rather
+than NULL: NULL values are never equal in a UNIQUE constraint, a benchmark
+without hostname would be stored again each time its file is ingested.
+"""
+from __future__ import division, print_function, absolute_import
+
+import collections
+import os.path
+
+from perf._bench import Benchmark, BenchmarkSuite, _JSON_VERSION
+from perf._utils import parse_iso8601
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS benchmark (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    hostname TEXT,
+    python_version TEXT,
+    start_date TEXT,
+    end_date TEXT,
+    unit TEXT NOT NULL,
+    median REAL NOT NULL,
+    stdev REAL,
+    nsample INTEGER NOT NULL,
+    filename TEXT,
+    data TEXT NOT NULL,
+    UNIQUE (name, hostname, python_version, start_date, end_date)
+);
+CREATE INDEX IF NOT EXISTS benchmark_name
+    ON benchmark (name, start_date);
+CREATE INDEX IF NOT EXISTS benchmark_hostname
+    ON benchmark (hostname, start_date);
+CREATE INDEX IF NOT EXISTS benchmark_python_version
+    ON benchmark (python_version, start_date);
+CREATE INDEX IF NOT EXISTS benchmark_start_date
+    ON benchmark (start_date);
+"""
+
+_ENTRY_FIELDS = ('id', 'name', 'hostname', 'python_version',
+                 'start_date', 'end_date', 'unit', 'median', 'stdev',
+                 'nsample', 'filename')
+
+StoreEntry = collections.namedtuple('StoreEntry', _ENTRY_FIELDS)
+
+
+def _format_date(date):
+    if date is None:
+        return ''
+    return date.isoformat()
+
+
+def _parse_date(date):
+    if not date:
+        return None
+    return parse_iso8601(date)
+
+
+class ResultStore(object):
+    """History of benchmark results stored in a SQLite database."""
+
+    def __init__(self, filename):
+        # sqlite3 is slow to import and only needed to use a store
+        import sqlite3
+
+        self.filename = filename
+        self._conn = sqlite3.connect(filename)
+        self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _benchmark_row(self, bench, filename):
+        import json
+
+        metadata = bench.get_metadata()
+
+        def get_metadata(name):
+            obj = metadata.get(name)
+            if obj is None:
+                return ''
+            return obj.value
+
+        dates = bench.get_dates()
+        if dates:
+            start, end = dates
+        else:
+            start = end = None
+
+        summary = bench._get_summary()
+
+        data = bench._as_json()
+        for run, run_data in zip(bench.get_runs(), data['runs']):
+            # sample files are resolved relative to the JSON file, which
+            # is not known anymore when the benchmark is loaded back
+            if 'samples_file' in run_data:
+                run_data['samples_file'] = os.path.abspath(
+                    run.samples.filename)
+
+        return (bench.get_name(),
+                get_metadata('hostname'),
+                get_metadata('python_version'),
+                _format_date(start),
+                _format_date(end),
+                bench.get_unit(),
+                summary.median,
+                summary.stdev,
+                summary.nsample,
+                filename,
+                json.dumps(data, separators=(',', ':'), sort_keys=True))
+
+    def add_suite(self, suite, filename=None):
+        """Store benchmarks of a suite.
+
+        Benchmarks already stored (same name, hostname, Python version and
+        dates) are ignored. Return the number of stored benchmarks.
+        """
+        if filename is None:
+            filename = suite.filename
+        if filename:
+            filename = os.path.abspath(filename)
+
+        rows = [self._benchmark_row(bench, filename) for bench in suite]
+        with self._conn:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO benchmark "
+                "(name, hostname, python_version, start_date, end_date, "
+                " unit, median, stdev, nsample, filename, data) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows)
+            return self._conn.total_changes - before
+
+    def _select(self, columns, name, hostname, python_version, start, end):
+        conditions = []
+        params = []
+        if name is not None:
+            conditions.append('name = ?')
+            params.append(name)
+        if hostname is not None:
+            conditions.append('hostname = ?')
+            params.append(hostname)
+        if python_version is not None:
+            # "3.5" matches "3.5.2 (64-bit)"
+            conditions.append('(python_version = ? OR python_version GLOB ?'
+                              ' OR python_version GLOB ?)')
+            params.extend((python_version,
+                           python_version + '.*',
+                           python_version + ' *'))
+        if start is not None:
+            conditions.append('start_date >= ?')
+            params.append(_format_date(start))
+        if end is not None:
+            # benchmarks without date are stored with an empty date
+            conditions.append("start_date < ? AND start_date != ''")
+            params.append(_format_date(end))
+
+        sql = 'SELECT %s FROM benchmark' % ', '.join(columns)
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += ' ORDER BY name, start_date, id'
+        return self._conn.execute(sql, params)
+
+    def query(self, name=None, hostname=None, python_version=None,
+              start=None, end=None):
+        """Get the list of stored benchmarks matching the criteria.
+
+        Return a list of StoreEntry sorted by name and date. Runs are not
+        loaded.
+        """
+        cursor = self._select(_ENTRY_FIELDS, name, hostname, python_version,
+                              start, end)
+        entries = []
+        for row in cursor:
+            entry = StoreEntry(*row)
+            entry = entry._replace(hostname=entry.hostname or None,
+                                   python_version=entry.python_version or None,
+                                   start_date=_parse_date(entry.start_date),
+                                   end_date=_parse_date(entry.end_date))
+            entries.append(entry)
+        return entries
+
+    def get_suites(self, name=None, hostname=None, python_version=None,
+                   start=None, end=None):
+        """Load stored benchmarks matching the criteria.
+
+        Return a list of BenchmarkSuite: one suite per ingested file, sorted
+        by date.
+        """
+        import json
+
+        cursor = self._select(('filename', 'start_date', 'data'),
+                              name, hostname, python_version, start, end)
+
+        suites = []
+        by_filename = {}
+        for filename, start_date, data in sorted(
+                cursor, key=lambda row: (row[1] or '', row[0] or '')):
+            bench = Benchmark._json_load(json.loads(data), _JSON_VERSION)
+            name = bench.get_name()
+
+            # a file ingested again after new runs were appended produces
+            # a second benchmark with the same name: use another suite
+            file_suites = by_filename.setdefault(filename, [])
+            for suite in file_suites:
+                if name not in suite._get_index():
+                    break
+            else:
+                suite = BenchmarkSuite(filename)
+                file_suites.append(suite)
+                suites.append(suite)
+            suite.add_benchmark(bench)
+        return suites
@@ -10,6 +10,13 @@ import timeit
 import perf
 
 
+# --inner-loops=auto: maximum overhead of the outer loop, ratio of the time
+# of an outer loop iteration
+_AUTO_INNER_LOOPS_OVERHEAD = 0.05
+# Maximum number of copies of the statement
+_MAX_INNER_LOOPS = 1024
+
+
 def _format_stmt(statements):
     result = []
     for stmt in statements:
@@ -25,14 +32,25 @@ def _stmt_metadata(statements):
     return ' '.join(repr(stmt) for stmt in statements)
 
 
-def create_timer(runner):
+def _add_curdir_to_path():
     # Include the current directory, so that local imports work (sys.path
     # contains the directory of this script, rather than the current
     # directory)
     import os
     sys.path.insert(0, os.curdir)
 
-    stmt = "\n".join(runner.args.stmt)
+
+def create_timer(runner, stmt=None, inner_loops=None):
+    """Create a timeit.Timer of the statements stmt (default: runner.args.stmt).
+
+    The statements are copied inner_loops times (default:
+    runner.inner_loops) in the body of the loop.
+    """
+    if stmt is None:
+        stmt = runner.args.stmt
+    if inner_loops is None:
+        inner_loops = runner.inner_loops or 1
+    stmt = "\n".join(stmt * inner_loops)
     setup = "\n".join(runner.args.setup)
 
     return timeit.Timer(stmt, setup, timer=perf.perf_counter)
@@ -41,6 +59,14 @@ def create_timer(runner):
 def prepare_args(runner, cmd):
     for setup in runner.args.setup:
         cmd.extend(("--setup", setup))
+    # pass the number of inner loops computed by the first worker
+    inner_loops = runner.inner_loops
+    if inner_loops is None:
+        inner_loops = runner.args.inner_loops
+    if inner_loops is not None:
+        cmd.extend(("--inner-loops", str(inner_loops)))
+    for name, stmt in runner.args.statement:
+        cmd.extend(("--statement", name, stmt))
     cmd.extend(runner.args.stmt)
 
 
@@ -53,16 +79,122 @@ def sample_func(loops, timer):
         return timer.inner(it, timer.timer)
 
 
+def _time_per_loop(timer, min_time):
+    # Minimum time of a loop iteration of 3 samples of at least min_time
+    loops = 1
+    while True:
+        dt = sample_func(loops, timer)
+        if dt >= min_time:
+            break
+        loops *= 2
+        if loops > 2 ** 32:
+            raise ValueError("error in calibration, loops is "
+                             "too big: %s" % loops)
+    for _ in range(2):
+        dt = min(dt, sample_func(loops, timer))
+    return dt / loops
+
+
+def _auto_inner_loops(runner, statements):
+    """Compute the number of inner loops from the overhead of the loop.
+
+    Compare the time of a loop iteration running the "pass" statement to the
+    time of statements: the statements are copied until the overhead of the
+    loop is smaller than 5% of an iteration. Use the number of inner loops of
+    the fastest statements.
+    """
+    min_time = runner.args.min_time / 10
+    overhead = _time_per_loop(timeit.Timer(timer=perf.perf_counter),
+                              min_time)
+
+    stmt_time = None
+    for stmt in statements:
+        timer = create_timer(runner, stmt, inner_loops=1)
+        try:
+            dt = _time_per_loop(timer, min_time) - overhead
+        except Exception:
+            timer.print_exc()
+            sys.exit(1)
+        if stmt_time is None or dt < stmt_time:
+            stmt_time = dt
+
+    inner_loops = 1
+    while (inner_loops < _MAX_INNER_LOOPS
+           and (overhead > _AUTO_INNER_LOOPS_OVERHEAD
+                * (overhead + inner_loops * stmt_time))):
+        inner_loops *= 2
+    return inner_loops
+
+
+def _setup_inner_loops(runner, statements):
+    inner_loops = runner.args.inner_loops
+    if inner_loops == 'auto':
+        if not runner.args.worker:
+            # computed by the first worker
+            return
+        inner_loops = _auto_inner_loops(runner, statements)
+    runner.inner_loops = inner_loops
+
+
+def _main_statements(runner):
+    # Named statements sharing the same setup: each worker process runs all
+    # statements
+    sample_funcs = []
+    # timer of the running statement, used to display the traceback
+    running = []
+    statements = [(name, _format_stmt(stmt.splitlines()))
+                  for name, stmt in runner.args.statement]
+    _setup_inner_loops(runner, [stmt for name, stmt in statements])
+    for name, stmt in statements:
+        timer = create_timer(runner, stmt)
+
+        def named_sample_func(loops, timer=timer):
+            running[:] = [timer]
+            return sample_func(loops, timer)
+
+        metadata = {'timeit_stmt': _stmt_metadata(stmt)}
+        sample_funcs.append((name, named_sample_func, metadata))
+
+    try:
+        runner._bench_sample_funcs(sample_funcs)
+    except Exception:
+        if running:
+            running[0].print_exc()
+        else:
+            raise
+        sys.exit(1)
+
+
 def main(runner):
-    runner.args.setup = _format_stmt(runner.args.setup)
-    runner.args.stmt = _format_stmt(runner.args.stmt)
+    args = runner.args
+    if args.statement and args.stmt:
+        print("ERROR: statements cannot be passed both as arguments "
+              "and with --statement")
+        sys.exit(1)
+    if not args.statement and not args.stmt:
+        print("ERROR: no statement to benchmark")
+        sys.exit(1)
+    names = [name for name, stmt in args.statement]
+    if len(set(names)) != len(names):
+        print("ERROR: statement names must be unique")
+        sys.exit(1)
 
-    runner.metadata['timeit_setup'] = _stmt_metadata(runner.args.setup)
-    runner.metadata['timeit_stmt'] = _stmt_metadata(runner.args.stmt)
+    args.setup = _format_stmt(args.setup)
+    runner.metadata['timeit_setup'] = _stmt_metadata(args.setup)
 
     runner.program_args = (sys.executable, '-m', 'perf', 'timeit')
     runner.prepare_subprocess_args = prepare_args
 
+    _add_curdir_to_path()
+
+    if args.statement:
+        _main_statements(runner)
+        return
+
+    args.stmt = _format_stmt(args.stmt)
+    runner.metadata['timeit_stmt'] = _stmt_metadata(args.stmt)
+
+    _setup_inner_loops(runner, [args.stmt])
     timer = create_timer(runner)
 
     try:
@@ -0,0 +1,138 @@
+"""
+Trend of benchmark results over time and detection of change points.
+
+A time series is the list of medians of a benchmark ordered by date, one
+point per result file. Change points are detected by binary segmentation:
+a segment is split where the split reduces the most the sum of squared
+errors, if the reduction is larger than a penalty computed from the noise
+of the series (Schwarz criterion). Then consecutive segments are merged
+while the shift of their median is too small.
+"""
+from __future__ import division, print_function, absolute_import
+
+import collections
+import math
+
+from perf import _stats
+
+
+# Minimum number of points of a segment: the median of 3 points is not
+# impacted by a single outlier
+_MIN_SEGMENT = 3
+# Factor of the penalty: log(npoint) * noise variance
+_PENALTY_FACTOR = 3.0
+# MAD of the standard normal distribution: 1 / 1.4826
+_MAD_SCALE = 1.4826
+
+TrendPoint = collections.namedtuple('TrendPoint', 'date median filename')
+ChangePoint = collections.namedtuple('ChangePoint', 'index before after')
+
+
+def build_series(suites):
+    """Build the time series of benchmarks.
+
+    Return a dictionary: benchmark name => list of TrendPoint sorted by
+    date. The date of a point is the start date of the benchmark. Benchmarks
+    without date are ignored.
+    """
+    series = {}
+    for suite in suites:
+        for bench in suite:
+            dates = bench.get_dates()
+            if not dates:
+                continue
+            point = TrendPoint(dates[0], bench.median(), suite.filename)
+            series.setdefault(bench.get_name(), []).append(point)
+
+    for points in series.values():
+        points.sort(key=lambda point: point.date)
+    return series
+
+
+def _noise_variance(values):
+    # Robust estimation of the variance of the noise from the differences
+    # of consecutive values: a few shifts don't change the median
+    diffs = [abs(values[index + 1] - values[index])
+             for index in range(len(values) - 1)]
+    if not diffs:
+        return 0.0
+    stdev = _stats.median(diffs) * _MAD_SCALE / math.sqrt(2)
+    return stdev ** 2
+
+
+def _best_split(prefix, prefix2, start, end):
+    # Find the split of values[start:end] minimizing the sum of squared
+    # errors of the two segments, using prefix sums: O(end - start)
+    def sse(first, last):
+        count = last - first
+        total = prefix[last] - prefix[first]
+        return (prefix2[last] - prefix2[first]) - total * total / count
+
+    best = None
+    for index in range(start + _MIN_SEGMENT, end - _MIN_SEGMENT + 1):
+        cost = sse(start, index) + sse(index, end)
+        if best is None or cost < best[0]:
+            best = (cost, index)
+    if best is None:
+        return None
+    cost, index = best
+    return (sse(start, end) - cost, index)
+
+
+def change_points(values, min_shift=0.05):
+    """Detect change points of a series of values.
+
+    min_shift is the minimum relative shift of the median of two consecutive
+    segments, ex: 0.05 for 5%. Return a list of ChangePoint(index, before,
+    after) sorted by index: index is the index of the first value of the new
+    segment, before and after are the medians of the segments before and
+    after the change.
+    """
+    values = list(values)
+    npoint = len(values)
+    if npoint < 2 * _MIN_SEGMENT:
+        return []
+
+    # center values to limit rounding errors of prefix sums
+    offset = _stats.median(values)
+    prefix = [0.0]
+    prefix2 = [0.0]
+    for value in values:
+        value -= offset
+        prefix.append(prefix[-1] + value)
+        prefix2.append(prefix2[-1] + value * value)
+
+    penalty = _PENALTY_FACTOR * math.log(npoint) * _noise_variance(values)
+
+    splits = []
+    segments = [(0, npoint)]
+    while segments:
+        start, end = segments.pop()
+        result = _best_split(prefix, prefix2, start, end)
+        if result is None:
+            continue
+        gain, index = result
+        if gain <= penalty:
+            continue
+        splits.append(index)
+        segments.append((start, index))
+        segments.append((index, end))
+    splits.sort()
+
+    # Merge consecutive segments while the smallest shift is smaller than
+    # min_shift
+    while True:
+        bounds = [0] + splits + [npoint]
+        medians = [_stats.median(values[bounds[index]:bounds[index + 1]])
+                   for index in range(len(bounds) - 1)]
+        if not splits:
+            break
+        shifts = [abs(medians[pos + 1] - medians[pos]) / medians[pos]
+                  for pos in range(len(splits))]
+        pos = min(range(len(shifts)), key=shifts.__getitem__)
+        if shifts[pos] >= min_shift:
+            break
+        del splits[pos]
+
+    return [ChangePoint(index, medians[pos], medians[pos + 1])
+            for pos, index in enumerate(splits)]
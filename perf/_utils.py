@@ -1,13 +1,12 @@
 from __future__ import division, print_function, absolute_import
 
-import datetime
 import math
 import os
-import platform
 import sys
 
 import six
-import statistics
+
+from perf import _stats
 
 
 MS_WINDOWS = (sys.platform == 'win32')
@@ -110,6 +109,8 @@ UNIT_FORMATTERS = {
 
 
 def parse_iso8601(date):
+    import datetime
+
     if '.' in date:
         date, floatpart = date.split('.', 1)
         floatpart = float('.' + floatpart)
@@ -177,10 +178,10 @@ def pooled_sample_variance(sample1, sample2):
     """
     deg_freedom = len(sample1) + len(sample2) - 2
     # FIXME: use median?
-    mean1 = statistics.mean(sample1)
-    squares1 = ((x - mean1) ** 2 for x in sample1)
-    mean2 = statistics.mean(sample2)
-    squares2 = ((x - mean2) ** 2 for x in sample2)
+    mean1 = _stats.mean(sample1)
+    squares1 = [(x - mean1) ** 2 for x in sample1]
+    mean2 = _stats.mean(sample2)
+    squares2 = [(x - mean2) ** 2 for x in sample2]
 
     return (math.fsum(squares1) + math.fsum(squares2)) / float(deg_freedom)
 
@@ -195,32 +196,103 @@ def tscore(sample1, sample2):
     Returns:
         The t-test score, as a float.
     """
-    if len(sample1) != len(sample2):
-        raise ValueError("different number of samples")
-    error = pooled_sample_variance(sample1, sample2) / len(sample1)
+    error = (pooled_sample_variance(sample1, sample2)
+             * (1.0 / len(sample1) + 1.0 / len(sample2)))
     # FIXME: use median?
-    diff = statistics.mean(sample1) - statistics.mean(sample2)
-    return diff / math.sqrt(error * 2)
+    diff = _stats.mean(sample1) - _stats.mean(sample2)
+    return diff / math.sqrt(error)
+
+
+def _tscore_summary(summary1, summary2):
+    # Same result than tscore(), but computed from the number of samples,
+    # the mean and the standard deviation (perf._stats.Summary)
+    nsample1 = summary1.nsample
+    nsample2 = summary2.nsample
+    deg_freedom = nsample1 + nsample2 - 2
+    variance = ((summary1.stdev ** 2 * (nsample1 - 1)
+                 + summary2.stdev ** 2 * (nsample2 - 1))
+                / deg_freedom)
+    error = variance * (1.0 / nsample1 + 1.0 / nsample2)
+    diff = summary1.mean - summary2.mean
+    return diff / math.sqrt(error)
+
+
+def _welch_tscore_summary(summary1, summary2):
+    # Welch's t-test (unequal variances): return (t_score, deg_freedom),
+    # deg_freedom is computed by the Welch-Satterthwaite equation
+    error1 = summary1.stdev ** 2 / summary1.nsample
+    error2 = summary2.stdev ** 2 / summary2.nsample
+    error = error1 + error2
+    diff = summary1.mean - summary2.mean
+    t_score = diff / math.sqrt(error)
+    deg_freedom = error ** 2 / (error1 ** 2 / (summary1.nsample - 1)
+                                + error2 ** 2 / (summary2.nsample - 1))
+    return (t_score, deg_freedom)
+
+
+def _is_significant_summary(summary1, summary2):
+    # Same result than is_significant(), see _tscore_summary()
+    deg_freedom = summary1.nsample + summary2.nsample - 2
+    critical_value = tdist95conf_level(deg_freedom)
+    t_score = _tscore_summary(summary1, summary2)
+    return (abs(t_score) >= critical_value, t_score)
+
+
+def _is_significant_welch_summary(summary1, summary2):
+    t_score, deg_freedom = _welch_tscore_summary(summary1, summary2)
+    critical_value = tdist95conf_level(deg_freedom)
+    return (abs(t_score) >= critical_value, t_score)
+
 
+def _is_significant_mann_whitney(sample1, sample2):
+    # Two-tailed test with alpha=0.05: 1.96 is the critical value of the
+    # standard normal distribution
+    u, z_score = _stats.mann_whitney_u(sample1, sample2)
+    return (abs(z_score) >= 1.96, z_score)
 
-def is_significant(sample1, sample2):
+
+# Output formats of CLI commands: 'text' is the human readable output
+FORMATS = ('text', 'json', 'csv')
+
+# Significance tests: name => title
+SIGNIFICANCE_TESTS = {
+    'student': "Student's t-test",
+    'welch': "Welch's t-test",
+    'mann-whitney': "Mann-Whitney U test",
+}
+
+
+def is_significant(sample1, sample2, test='student'):
     """Determine whether two samples differ significantly.
 
-    This uses a Student's two-sample, two-tailed t-test with alpha=0.95.
+    This uses a two-sample, two-tailed test with alpha=0.95. test is the
+    name of the test: 'student' (Student's t-test), 'welch' (Welch's t-test,
+    unequal variances) or 'mann-whitney' (Mann-Whitney U test,
+    non-parametric).
 
     Args:
         sample1: one sample.
         sample2: the other sample.
+        test: name of the significance test.
 
     Returns:
-        (significant, t_score) where significant is a bool indicating whether
-        the two samples differ significantly; t_score is the score from the
-        two-sample T test.
+        (significant, score) where significant is a bool indicating whether
+        the two samples differ significantly; score is the score of the
+        test: t score for t-tests, z score of the normal approximation for
+        the Mann-Whitney U test.
     """
-    deg_freedom = len(sample1) + len(sample2) - 2
-    critical_value = tdist95conf_level(deg_freedom)
-    t_score = tscore(sample1, sample2)
-    return (abs(t_score) >= critical_value, t_score)
+    if test == 'student':
+        deg_freedom = len(sample1) + len(sample2) - 2
+        critical_value = tdist95conf_level(deg_freedom)
+        t_score = tscore(sample1, sample2)
+        return (abs(t_score) >= critical_value, t_score)
+    elif test == 'welch':
+        summary1, summary2 = _stats.summarize((sample1, sample2))
+        return _is_significant_welch_summary(summary1, summary2)
+    elif test == 'mann-whitney':
+        return _is_significant_mann_whitney(sample1, sample2)
+    else:
+        raise ValueError("unknown significance test: %r" % test)
 
 
 def format_cpu_list(cpus):
@@ -335,6 +407,7 @@ def python_implementation():
         # PEP 421, Python 3.3
         name = sys.implementation.name
     else:
+        import platform
         name = platform.python_implementation()
     return name.lower()
 
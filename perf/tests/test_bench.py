@@ -1,7 +1,14 @@
 import datetime
+import os.path
 import tempfile
 
+import six
+import statistics
+
 import perf
+from perf import _stats
+from perf import tests
+from perf.tests import mock
 from perf.tests import unittest
 
 
@@ -92,6 +99,59 @@ class BenchmarkTests(unittest.TestCase):
         metadata = {'name': 'bench', 'hostname': 'toto'}
         bench.add_run(perf.Run([2.0], metadata=metadata))
 
+    def test_median_ci(self):
+        bench = perf.Benchmark()
+        for sample in (1.0, 1.5, 2.0, 2.5, 3.0):
+            bench.add_run(perf.Run([sample], collect_metadata=False))
+
+        low, high = bench.median_ci()
+        self.assertEqual((low, high),
+                         perf.bootstrap_median_ci(bench.get_samples()))
+        self.assertLessEqual(low, bench.median())
+        self.assertGreaterEqual(high, bench.median())
+
+        # add_run() clears the cache
+        bench.add_run(perf.Run([10.0], collect_metadata=False))
+        self.assertEqual(bench.median_ci(),
+                         perf.bootstrap_median_ci(bench.get_samples()))
+
+    def test_add_run_update_cache(self):
+        bench = perf.Benchmark()
+        runs = [perf.Run((sample, sample * 2),
+                         metadata={'name': 'bench', 'os': 'linux',
+                                   'date': '2016-07-20T14:%02d:00' % index,
+                                   'duration': 60.0, 'run': index},
+                         collect_metadata=False)
+                for index, sample in enumerate((3.0, 1.0, 2.0, 5.0))]
+
+        for run in runs:
+            bench.add_run(run)
+            # compute caches which are then updated by add_run()
+            bench.get_metadata()
+            bench.median()
+            bench.get_dates()
+
+            expected = perf.Benchmark()
+            for expected_run in bench.get_runs():
+                expected.add_run(expected_run)
+
+            self.assertEqual(bench.get_nsample(), expected.get_nsample())
+            self.assertEqual(bench.get_samples(), expected.get_samples())
+            self.assertEqual(bench.median(), expected.median())
+            self.assertEqual(bench.get_dates(), expected.get_dates())
+            self.assertEqual(bench.get_metadata(), expected.get_metadata())
+
+        self.assertEqual(self.get_metadata(bench),
+                         {'name': 'bench', 'os': 'linux', 'duration': 60.0})
+        self.assertEqual(bench.median(), 3.5)
+
+        # incompatible run
+        run = perf.Run((1.0,),
+                       metadata={'name': 'bench', 'hostname': 'toto'},
+                       collect_metadata=False)
+        with self.assertRaises(ValueError):
+            bench.add_run(run)
+
     def get_metadata(self, bench):
         metadata = bench.get_metadata()
         result = {}
@@ -301,6 +361,31 @@ class BenchmarkTests(unittest.TestCase):
         self.assertEqual(self.get_metadata(bench),
                          {'name': 'bench', 'unit': 'byte'})
 
+    def test_remove_outliers(self):
+        bench = perf.Benchmark()
+        for samples in ((1.0, 1.1, 1.2), (1.0, 5.0), (9.0,), (0.9, 1.1)):
+            bench.add_run(perf.Run(samples,
+                                   metadata={'name': 'bench'},
+                                   collect_metadata=False))
+
+        # only outlier samples are removed, runs without samples are removed
+        bench._remove_outliers()
+        self.assertEqual([run.samples for run in bench.get_runs()],
+                         [(1.0, 1.1, 1.2), (1.0,), (0.9, 1.1)])
+        self.assertEqual(bench.get_samples(),
+                         (1.0, 1.1, 1.2, 1.0, 0.9, 1.1))
+        # each run stores its number of removed samples
+        self.assertEqual([run.get_metadata()['removed_outliers'].value
+                          for run in bench.get_runs()],
+                         [0, 1, 0])
+        self.assertEqual(self.get_metadata(bench), {'name': 'bench'})
+
+        # the number of removed samples is accumulated
+        bench._remove_outliers('trim', 20)
+        self.assertEqual(bench.get_samples(), (1.0, 1.1, 1.0, 1.1))
+        self.assertEqual(self.get_metadata(bench),
+                         {'name': 'bench', 'removed_outliers': 1})
+
     def test_update_metadata(self):
         bench = perf.Benchmark()
         for sample in (1.0, 2.0, 3.0):
@@ -349,6 +434,80 @@ class TestBenchmarkSuite(unittest.TestCase):
         with self.assertRaises(KeyError):
             suite.get_benchmark('non_existent')
 
+    def test_add_benchmark(self):
+        suite = perf.BenchmarkSuite()
+        telco = self.benchmark('telco')
+        suite.add_benchmark(telco)
+
+        # benchmark already part of the suite
+        with self.assertRaises(ValueError):
+            suite.add_benchmark(telco)
+        # a benchmark with the same name
+        with self.assertRaises(ValueError):
+            suite.add_benchmark(self.benchmark('telco'))
+
+        # the sorted order is updated by add_benchmark()
+        self.assertEqual(suite.get_benchmarks(), [telco])
+        go = self.benchmark('go')
+        suite.add_benchmark(go)
+        self.assertEqual(suite.get_benchmarks(), [go, telco])
+
+    def test_benchmark_renamed(self):
+        suite = perf.BenchmarkSuite()
+        telco = self.benchmark('telco')
+        suite.add_benchmark(telco)
+        self.assertIs(suite.get_benchmark('telco'), telco)
+
+        # benchmark added without run: it gets its name from its first run
+        bench = perf.Benchmark()
+        suite.add_benchmark(bench)
+        self.assertEqual(suite.get_benchmarks(), [bench, telco])
+        bench.add_run(perf.Run([1.0], metadata={'name': 'go'},
+                               collect_metadata=False))
+        self.assertIs(suite.get_benchmark('go'), bench)
+        self.assertEqual(suite.get_benchmarks(), [bench, telco])
+
+        # benchmark renamed by update_metadata()
+        telco.update_metadata({'name': 'call_simple'})
+        self.assertIs(suite.get_benchmark('call_simple'), telco)
+        with self.assertRaises(KeyError):
+            suite.get_benchmark('telco')
+        self.assertEqual(suite.get_benchmarks(), [telco, bench])
+
+        # only suites containing the renamed benchmark are updated
+        suite2 = perf.BenchmarkSuite()
+        suite2.add_benchmark(telco)
+        other = perf.BenchmarkSuite()
+        other.add_benchmark(self.benchmark('chaos'))
+        other_index = other._get_index()
+        telco.update_metadata({'name': 'telco'})
+        self.assertIs(suite.get_benchmark('telco'), telco)
+        self.assertIs(suite2.get_benchmark('telco'), telco)
+        self.assertIs(other._get_index(), other_index)
+
+        # benchmark removed from a suite
+        suite._convert_exclude_benchmark('telco')
+        self.assertEqual(telco._suites, [suite2])
+
+    def test_convert_include_exclude(self):
+        suite = perf.BenchmarkSuite()
+        for name in ('telco', 'go', 'call_simple'):
+            suite.add_benchmark(self.benchmark(name))
+
+        suite._convert_exclude_benchmark('go')
+        self.assertEqual(suite.get_benchmark_names(), ['telco', 'call_simple'])
+        self.assertEqual([bench.get_name() for bench in suite.get_benchmarks()],
+                         ['call_simple', 'telco'])
+        with self.assertRaises(KeyError):
+            suite.get_benchmark('go')
+
+        suite._convert_include_benchmark('telco')
+        self.assertEqual(suite.get_benchmark_names(), ['telco'])
+        with self.assertRaises(KeyError):
+            suite.get_benchmark('call_simple')
+        with self.assertRaises(KeyError):
+            suite._convert_include_benchmark('go')
+
     def test_json(self):
         suite = perf.BenchmarkSuite()
         suite.add_benchmark(self.benchmark('telco'))
@@ -441,5 +600,202 @@ class TestBenchmarkSuite(unittest.TestCase):
                          {'os': 'linux'})
 
 
+class TestSampleFile(unittest.TestCase):
+    def test_sample_file(self):
+        samples = [1.0 + (index % 7) * 0.25 for index in range(1001)]
+        with tests.temporary_directory() as tmpdir:
+            filename = os.path.join(tmpdir, 'samples.f64')
+            sample_file = perf.SampleFile.create(filename, samples)
+
+            self.assertEqual(len(sample_file), len(samples))
+            self.assertEqual(list(sample_file), samples)
+            self.assertEqual(sample_file[3], samples[3])
+            self.assertEqual(sample_file[-1], samples[-1])
+            self.assertEqual(sample_file[2:5], tuple(samples[2:5]))
+
+            bench = perf.Benchmark()
+            bench.add_run(perf.Run(sample_file,
+                                   metadata={'name': 'bench', 'loops': 2},
+                                   collect_metadata=False))
+            self.assertIs(bench.get_samples(), sample_file)
+            self.assertEqual(bench.median(), statistics.median(samples))
+            self.assertEqual(bench._get_raw_sample_range(), (2.0, 5.0))
+
+            # samples_file is relative to the JSON file
+            json_filename = os.path.join(tmpdir, 'bench.json')
+            bench.dump(json_filename)
+            with open(json_filename) as fp:
+                self.assertIn('"samples_file":"samples.f64"', fp.read())
+            bench2 = perf.Benchmark.load(json_filename)
+
+            samples2 = bench2.get_samples()
+            self.assertIsInstance(samples2, perf.SampleFile)
+            self.assertEqual(list(samples2), samples)
+
+    def test_sample_file_subdir(self):
+        # load and dump a benchmark through a subdirectory: paths of sample
+        # files must be written relative to the output JSON file
+        samples = [1.0, 2.0, 3.0]
+        with tests.temporary_directory() as tmpdir:
+            subdir = os.path.join(tmpdir, 'sub')
+            os.mkdir(subdir)
+            sample_file = perf.SampleFile.create(os.path.join(subdir, 's.bin'),
+                                                 samples)
+            bench = perf.Benchmark()
+            bench.add_run(perf.Run(sample_file,
+                                   metadata={'name': 'bench'},
+                                   collect_metadata=False))
+
+            old_cwd = os.getcwd()
+            os.chdir(tmpdir)
+            try:
+                bench.dump(os.path.join('sub', 'c.json'))
+                bench = perf.Benchmark.load(os.path.join('sub', 'c.json'))
+                run = bench.get_runs()[0]
+                self.assertEqual(run._samples_file, 's.bin')
+
+                # same directory
+                bench.dump(os.path.join('sub', 'd.json'))
+                bench2 = perf.Benchmark.load(os.path.join('sub', 'd.json'))
+                self.assertEqual(list(bench2.get_samples()), samples)
+                self.assertEqual(bench2.get_runs()[0]._samples_file, 's.bin')
+
+                # parent directory
+                bench.dump('e.json')
+                bench3 = perf.Benchmark.load('e.json')
+                self.assertEqual(list(bench3.get_samples()), samples)
+                self.assertEqual(bench3.get_runs()[0]._samples_file,
+                                 os.path.join('sub', 's.bin'))
+
+                # unknown directory: keep the name read from the JSON file
+                fp = six.StringIO()
+                bench.dump(fp)
+                self.assertIn('"samples_file":"s.bin"', fp.getvalue())
+            finally:
+                os.chdir(old_cwd)
+
+    def test_chained_samples(self):
+        with tests.temporary_directory() as tmpdir:
+            bench = perf.Benchmark()
+            for index, samples in enumerate(((3.0, 1.0), (2.0, 5.0, 4.0))):
+                filename = os.path.join(tmpdir, 'run%s.f64' % index)
+                sample_file = perf.SampleFile.create(filename, samples)
+                bench.add_run(perf.Run(sample_file, collect_metadata=False))
+
+            samples = bench.get_samples()
+            self.assertEqual(len(samples), 5)
+            self.assertEqual(list(samples), [3.0, 1.0, 2.0, 5.0, 4.0])
+            self.assertEqual(samples[2], 2.0)
+            self.assertEqual(bench.median(), 3.0)
+            self.assertEqual(bench.format(), '3.00 sec +- 1.58 sec')
+
+    def test_stats(self):
+        samples = [float(1 + (index * 7919) % 1013) for index in range(5000)]
+        samples.append(2.5)
+        with tests.temporary_directory() as tmpdir:
+            filename = os.path.join(tmpdir, 'samples.f64')
+            sample_file = perf.SampleFile.create(filename, samples)
+
+            with mock.patch('perf._stats._get_numpy', return_value=None):
+                # odd and even number of samples
+                for _ in range(2):
+                    self.assertEqual(_stats.median(sample_file),
+                                     statistics.median(samples))
+                    samples.pop()
+                    sample_file = perf.SampleFile.create(filename, samples)
+
+                self.assertAlmostEqual(_stats.mean(sample_file),
+                                       statistics.mean(samples))
+                self.assertAlmostEqual(_stats.stdev(sample_file),
+                                       statistics.stdev(samples))
+
+
+class TestAddRuns(unittest.TestCase):
+    def benchmark(self, samples):
+        bench = perf.Benchmark()
+        bench.add_run(perf.Run(samples, metadata={'name': 'bench'},
+                               collect_metadata=False))
+        return bench
+
+    def test_journal(self):
+        with tests.temporary_directory() as tmpdir:
+            filename = os.path.join(tmpdir, 'test.json')
+            perf.add_runs(filename, self.benchmark((1.0, 2.0)))
+            perf.add_runs(filename, self.benchmark((3.0,)))
+
+            with open(filename) as fp:
+                lines = fp.readlines()
+            suite = perf.BenchmarkSuite.load(filename)
+
+        # each call appends a record, the file is not rewritten
+        self.assertEqual(len(lines), 2)
+
+        bench = suite.get_benchmark('bench')
+        self.assertEqual(bench.get_nrun(), 2)
+        self.assertEqual(bench.get_samples(), (1.0, 2.0, 3.0))
+
+    def test_journal_indented(self):
+        with tests.temporary_directory() as tmpdir:
+            filename = os.path.join(tmpdir, 'test.json')
+            self.benchmark((1.0,)).dump(filename, compact=False)
+            perf.add_runs(filename, self.benchmark((2.0,)))
+
+            bench = perf.Benchmark.load(filename)
+
+        self.assertEqual(bench.get_samples(), (1.0, 2.0))
+
+    def test_journal_read_first_record(self):
+        with tests.temporary_directory() as tmpdir:
+            filename = os.path.join(tmpdir, 'test.json')
+            perf.add_runs(filename, self.benchmark((1.0,)))
+            perf.add_runs(filename, self.benchmark((2.0,) * 100000))
+            size = os.path.getsize(filename)
+
+            files = []
+
+            def open_file(*args, **kw):
+                fp = open(*args, **kw)
+                wrapper = mock.MagicMock(wraps=fp)
+                wrapper.__enter__.return_value = wrapper
+                wrapper.__exit__.side_effect = lambda *exc_info: fp.close()
+                files.append(wrapper)
+                return wrapper
+
+            with mock.patch('perf._bench.open', create=True,
+                            side_effect=open_file):
+                perf.add_runs(filename, self.benchmark((3.0,)))
+
+            # first record longer than a chunk
+            with mock.patch('perf._bench._JOURNAL_CHUNK', 16):
+                perf.add_runs(filename, self.benchmark((4.0,)))
+
+            bench = perf.Benchmark.load(filename)
+
+        # only the first record is read to check runs before appending them
+        # read() without size reads the whole file
+        read_size = sum(call[0][0] if call[0] else size
+                        for wrapper in files
+                        for call in wrapper.read.call_args_list)
+        self.assertLess(read_size, size // 2)
+        self.assertEqual(bench.get_nrun(), 4)
+
+    def test_journal_incompatible(self):
+        bench = perf.Benchmark()
+        bench.add_run(perf.Run((1.0,),
+                               metadata={'name': 'bench', 'hostname': 'toto'},
+                               collect_metadata=False))
+
+        with tests.temporary_directory() as tmpdir:
+            filename = os.path.join(tmpdir, 'test.json')
+            perf.add_runs(filename, self.benchmark((1.0,)))
+
+            # runs are checked against the first record before being written
+            with self.assertRaises(ValueError):
+                perf.add_runs(filename, bench)
+
+            suite = perf.BenchmarkSuite.load(filename)
+            self.assertEqual(suite.get_benchmark('bench').get_nrun(), 1)
+
+
 if __name__ == "__main__":
     unittest.main()
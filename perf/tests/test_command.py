@@ -0,0 +1,86 @@
+import collections
+import os.path
+import subprocess
+import sys
+import unittest
+
+import perf
+import perf._command
+import perf.text_runner
+from perf import tests
+
+
+FakeRusage = collections.namedtuple('FakeRusage', 'ru_utime ru_stime ru_maxrss')
+
+
+class TestCommand(unittest.TestCase):
+    def test_command(self):
+        with tests.temporary_directory() as tmpdir:
+            filename = os.path.join(tmpdir, 'test.json')
+            args = [sys.executable,
+                    '-m', 'perf', 'command',
+                    '-p', '2',
+                    '-n', '2',
+                    '-w', '1',
+                    '--output', filename,
+                    '--',
+                    sys.executable, '-c', 'pass']
+            proc = subprocess.Popen(args,
+                                    stdout=subprocess.PIPE,
+                                    universal_newlines=True)
+            stdout = proc.communicate()[0]
+            self.assertEqual(proc.returncode, 0)
+            bench = perf.Benchmark.load(filename)
+
+        self.assertIn('Median +- std dev: ', stdout)
+        self.assertEqual(bench.get_name(), 'command')
+        self.assertEqual(bench.get_nsample(), 4)
+        # calibration is skipped
+        for run in bench.get_runs():
+            self.assertEqual(run._get_loops(), 1)
+
+        metadata = bench.get_metadata()
+        self.assertEqual(metadata['command'].value,
+                         '%s -c pass' % sys.executable)
+        if hasattr(os, 'wait4'):
+            for run in bench.get_runs():
+                self.assertGreaterEqual(
+                    run._get_metadata('command_user_time', None), 0)
+                self.assertGreaterEqual(
+                    run._get_metadata('command_sys_time', None), 0)
+                self.assertGreater(
+                    run._get_metadata('command_max_rss', None), 0)
+
+    def test_command_error(self):
+        args = [sys.executable,
+                '-m', 'perf', 'command',
+                '-p', '1',
+                '--',
+                sys.executable, '-c', 'import sys; sys.exit(3)']
+        proc = subprocess.Popen(args,
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE,
+                                universal_newlines=True)
+        stdout, stderr = proc.communicate()
+        self.assertEqual(proc.returncode, 1)
+        self.assertIn('failed with exit code 3', stderr)
+
+    def test_complete_metadata(self):
+        runner = perf.text_runner.TextRunner('bench')
+        runner.parse_args(['-n', '2'])
+
+        bench = perf._command.CommandBench(['cmd'])
+        # warmup, then 2 samples of 2 loops
+        bench.rusages = [[FakeRusage(10.0, 10.0, 1000)],
+                         [FakeRusage(1.0, 0.5, 100), FakeRusage(2.0, 0.5, 200)],
+                         [FakeRusage(3.0, 0.5, 100), FakeRusage(2.0, 0.5, 100)]]
+        metadata = {}
+        bench.complete_metadata(runner, metadata)
+        self.assertEqual(metadata,
+                         {'command_user_time': 2.0,
+                          'command_sys_time': 0.5,
+                          'command_max_rss': 200 * perf._command._MAX_RSS_SCALE})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,143 @@
+import collections
+import os.path
+import subprocess
+import sys
+import textwrap
+import unittest
+
+import perf
+import perf._import
+import perf.text_runner
+from perf import tests
+from perf.tests import mock
+
+
+IMPORTTIME = textwrap.dedent("""
+    import time: self [us] | cumulative | imported package
+    import time:       120 |        120 | encodings
+    perf import
+    import time:        50 |         50 |     _json
+    import time:       300 |        350 |   json.decoder
+    import time:       100 |        100 |   json.scanner
+    import time:       200 |        650 | json
+""")
+
+
+class TestImport(unittest.TestCase):
+    def test_import(self):
+        with tests.temporary_directory() as tmpdir:
+            filename = os.path.join(tmpdir, 'test.json')
+            args = [sys.executable,
+                    '-m', 'perf', 'import',
+                    '-p', '2',
+                    '-n', '2',
+                    '-w', '1',
+                    '--top', '3',
+                    '--output', filename,
+                    'json']
+            proc = subprocess.Popen(args,
+                                    stdout=subprocess.PIPE,
+                                    universal_newlines=True)
+            stdout = proc.communicate()[0]
+            self.assertEqual(proc.returncode, 0)
+            bench = perf.Benchmark.load(filename)
+
+        self.assertIn('Median +- std dev: ', stdout)
+        self.assertEqual(bench.get_name(), 'import json')
+        self.assertEqual(bench.get_nsample(), 4)
+        for run in bench.get_runs():
+            self.assertEqual(run._get_loops(), 1)
+        self.assertEqual(bench.get_metadata()['import_module'].value, 'json')
+
+        if perf._import._HAS_IMPORTTIME:
+            self.assertIn('Heaviest imports (cumulative time, mean of 2 runs):',
+                          stdout)
+            modules = perf._import.get_import_times(bench)
+            self.assertGreaterEqual(len(modules), 1)
+            self.assertLessEqual(len(modules), 3)
+            self.assertNotIn('json', [name for name, mean, nrun in modules])
+
+    def test_import_error(self):
+        args = [sys.executable,
+                '-m', 'perf', 'import',
+                '-p', '1',
+                'perf_no_such_module']
+        proc = subprocess.Popen(args,
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE,
+                                universal_newlines=True)
+        stdout, stderr = proc.communicate()
+        self.assertEqual(proc.returncode, 1)
+        self.assertIn('perf_no_such_module', stderr)
+        self.assertIn('import failed with exit code 1', stderr)
+
+    def test_top_error(self):
+        args = [sys.executable,
+                '-m', 'perf', 'import',
+                '--top', '0',
+                'json']
+        proc = subprocess.Popen(args,
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE,
+                                universal_newlines=True)
+        stdout, stderr = proc.communicate()
+        self.assertEqual(proc.returncode, 1)
+        self.assertEqual(stdout, '')
+        self.assertIn('ERROR: --top must be at least 1', stderr)
+
+    def test_interpreter_args(self):
+        flags = collections.namedtuple('flags', 'optimize ignore_environment '
+                                                'verbose bytes_warning')
+        xoptions = collections.OrderedDict((('faulthandler', True),
+                                            ('importtime', '2')))
+        warnoptions = ['default::BytesWarning', 'ignore']
+        with mock.patch.object(sys, 'flags', flags(2, 1, 0, 1)), \
+                mock.patch.object(sys, 'warnoptions', warnoptions), \
+                mock.patch.object(sys, '_xoptions', xoptions, create=True):
+            args = perf._import._interpreter_args()
+        # the warning option added by -b is not repeated
+        self.assertEqual(args, ['-E', '-OO', '-b', '-Wignore',
+                                '-X', 'faulthandler', '-X', 'importtime=2'])
+
+    def test_parse_importtime(self):
+        self.assertEqual(perf._import.parse_importtime(IMPORTTIME),
+                         [('_json', 2, 50e-6),
+                          ('json.decoder', 1, 350e-6),
+                          ('json.scanner', 1, 100e-6),
+                          ('json', 0, 650e-6)])
+
+    def test_complete_metadata(self):
+        runner = perf.text_runner.TextRunner('bench')
+        runner.parse_args(['-n', '2'])
+
+        bench = perf._import.ImportBench('json', 2)
+        # warmup, then 2 samples of 1 loop
+        bench.imports = [[{'json': 1.0, 'json.decoder': 1.0, 're': 1.0}],
+                         [{'json': 0.5, 'json.decoder': 0.25, 're': 0.125}],
+                         [{'json': 0.5, 'json.decoder': 0.5, 're': 0.125,
+                           'json.scanner': 0.0625}]]
+        metadata = {}
+        bench.complete_metadata(runner, metadata)
+        self.assertEqual(metadata,
+                         {'import_time:json.decoder': 0.375,
+                          'import_time:re': 0.125})
+
+    def test_get_import_times(self):
+        bench = perf.Benchmark()
+        for value in (0.5, 0.25):
+            metadata = {'name': 'import json',
+                        'import_time:json.decoder': value}
+            if value == 0.5:
+                metadata['import_time:re'] = 0.125
+            bench.add_run(perf.Run([1.0], metadata=metadata,
+                                   collect_metadata=False))
+        self.assertEqual(perf._import.get_import_times(bench),
+                         [('json.decoder', 0.375, 2),
+                          ('re', 0.125, 1)])
+
+        metadata = bench.get_runs()[0].get_metadata()
+        self.assertEqual(str(metadata['import_time:re']), '125 ms')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,3 +1,4 @@
+import os.path
 import sys
 import textwrap
 
@@ -5,6 +6,7 @@ import six
 
 import perf
 from perf import _collect_metadata as perf_metadata
+from perf import tests
 from perf._metadata import METADATA_VALUE_TYPES
 from perf.tests import mock
 from perf.tests import unittest
@@ -25,6 +27,7 @@ class TestMetadata(unittest.TestCase):
 
         for key in MANDATORY_METADATA:
             self.assertIn(key, metadata)
+        self.assertGreaterEqual(metadata['metadata_collect_time'], 0)
 
         for key, value in metadata.items():
             # test key
@@ -38,6 +41,46 @@ class TestMetadata(unittest.TestCase):
                 self.assertEqual(value.strip(), value)
                 self.assertNotIn('\n', value)
 
+    def test_static_metadata(self):
+        with mock.patch.object(perf_metadata, '_static_metadata', None):
+            with mock.patch('perf._collect_metadata.collect_python_metadata') as collect_python:
+                metadata = {}
+                perf_metadata.collect_metadata(metadata)
+                perf_metadata.collect_metadata(metadata)
+        # static metadata are only collected once
+        self.assertEqual(collect_python.call_count, 1)
+
+    def test_cache(self):
+        with tests.temporary_directory() as tmpdir:
+            filename = os.path.join(tmpdir, 'cache.json')
+            read_cpu_boost = mock.Mock(return_value=True)
+
+            def get_cpu_boost(boot_id):
+                # simulate a new process: the cache is loaded from the file
+                with mock.patch.object(perf_metadata, '_cache', None):
+                    with mock.patch('perf._collect_metadata._get_boot_id',
+                                    return_value=boot_id):
+                        result = perf_metadata.get_cpu_boost(3)
+                        perf_metadata._save_cache()
+                return result
+
+            with mock.patch('perf._collect_metadata._get_cache_filename',
+                            return_value=filename):
+                with mock.patch('perf._collect_metadata._read_cpu_boost',
+                                read_cpu_boost):
+                    self.assertTrue(get_cpu_boost('boot1'))
+                    self.assertTrue(get_cpu_boost('boot1'))
+                    self.assertEqual(read_cpu_boost.call_count, 1)
+
+                    # the cache is ignored after a reboot
+                    self.assertTrue(get_cpu_boost('boot2'))
+                    self.assertEqual(read_cpu_boost.call_count, 2)
+
+                    # the cache is ignored after an upgrade of perf
+                    with mock.patch('perf.__version__', '0.0'):
+                        self.assertTrue(get_cpu_boost('boot2'))
+                    self.assertEqual(read_cpu_boost.call_count, 3)
+
     def test_collect_cpu_affinity(self):
         metadata = {}
         perf_metadata.collect_cpu_affinity(metadata, {2, 3}, 4)
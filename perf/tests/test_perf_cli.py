@@ -1,3 +1,5 @@
+import csv
+import json
 import os
 import subprocess
 import sys
@@ -5,7 +7,9 @@ import tempfile
 import textwrap
 
 import perf
+import perf.__main__
 from perf import tests
+from perf.tests import mock
 from perf.tests import unittest
 
 
@@ -109,10 +113,128 @@ class TestPerfCLI(BaseTestCase, unittest.TestCase):
 
         expected = ('Median +- std dev: [ref] 1.50 sec +- 0.50 sec '
                     '-> [changed] 2.00 sec +- 0.50 sec: 1.33x slower\n'
-                    'Not significant!')
+                    "Not significant! (Student's t-test: t=-1.22)\n"
+                    'Speed 95% CI: 0.75x .. 2.50x slower')
         self.assertEqual(stdout.rstrip(),
                          expected)
 
+    def test_compare_to_test(self):
+        ref_result = self.create_bench((1.0, 1.5, 2.0, 1.25, 1.75),
+                                       metadata={'name': 'telco'})
+        changed_result = self.create_bench((2.0, 2.5, 3.0, 2.25),
+                                           metadata={'name': 'telco'})
+
+        stdout = self.compare('compare_to', ref_result, changed_result, '-v',
+                              '--test', 'welch')
+        expected = ('Median +- std dev: [ref] 1.50 sec +- 0.40 sec '
+                    '-> [changed] 2.38 sec +- 0.43 sec: 1.58x slower\n'
+                    "Significant (Welch's t-test: t=-3.38)\n"
+                    'Speed 95% CI: 1.19x .. 2.40x slower')
+        self.assertEqual(stdout.rstrip(), expected)
+
+        stdout = self.compare('compare_to', ref_result, changed_result, '-v',
+                              '--test', 'mann-whitney')
+        expected = ('Median +- std dev: [ref] 1.50 sec +- 0.40 sec '
+                    '-> [changed] 2.38 sec +- 0.43 sec: 1.58x slower\n'
+                    "Significant (Mann-Whitney U test: z=-2.21)\n"
+                    'Hodges-Lehmann shift: +1.00 sec\n'
+                    'Speed 95% CI: 1.19x .. 2.40x slower')
+        self.assertEqual(stdout.rstrip(), expected)
+
+    def test_compare_to_correction(self):
+        ref_result = self.create_bench((1.0, 1.5, 2.0),
+                                       metadata={'name': 'telco'})
+        changed_result = self.create_bench((1.5, 2.0, 2.5),
+                                           metadata={'name': 'telco'})
+
+        stdout = self.compare('compare_to', ref_result, changed_result,
+                              '-v', '--correction', 'holm')
+        expected = ('Median +- std dev: [ref] 1.50 sec +- 0.50 sec '
+                    '-> [changed] 2.00 sec +- 0.50 sec: 1.33x slower\n'
+                    "Not significant! (Student's t-test: t=-1.22, p=0.288, "
+                    "Holm-Bonferroni adjusted p=0.288)\n"
+                    'Speed 95% CI: 0.75x .. 2.50x slower')
+        self.assertEqual(stdout.rstrip(), expected)
+
+    def test_compare_to_format(self):
+        ref_result = self.create_bench((1.0, 1.5, 2.0),
+                                       metadata={'name': 'telco'})
+        changed_result = self.create_bench((1.5, 2.0, 2.5),
+                                           metadata={'name': 'telco'})
+
+        stdout = self.compare('compare_to', ref_result, changed_result,
+                              '--format', 'json')
+        records = [json.loads(line) for line in stdout.splitlines()]
+        self.assertEqual(len(records), 1)
+        record = records[0]
+        self.assertEqual(record['kind'], 'benchmark')
+        self.assertEqual(record['benchmark'], 'telco')
+        self.assertEqual((record['ref_file'], record['changed_file']),
+                         ('ref', 'changed'))
+        self.assertEqual((record['ref_median'], record['changed_median']),
+                         (1.5, 2.0))
+        self.assertEqual((record['ref_nsample'], record['changed_nsample']),
+                         (3, 3))
+        self.assertAlmostEqual(record['speed'], 0.75)
+        self.assertEqual(record['test'], 'student')
+        self.assertAlmostEqual(record['score'], -1.2247, places=4)
+        self.assertAlmostEqual(record['p_value'], 0.288, places=3)
+        self.assertIsNone(record['speed_ci_low'])
+        self.assertIs(record['significant'], False)
+
+        stdout = self.compare('compare_to', ref_result, changed_result,
+                              '--format', 'csv')
+        self.assertEqual(stdout.splitlines()[0].split(',')[:4],
+                         ['kind', 'benchmark', 'ref_file', 'changed_file'])
+        self.assertEqual(len(stdout.splitlines()), 2)
+
+    def test_compare_to_geometric_mean(self):
+        def create_suite(speeds):
+            suite = perf.BenchmarkSuite()
+            for name, speed in zip(('bench1', 'bench2'), speeds):
+                samples = [sample * speed for sample in (1.0, 1.01, 1.02)]
+                suite.add_benchmark(self.create_bench(samples,
+                                                      metadata={'name': name}))
+            return suite
+
+        with tests.temporary_directory() as tmpdir:
+            ref_name = os.path.join(tmpdir, 'ref.json')
+            changed_name = os.path.join(tmpdir, 'changed.json')
+            weights_name = os.path.join(tmpdir, 'weights.json')
+            create_suite((1.0, 1.0)).dump(ref_name)
+            create_suite((0.5, 2.0)).dump(changed_name)
+            with open(weights_name, 'w') as fp:
+                fp.write('{"bench1": 3}')
+
+            stdout = self.run_command('compare_to', '-q', ref_name,
+                                      changed_name)
+            self.assertEqual(stdout.splitlines()[-1],
+                             'Geometric mean (2 benchmarks): no change '
+                             '(speed 95% CI: 0.99x .. 1.01x faster)')
+
+            stdout = self.run_command('compare_to', '-q',
+                                      '--weights', weights_name,
+                                      ref_name, changed_name)
+            self.assertEqual(stdout.splitlines()[-1],
+                             'Geometric mean (2 benchmarks): 1.41x faster '
+                             '(speed 95% CI: 1.39x .. 1.44x faster)')
+
+            # the confidence interval of a slowdown is inverted
+            stdout = self.run_command('compare_to', '-q',
+                                      '--weights', weights_name,
+                                      changed_name, ref_name)
+            self.assertEqual(stdout.splitlines()[-1],
+                             'Geometric mean (2 benchmarks): 1.41x slower '
+                             '(speed 95% CI: 1.39x .. 1.44x slower)')
+
+            stdout = self.run_command('compare_to', '--format', 'json',
+                                      '--weights', weights_name,
+                                      ref_name, changed_name)
+            records = [json.loads(line) for line in stdout.splitlines()]
+            self.assertEqual([record['kind'] for record in records],
+                             ['benchmark', 'benchmark', 'geometric_mean'])
+            self.assertAlmostEqual(records[-1]['speed'], 2 ** 0.5)
+
     def test_compare_not_significant(self):
         ref_result = self.create_bench((1.0, 1.5, 2.0),
                                        metadata={'name': 'name'})
@@ -135,7 +257,8 @@ class TestPerfCLI(BaseTestCase, unittest.TestCase):
 
         expected = ('Median +- std dev: [ref] 1.50 sec +- 0.50 sec '
                     '-> [changed] 2.00 sec +- 0.50 sec: 1.33x slower\n'
-                    'Not significant!')
+                    "Not significant! (Student's t-test: t=-1.22)\n"
+                    'Speed 95% CI: 0.75x .. 2.50x slower')
         self.assertEqual(stdout.rstrip(),
                          expected)
 
@@ -148,7 +271,8 @@ class TestPerfCLI(BaseTestCase, unittest.TestCase):
 
         expected = ('Median +- std dev: [changed] 1.50 sec +- 0.50 sec '
                     '-> [ref] 1.50 sec +- 0.50 sec: no change\n'
-                    'Not significant!')
+                    "Not significant! (Student's t-test: t=0.00)\n"
+                    'Speed 95% CI: 0.50x .. 2.00x faster')
         self.assertEqual(stdout.rstrip(),
                          expected)
 
@@ -251,6 +375,7 @@ class TestPerfCLI(BaseTestCase, unittest.TestCase):
 
             Minimum: 24.2 ms (-1%)
             Median +- std dev: 24.6 ms +- 0.2 ms
+            Median 95% CI: 24.5 ms .. 24.6 ms (bootstrap)
             Mean +- std dev: 24.6 ms +- 0.2 ms
             Maximum: 25.0 ms (+2%)
 
@@ -275,11 +400,34 @@ class TestPerfCLI(BaseTestCase, unittest.TestCase):
 
             Minimum: 24.2 ms (-1%)
             Median +- std dev: 24.6 ms +- 0.2 ms
+            Median 95% CI: 24.5 ms .. 24.6 ms (bootstrap)
             Mean +- std dev: 24.6 ms +- 0.2 ms
             Maximum: 25.0 ms (+2%)
         """)
         self.check_command(expected, 'stats', TELCO)
 
+    def test_sample_file(self):
+        samples = [1e-3 * (1 + (index % 5) * 0.01) for index in range(1000)]
+
+        with tests.temporary_directory() as tmpdir:
+            samples_filename = os.path.join(tmpdir, 'samples.f64')
+            sample_file = perf.SampleFile.create(samples_filename, samples)
+            bench = perf.Benchmark()
+            bench.add_run(perf.Run(sample_file,
+                                   metadata={'name': 'bench'},
+                                   collect_metadata=False))
+            filename = os.path.join(tmpdir, 'bench.json')
+            bench.dump(filename)
+
+            stdout = self.run_command('show', filename)
+            self.assertEqual(stdout.rstrip(),
+                             'Median +- std dev: 1.02 ms +- 0.01 ms')
+
+            stdout = self.run_command('stats', filename)
+            self.assertIn('Total number of samples: 1000', stdout)
+            self.assertIn('Minimum: 1.00 ms (-2%)', stdout)
+            self.assertIn('Maximum: 1.04 ms (+2%)', stdout)
+
     def test_dump_raw(self):
         expected = """
             Run 1: raw warmup (1): 98.9 ms (4 loops); raw samples (3): 97.9 ms, 97.8 ms, 98.0 ms
@@ -341,11 +489,183 @@ class TestPerfCLI(BaseTestCase, unittest.TestCase):
         self.assertRegex(stdout,
                          r'^Metadata:\n(- [^:]+: .*\n)+$')
 
+    def test_load_benchmark_suites(self):
+        with tests.temporary_directory() as tmpdir:
+            filenames = []
+            for index in range(5):
+                filename = os.path.join(tmpdir, 'bench%s.json' % index)
+                bench = self.create_bench((1.0 + index,),
+                                          metadata={'name': 'bench'})
+                bench.dump(filename)
+                filenames.append(filename)
+
+            for processes in (1, 2):
+                with mock.patch('perf.__main__._LOAD_POOL_MIN_FILES', 2):
+                    data = perf.__main__.Benchmarks()
+                    data.load_benchmark_suites(filenames, processes=processes)
+                self.assertEqual([suite.filename for suite in data.suites],
+                                 filenames)
+                self.assertEqual([suite.get_benchmark('bench').median()
+                                  for suite in data.suites],
+                                 [1.0, 2.0, 3.0, 4.0, 5.0])
+
+    def test_group_by_name(self):
+        data = perf.__main__.Benchmarks()
+        for filename, names in (('a.json', ('b1', 'b2', 'b3')),
+                                ('b.json', ('b2', 'b3')),
+                                ('c.json', ('b3', 'b4', 'b2'))):
+            suite = perf.BenchmarkSuite(filename)
+            for name in names:
+                suite.add_benchmark(self.create_bench((1.0,),
+                                                      metadata={'name': name}))
+            data.suites.append(suite)
+
+        groups = data.group_by_name()
+        self.assertEqual([group.name for group in groups], ['b2', 'b3'])
+        for group in groups:
+            self.assertEqual([item.filename for item in group.benchmarks],
+                             ['a', 'b', 'c'])
+            self.assertEqual([item.benchmark for item in group.benchmarks],
+                             [suite.get_benchmark(group.name)
+                              for suite in data.suites])
+
+        ignored = [(suite.filename, [bench.get_name() for bench in benchs])
+                   for suite, benchs in data.group_by_name_ignored()]
+        self.assertEqual(ignored, [('a.json', ['b1']), ('c.json', ['b4'])])
+
     def test_slowest(self):
         stdout = self.run_command('slowest', TELCO)
         self.assertEqual(stdout.rstrip(),
                          '#1: telco (16.0 sec)')
 
+    def test_slowest_format(self):
+        stdout = self.run_command('slowest', '--format', 'csv', TELCO)
+        self.assertEqual(stdout.splitlines(),
+                         ['file,rank,benchmark,duration',
+                          'telco,1,telco,16.0'])
+
+    def test_show_format(self):
+        stdout = self.run_command('show', '--format', 'json', TELCO)
+        lines = stdout.splitlines()
+        self.assertEqual(len(lines), 1)
+        record = json.loads(lines[0])
+        self.assertEqual(list(record), ['file', 'benchmark', 'unit', 'nrun',
+                                        'nsample', 'median', 'stdev', 'mean'])
+        self.assertEqual(record['benchmark'], 'telco')
+        self.assertEqual(record['unit'], 'second')
+        self.assertEqual(record['nrun'], 40)
+        self.assertEqual(record['nsample'], 120)
+        self.assertAlmostEqual(record['median'], 0.02456206675)
+
+    def test_stats_format(self):
+        stdout = self.run_command('stats', '--format', 'csv', TELCO)
+        rows = list(csv.DictReader(stdout.splitlines()))
+        self.assertEqual(len(rows), 1)
+        row = rows[0]
+        self.assertEqual(row['nsample'], '120')
+        self.assertEqual(row['loops'], '4')
+        self.assertEqual(row['nmode'], '1')
+        self.assertLess(float(row['median_ci_low']), float(row['median']))
+        self.assertGreater(float(row['median_ci_high']), float(row['median']))
+
+    def create_bimodal_bench(self, by_process):
+        # 2/3 of samples around 1.0 sec and 1/3 around 1.2 sec
+        bench = perf.Benchmark()
+        for run in range(30):
+            samples = []
+            for index in range(3):
+                if by_process:
+                    fast = (run % 3)
+                else:
+                    fast = ((run + index) % 3)
+                sample = 1.0 if fast else 1.2
+                sample *= 1 + ((run * 7 + index) % 5 - 2) * 0.005
+                samples.append(sample)
+            bench.add_run(perf.Run(samples, metadata={'name': 'bench'},
+                                   collect_metadata=False))
+        return bench
+
+    def test_show_modes(self):
+        bench = self.create_bimodal_bench(True)
+        with tempfile.NamedTemporaryFile(mode="w+") as tmp:
+            bench.dump(tmp.name)
+            # modes are only checked on demand
+            stdout_nocheck = self.run_command('show', tmp.name)
+            stdout = self.run_command('show', '--check', tmp.name)
+
+        self.assertEqual(stdout_nocheck.rstrip(),
+                         'Median +- std dev: 1.00 sec +- 0.10 sec')
+
+        expected = textwrap.dedent("""
+            WARNING: the benchmark has 2 modes, the median is not representative
+            Modes: 1.00 sec (67%), 1.20 sec (33%)
+            Modes depend on the worker process: 100% of samples are in the main mode of their run
+            Try to rerun the benchmark with more processes (hash randomization, memory layout, ...)
+
+            Median +- std dev: 1.00 sec +- 0.10 sec
+        """).strip()
+        self.assertEqual(stdout.rstrip(), expected)
+
+        bench = self.create_bimodal_bench(False)
+        with tempfile.NamedTemporaryFile(mode="w+") as tmp:
+            bench.dump(tmp.name)
+            stdout = self.run_command('show', '--check', tmp.name)
+
+        expected = textwrap.dedent("""
+            WARNING: the benchmark has 2 modes, the median is not representative
+            Modes: 1.00 sec (67%), 1.20 sec (33%)
+            Modes don't depend on the worker process: 67% of samples are in the main mode of their run
+
+            Median +- std dev: 1.00 sec +- 0.10 sec
+        """).strip()
+        self.assertEqual(stdout.rstrip(), expected)
+
+    def test_stats_modes(self):
+        bench = self.create_bimodal_bench(True)
+        with tempfile.NamedTemporaryFile(mode="w+") as tmp:
+            bench.dump(tmp.name)
+            stdout = self.run_command('stats', tmp.name)
+
+        expected = textwrap.dedent("""
+            Maximum: 1.21 sec (+21%)
+            Modes: 1.00 sec (67%), 1.20 sec (33%)
+            Samples in the main mode of their run: 100%
+        """).strip()
+        self.assertTrue(stdout.rstrip().endswith(expected), stdout)
+
+    def test_trend(self):
+        with tests.temporary_directory() as tmpdir:
+            for day in range(1, 11):
+                sample = 1.0 if day <= 6 else 1.5
+                sample += (day % 3) * 0.01
+                date = '2016-09-%02dT00:00:00' % day
+                bench = self.create_bench((sample,),
+                                          metadata={'name': 'bench',
+                                                    'date': date})
+                bench.dump(os.path.join(tmpdir, 'day%02d.json' % day))
+
+            stdout = self.run_command('trend', tmpdir)
+
+        expected = textwrap.dedent("""
+            Results: 10 (2016-09-01T00:00:00 .. 2016-09-10T00:00:00)
+            Change points:
+            - 2016-09-07T00:00:00 (day07): 1.01 sec -> 1.51 sec (+49.5%)
+        """).strip()
+        self.assertEqual(stdout.rstrip(), expected)
+
+    def test_plan(self):
+        stdout = self.run_command('plan', '--effect', '0.5', TELCO)
+        expected = textwrap.dedent("""
+            Minimum detectable effect: 0.5% (power: 80%)
+
+            Mean: 24.6 ms
+            Std dev between processes: 173 us (0.7%)
+            Std dev within processes: 73.6 us (0.3%)
+            Current: 40 processes, 3 samples, 4 loops: detectable effect 0.5%, duration 16.0 sec
+            Recommended: 37 processes, 1 sample, 4 loops: estimated duration 7.5 sec
+        """).strip()
+        self.assertEqual(stdout.rstrip(), expected)
+
 
 class TestConvert(BaseTestCase, unittest.TestCase):
     def test_stdout(self):
@@ -406,20 +726,43 @@ class TestConvert(BaseTestCase, unittest.TestCase):
                          ['call_simple', 'telco'])
 
     def test_remove_outliers(self):
-        samples = (100.0,) * 100 + (99.0, 101.0)
+        samples = (98.0, 99.0, 100.0, 101.0, 102.0)
         outliers = (90.0, 110.0)
-        bench = self.create_bench(samples + outliers)
+        bench = perf.Benchmark()
+        for index in range(20):
+            run_samples = samples
+            if index == 19:
+                run_samples += outliers
+            bench.add_run(perf.Run(run_samples, collect_metadata=False))
+
+        def removed_outliers(bench):
+            return [run.get_metadata()['removed_outliers'].value
+                    for run in bench.get_runs()]
 
         with tests.temporary_directory() as tmpdir:
             filename = os.path.join(tmpdir, 'test.json')
             bench.dump(filename)
 
+            # the input filename after --remove-outliers is not parsed as
+            # the outlier method
+            output = os.path.join(tmpdir, 'output.json')
+            self.run_command('convert', '--remove-outliers', filename,
+                             '-o', output)
+            bench2 = perf.Benchmark.load(output)
+
             stdout = self.run_command('convert', filename,
-                                      '--remove-outliers', '--stdout')
-            bench2 = perf.Benchmark.loads(stdout)
+                                      '--remove-outliers',
+                                      '--outlier-method=mad',
+                                      '--outlier-threshold=1', '--stdout')
+            bench3 = perf.Benchmark.loads(stdout)
+
+        self.assertEqual(bench2.get_samples(), samples * 20)
+        self.assertEqual(removed_outliers(bench2), [0] * 19 + [2])
 
-        self.assertEqual(bench2.get_samples(),
-                         samples)
+        # median=100, MAD=1.48: keep samples in [98.5; 101.5]
+        self.assertEqual(bench3.get_samples(),
+                         (99.0, 100.0, 101.0) * 20)
+        self.assertEqual(removed_outliers(bench3), [2] * 19 + [4])
 
     def test_remove_warmups(self):
         samples = [1.0, 2.0, 3.0]
@@ -444,6 +787,92 @@ class TestConvert(BaseTestCase, unittest.TestCase):
         self.assertEqual(bench2._get_raw_samples(warmups=True),
                          raw_samples[1:])
 
+    def test_compact(self):
+        with tests.temporary_directory() as tmpdir:
+            filename = os.path.join(tmpdir, 'test.json')
+            for sample in (1.0, 2.0, 3.0):
+                perf.add_runs(filename, self.create_bench((sample,),
+                                                          metadata={'name': 'bench'}))
+
+            self.run_command('compact', filename)
+
+            with open(filename) as fp:
+                lines = fp.readlines()
+            bench = perf.Benchmark.load(filename)
+            files = os.listdir(tmpdir)
+
+        self.assertEqual(files, ['test.json'])
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(bench.get_samples(), (1.0, 2.0, 3.0))
+
+    def test_store_query(self):
+        suite = perf.BenchmarkSuite()
+        for name, samples in (('a', (1.0, 1.5, 2.0)), ('b', (3.0,))):
+            suite.add_benchmark(self.create_bench(
+                samples,
+                metadata={'name': name,
+                          'hostname': 'host',
+                          'python_version': '3.5.2',
+                          'date': '2016-09-01T10:00:00'}))
+
+        with tests.temporary_directory() as tmpdir:
+            filename = os.path.join(tmpdir, 'test.json')
+            suite.dump(filename)
+            database = os.path.join(tmpdir, 'history.db')
+
+            stdout = self.run_command('store', database, filename)
+            self.assertEqual(stdout,
+                             '%s: 2 benchmarks stored, 0 ignored '
+                             '(already stored)\n' % filename)
+
+            stdout = self.run_command('query', database,
+                                      '--python-version', '3.5',
+                                      '--since', '2016-09-01')
+            expected = textwrap.dedent("""
+                a
+                -
+
+                2016-09-01T10:00:00 [host, Python 3.5.2]: 1.50 sec +- 0.50 sec
+
+                b
+                -
+
+                2016-09-01T10:00:00 [host, Python 3.5.2]: 3.00 sec
+            """).strip()
+            self.assertEqual(stdout.rstrip(), expected)
+
+            stdout = self.run_command('query', database, '--name', 'a',
+                                      '-o', tmpdir)
+            output = os.path.join(tmpdir, '2016-09-01T10-00-00-1.json')
+            self.assertEqual(stdout, 'Write %s\n' % output)
+            bench = perf.Benchmark.load(output)
+            self.assertEqual(bench.get_samples(), (1.0, 1.5, 2.0))
+
+            # --since and --days are mutually exclusive
+            cmd = [sys.executable, '-m', 'perf', 'query', database,
+                   '--since', '2016-09-01', '--days', '30']
+            proc = subprocess.Popen(cmd,
+                                    stdout=subprocess.PIPE,
+                                    stderr=subprocess.PIPE,
+                                    universal_newlines=True)
+            stderr = proc.communicate()[1]
+            self.assertEqual(proc.returncode, 2)
+            self.assertIn('not allowed with argument', stderr)
+
+    def test_query_unknown_metadata(self):
+        bench = self.create_bench((1.0,),
+                                  metadata={'name': 'bench',
+                                            'date': '2016-09-01T10:00:00'})
+        with tests.temporary_directory() as tmpdir:
+            filename = os.path.join(tmpdir, 'test.json')
+            bench.dump(filename)
+            database = os.path.join(tmpdir, 'history.db')
+            self.run_command('store', database, filename)
+            stdout = self.run_command('query', database)
+
+        # unknown hostname and Python version are omitted
+        self.assertEqual(stdout.rstrip(), '2016-09-01T10:00:00: 1.00 sec')
+
     def test_filter_runs(self):
         runs = (1.0, 2.0, 3.0, 4.0, 5.0)
         bench = self.create_bench(runs)
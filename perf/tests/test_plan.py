@@ -0,0 +1,88 @@
+import perf
+from perf import _plan
+from perf.tests import unittest
+
+
+def create_bench(runs, duration=5.0):
+    bench = perf.Benchmark()
+    for samples in runs:
+        run = perf.Run(samples,
+                       metadata={'name': 'bench', 'duration': duration},
+                       collect_metadata=False)
+        bench.add_run(run)
+    return bench
+
+
+class TestPlan(unittest.TestCase):
+    def setUp(self):
+        self.bench = create_bench([(1.0, 1.2), (1.4, 1.6), (1.8, 2.0)])
+
+    def test_normal_quantile(self):
+        self.assertAlmostEqual(_plan._normal_quantile(0.5), 0.0)
+        self.assertAlmostEqual(_plan._normal_quantile(0.975),
+                               1.959963984540054)
+        self.assertAlmostEqual(_plan._normal_quantile(0.2),
+                               -0.8416212335729143)
+
+    def test_estimate_variances(self):
+        variances = _plan.estimate_variances(self.bench)
+        self.assertAlmostEqual(variances.mean, 1.5)
+        # variance of run means (0.16) minus the within variance divided by
+        # the number of samples per run
+        self.assertAlmostEqual(variances.between, 0.15)
+        self.assertAlmostEqual(variances.within, 0.02)
+        self.assertEqual(variances.loops, 1)
+
+        # a single sample per run
+        bench = create_bench([(1.0,), (2.0,)])
+        variances = _plan.estimate_variances(bench)
+        self.assertAlmostEqual(variances.between, 0.5)
+        self.assertEqual(variances.within, 0.0)
+
+        with self.assertRaises(ValueError):
+            _plan.estimate_variances(create_bench([(1.0, 2.0)]))
+
+    def test_estimate_costs(self):
+        costs = _plan.estimate_costs(self.bench)
+        # durations minus the sum of samples: 2.8, 2.0 and 1.2 seconds
+        self.assertAlmostEqual(costs.process_overhead, 2.0)
+        self.assertAlmostEqual(costs.loop_time, 1.5)
+        self.assertEqual(costs.nwarmup, 0)
+
+    def test_detectable_effect(self):
+        variances = _plan.estimate_variances(self.bench)
+        effect = _plan.detectable_effect(variances, 3, 2, 1)
+        self.assertAlmostEqual(effect, 0.6100, places=4)
+
+        # more processes detect smaller effects
+        effect = _plan.detectable_effect(variances, 12, 2, 1)
+        self.assertAlmostEqual(effect, 0.3050, places=4)
+
+    def test_plan(self):
+        variances = _plan.estimate_variances(self.bench)
+        costs = _plan.estimate_costs(self.bench)
+
+        plan = _plan.plan(variances, costs, 0.5)
+        self.assertEqual(plan[:3], (5, 1, 1))
+        self.assertAlmostEqual(plan.duration, 5 * (2.0 + 1.5))
+        self.assertLessEqual(_plan.detectable_effect(variances, 5, 1, 1),
+                             0.5)
+
+        # the variance within processes is dominant: compute more samples
+        # rather than spawning more processes
+        variances = variances._replace(between=0.0, within=1.0)
+        costs = costs._replace(process_overhead=10.0)
+        plan = _plan.plan(variances, costs, 0.5)
+        self.assertEqual(plan[:3], (2, 14, 1))
+
+        with self.assertRaises(ValueError):
+            _plan.plan(variances, costs, 0.5, power=1.0)
+        with self.assertRaises(ValueError):
+            _plan.plan(variances, costs, 0.0)
+        with self.assertRaises(ValueError):
+            # too small effect
+            _plan.plan(variances, costs, 1e-6)
+
+
+if __name__ == "__main__":
+    unittest.main()
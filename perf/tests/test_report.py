@@ -0,0 +1,59 @@
+import json
+
+import six
+
+from perf import _report
+from perf.tests import unittest
+
+
+FIELDS = ('name', 'median', 'significant')
+
+
+class TestReport(unittest.TestCase):
+    def test_json(self):
+        output = six.StringIO()
+        writer = _report.create_writer('json', FIELDS, output)
+        writer.write({'significant': True, 'name': 'bench', 'median': 1.5})
+        writer.write({'name': 'other'})
+
+        lines = output.getvalue().splitlines()
+        self.assertEqual(lines[0],
+                         '{"name": "bench", "median": 1.5, '
+                         '"significant": true}')
+        self.assertEqual(json.loads(lines[1]),
+                         {'name': 'other', 'median': None,
+                          'significant': None})
+
+    def test_json_not_finite(self):
+        output = six.StringIO()
+        writer = _report.create_writer('json', FIELDS, output)
+        writer.write({'name': 'nan', 'median': float('nan')})
+        writer.write({'name': 'inf', 'median': float('inf')})
+
+        lines = output.getvalue().splitlines()
+        self.assertEqual(lines[0],
+                         '{"name": "nan", "median": null, '
+                         '"significant": null}')
+        self.assertEqual(json.loads(lines[1]),
+                         {'name': 'inf', 'median': None,
+                          'significant': None})
+
+    def test_csv(self):
+        output = six.StringIO()
+        writer = _report.create_writer('csv', FIELDS, output)
+        writer.write_records([{'name': 'bench', 'median': 0.1,
+                               'significant': False},
+                              {'name': 'a,b'}])
+
+        self.assertEqual(output.getvalue(),
+                         'name,median,significant\n'
+                         'bench,0.1,False\n'
+                         '"a,b",,\n')
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            _report.create_writer('xml', FIELDS)
+
+
+if __name__ == "__main__":
+    unittest.main()
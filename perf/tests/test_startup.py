@@ -0,0 +1,81 @@
+"""
+Regression tests on the startup time of perf: importing perf, running the
+perf command and spawning a worker process must not import modules only used
+by a few functions, like sqlite3 or multiprocessing.
+"""
+import subprocess
+import sys
+import unittest
+
+
+# Modules which are slow to import and are only imported on demand
+LAZY_MODULES = ('csv', 'multiprocessing', 'sqlite3', 'statistics')
+# Modules which are not needed by "import perf"
+LAZY_IMPORT_MODULES = LAZY_MODULES + ('datetime', 'json', 'platform',
+                                      'subprocess')
+
+# perf modules only imported by the perf commands which need them
+LAZY_MAIN_MODULES = ('perf._cli', 'perf._report', 'perf.text_runner')
+
+# Print the modules imported by a Python program at exit
+PRINT_MODULES = ('import atexit, sys; '
+                 'atexit.register(lambda: sys.stderr.write('
+                 '"\\n%s\\n" % " ".join(sorted(sys.modules))))')
+
+WORKER_ARGS = ['timeit', '--worker', '-n', '1', '-w', '0', '-l', '1',
+               '-q', 'pass']
+
+
+def get_modules(code):
+    args = [sys.executable, '-c', '%s; %s' % (PRINT_MODULES, code)]
+    proc = subprocess.Popen(args,
+                            stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE,
+                            universal_newlines=True)
+    stdout, stderr = proc.communicate()
+    if proc.returncode:
+        raise Exception("%s failed with exit code %s: %s"
+                        % (code, proc.returncode, stderr))
+    return set(stderr.splitlines()[-1].split())
+
+
+def run_perf(args):
+    code = ('import runpy, sys; sys.argv = %r; '
+            'runpy.run_module("perf", run_name="__main__", alter_sys=True)'
+            % (['perf'] + args))
+    return get_modules(code)
+
+
+class TestStartup(unittest.TestCase):
+    def check_lazy_modules(self, modules, lazy_modules):
+        baseline = get_modules('pass')
+        for name in lazy_modules:
+            if name in baseline:
+                # imported by Python at startup (ex: by the site module)
+                continue
+            self.assertNotIn(name, modules)
+
+    def test_import_perf(self):
+        modules = get_modules('import perf')
+        self.check_lazy_modules(modules, LAZY_IMPORT_MODULES)
+
+    def test_help(self):
+        modules = run_perf(['--help'])
+        self.check_lazy_modules(modules, LAZY_IMPORT_MODULES)
+        self.check_lazy_modules(modules, LAZY_MAIN_MODULES)
+
+    def test_metadata(self):
+        modules = run_perf(['metadata'])
+        self.assertIn('perf._collect_metadata', modules)
+        # display_metadata() comes from perf._cli
+        lazy_modules = set(LAZY_MAIN_MODULES) - {'perf._cli'}
+        self.check_lazy_modules(modules, lazy_modules)
+
+    def test_worker(self):
+        modules = run_perf(WORKER_ARGS)
+        self.assertIn('perf._timeit', modules)
+        self.check_lazy_modules(modules, LAZY_MODULES)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,145 @@
+import datetime
+import os.path
+import shutil
+import tempfile
+
+import perf
+from perf._store import ResultStore
+from perf.tests import unittest
+
+
+def create_suite(benchmarks, hostname='host1', python_version='3.5.2',
+                 date='2016-09-01T10:00:00'):
+    suite = perf.BenchmarkSuite()
+    for name, samples in benchmarks:
+        bench = perf.Benchmark()
+        metadata = {'name': name}
+        if hostname:
+            metadata['hostname'] = hostname
+        if python_version:
+            metadata['python_version'] = python_version
+        if date:
+            metadata['date'] = date
+        for sample in samples:
+            bench.add_run(perf.Run([sample], metadata=metadata,
+                                   collect_metadata=False))
+        suite.add_benchmark(bench)
+    return suite
+
+
+class TestResultStore(unittest.TestCase):
+    def setUp(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+
+        self.store = ResultStore(os.path.join(tmpdir, 'history.db'))
+        self.addCleanup(self.store.close)
+
+    def test_add_suite(self):
+        suite = create_suite([('a', (1.0, 2.0, 3.0)), ('b', (5.0,))])
+        self.assertEqual(self.store.add_suite(suite, 'a.json'), 2)
+        # benchmarks already stored are ignored
+        self.assertEqual(self.store.add_suite(suite, 'a.json'), 0)
+
+        entries = self.store.query()
+        self.assertEqual([entry.name for entry in entries], ['a', 'b'])
+
+        entry = entries[0]
+        self.assertEqual(entry.hostname, 'host1')
+        self.assertEqual(entry.python_version, '3.5.2')
+        self.assertEqual(entry.start_date,
+                         datetime.datetime(2016, 9, 1, 10, 0, 0))
+        self.assertEqual(entry.median, 2.0)
+        self.assertEqual(entry.stdev, 1.0)
+        self.assertEqual(entry.nsample, 3)
+        self.assertEqual(entry.filename, os.path.abspath('a.json'))
+        self.assertIsNone(entries[1].stdev)
+
+    def test_add_suite_unknown_metadata(self):
+        suite = create_suite([('a', (1.0,))], hostname=None,
+                             python_version=None, date=None)
+        self.assertEqual(self.store.add_suite(suite, 'a.json'), 1)
+        # unknown metadata must not prevent to detect a stored benchmark
+        self.assertEqual(self.store.add_suite(suite, 'a.json'), 0)
+
+        entries = self.store.query()
+        self.assertEqual(len(entries), 1)
+        entry = entries[0]
+        self.assertIsNone(entry.hostname)
+        self.assertIsNone(entry.python_version)
+        self.assertIsNone(entry.start_date)
+        self.assertIsNone(entry.end_date)
+
+        self.assertEqual(self.store.query(end=datetime.datetime(2016, 9, 15)),
+                         [])
+
+    def test_sample_file(self):
+        # the path of the sample file is relative to the JSON file, not to
+        # the current directory
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        subdir = os.path.join(tmpdir, 'sub')
+        os.mkdir(subdir)
+        sample_file = perf.SampleFile.create(os.path.join(subdir, 's.bin'),
+                                             [1.0, 2.0, 3.0])
+        bench = perf.Benchmark()
+        bench.add_run(perf.Run(sample_file, metadata={'name': 'bench'},
+                               collect_metadata=False))
+
+        old_cwd = os.getcwd()
+        self.addCleanup(os.chdir, old_cwd)
+        os.chdir(tmpdir)
+        filename = os.path.join('sub', 'x.json')
+        bench.dump(filename)
+        suite = perf.BenchmarkSuite.load(filename)
+        self.store.add_suite(suite)
+
+        os.chdir(old_cwd)
+        suites = self.store.get_suites()
+        self.assertEqual(list(suites[0].get_benchmark('bench').get_samples()),
+                         [1.0, 2.0, 3.0])
+
+    def test_query(self):
+        self.store.add_suite(create_suite([('a', (1.0,))]), 'old.json')
+        self.store.add_suite(create_suite([('a', (2.0,)), ('b', (3.0,))],
+                                          hostname='host2',
+                                          python_version='3.6.0 (64-bit)',
+                                          date='2016-10-01T10:00:00'),
+                             'new.json')
+
+        def medians(**kw):
+            return [(entry.name, entry.median)
+                    for entry in self.store.query(**kw)]
+
+        self.assertEqual(medians(name='a'), [('a', 1.0), ('a', 2.0)])
+        self.assertEqual(medians(hostname='host2'), [('a', 2.0), ('b', 3.0)])
+        self.assertEqual(medians(python_version='3.6'),
+                         [('a', 2.0), ('b', 3.0)])
+        self.assertEqual(medians(python_version='3.5.2'), [('a', 1.0)])
+        self.assertEqual(medians(python_version='3.5.1'), [])
+        self.assertEqual(medians(start=datetime.datetime(2016, 9, 15)),
+                         [('a', 2.0), ('b', 3.0)])
+        self.assertEqual(medians(end=datetime.datetime(2016, 9, 15)),
+                         [('a', 1.0)])
+
+    def test_get_suites(self):
+        self.store.add_suite(create_suite([('a', (1.0, 2.0))]), 'old.json')
+        self.store.add_suite(create_suite([('a', (3.0,)), ('b', (4.0,))],
+                                          date='2016-10-01T10:00:00'),
+                             'new.json')
+
+        suites = self.store.get_suites()
+        self.assertEqual([suite.filename for suite in suites],
+                         [os.path.abspath('old.json'),
+                          os.path.abspath('new.json')])
+        self.assertEqual(suites[0].get_benchmark('a').get_samples(),
+                         (1.0, 2.0))
+        self.assertEqual(suites[1].get_benchmark_names(), ['a', 'b'])
+
+        suites = self.store.get_suites(name='b')
+        self.assertEqual(len(suites), 1)
+        self.assertEqual(suites[0].get_benchmark_names(), ['b'])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -145,6 +145,55 @@ class TestTextRunner(unittest.TestCase):
         for run in result.bench.get_runs():
             self.assertEqual(run.get_total_loops(), 2 ** 10)
 
+    def test_auto_warmups(self):
+        times = iter([1.0 + 2.0 * 0.7 ** index for index in range(1000)])
+
+        def sample_func(loops):
+            return next(times) * loops
+
+        result = self.run_text_runner('--worker', '--warmups', 'auto',
+                                      '--loops', '1', '-n', '3',
+                                      sample_func=sample_func)
+        run = result.bench.get_runs()[0]
+        nwarmup = len(run.warmups)
+        # the steady state is checked on 4 samples for 3 samples per run
+        self.assertTrue(4 <= nwarmup < 100, nwarmup)
+        self.assertEqual(result.bench.get_metadata()['auto_warmups'].value,
+                         nwarmup)
+        self.assertEqual(result.bench.get_metadata()['steady_state'].value, 1)
+        self.assertEqual(result.bench.get_nsample(), 3)
+
+        times = iter([1.0 + index * 0.01 for index in range(1000)])
+        result = self.run_text_runner('--worker', '--warmups', 'auto',
+                                      '--max-warmups', '20',
+                                      '--loops', '1', '-n', '3',
+                                      sample_func=sample_func)
+        run = result.bench.get_runs()[0]
+        self.assertEqual(len(run.warmups), 20)
+        self.assertEqual(result.bench.get_metadata()['auto_warmups'].value,
+                         20)
+        self.assertEqual(result.bench.get_metadata()['steady_state'].value, 0)
+
+    def test_warn_steady_state(self):
+        runner = perf.text_runner.TextRunner('bench')
+        runner.parse_args(['--warmups', 'auto', '--max-warmups', '5'])
+
+        def warn(steady_states):
+            bench = perf.Benchmark()
+            for steady_state in steady_states:
+                metadata = {'name': 'bench', 'auto_warmups': 5,
+                            'steady_state': steady_state}
+                bench.add_run(perf.Run([1.0], metadata=metadata,
+                                       collect_metadata=False))
+            with tests.capture_stdout() as stdout:
+                runner._warn_steady_state(bench)
+            return stdout.getvalue()
+
+        # steady state reached at the last allowed warmup: no warning
+        self.assertEqual(warn([1, 1]), '')
+        self.assertIn('WARNING: 1 runs reached the maximum number of '
+                      'warmups (5) before the steady state', warn([1, 0]))
+
     def test_json_file(self):
         with tests.temporary_directory() as tmpdir:
             filename = os.path.join(tmpdir, 'test.json')
@@ -232,6 +281,51 @@ class TestTextRunner(unittest.TestCase):
                           # warmup 2
                           (32, 1.0)))
 
+    def test_matrix(self):
+        runner = perf.text_runner.TextRunner('bench')
+        runner._cpu_affinity = lambda: None
+        runner.parse_args(['-p', '2', '-l', '1', '-q',
+                           '--python', 'python3.5', '--python', 'python3.6',
+                           '--python-flags=-X dev',
+                           '--env', 'A=1,B=2', '--env', ''])
+        self.assertEqual([config.label for config in runner._matrix],
+                         ['python3.5 A=1 B=2', 'python3.5',
+                          'python3.6 A=1 B=2', 'python3.6'])
+
+        calls = []
+
+        def run_cmd(cmd, env):
+            calls.append((cmd[:3], env.get('A')))
+            run = perf.Run([1.0 + len(calls)],
+                           metadata={'name': 'bench', 'loops': 1})
+            bench = perf.Benchmark()
+            bench.add_run(run)
+            return tests.benchmark_as_json(bench)
+
+        with mock.patch('perf.text_runner._run_cmd', side_effect=run_cmd):
+            with tests.capture_stdout() as stdout:
+                suite = runner.bench_sample_func(lambda loops: 1.0)
+
+        # in the matrix mode, a single benchmark gives a suite
+        self.assertIsInstance(suite, perf.BenchmarkSuite)
+        # configurations are interleaved, starting with a different
+        # configuration in each round
+        self.assertEqual(calls,
+                         [(['python3.5', '-X', 'dev'], '1'),
+                          (['python3.5', '-X', 'dev'], None),
+                          (['python3.6', '-X', 'dev'], '1'),
+                          (['python3.6', '-X', 'dev'], None),
+                          (['python3.5', '-X', 'dev'], None),
+                          (['python3.6', '-X', 'dev'], '1'),
+                          (['python3.6', '-X', 'dev'], None),
+                          (['python3.5', '-X', 'dev'], '1')])
+        self.assertEqual(suite.get_benchmark_names(),
+                         ['bench [python3.5 A=1 B=2]', 'bench [python3.5]',
+                          'bench [python3.6 A=1 B=2]', 'bench [python3.6]'])
+        for bench in suite:
+            self.assertEqual(bench.get_nrun(), 2)
+        self.assertIn('Ranking (fastest first):', stdout.getvalue())
+
 
 class TestTextRunnerCPUAffinity(unittest.TestCase):
     def test_cpu_affinity_args(self):
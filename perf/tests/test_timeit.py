@@ -6,6 +6,8 @@ import sys
 import unittest
 
 import perf
+import perf._timeit
+import perf.text_runner
 from perf import tests
 
 
@@ -157,6 +159,102 @@ class TestTimeit(unittest.TestCase):
             bench = perf.Benchmark.load(filename)
             self.assertEqual(bench.get_nsample(), 2)
 
+    def check_inner_loops(self, inner_loops):
+        with tests.temporary_directory() as tmpdir:
+            filename = os.path.join(tmpdir, 'test.json')
+            args = [sys.executable,
+                    '-m', 'perf', 'timeit',
+                    '-p', '2',
+                    '-n', '2',
+                    '-w', '0',
+                    '--min-time', '0.001',
+                    '--inner-loops', inner_loops,
+                    '--output', filename,
+                    '-s', 'x = 1; y = 2',
+                    'x + y']
+            self.run_timeit(args)
+            bench = perf.Benchmark.load(filename)
+
+        self.assertEqual(len(bench.get_runs()), 2)
+        return bench._get_inner_loops()
+
+    def test_inner_loops(self):
+        self.assertEqual(self.check_inner_loops('8'), 8)
+
+        inner_loops = self.check_inner_loops('auto')
+        self.assertGreaterEqual(inner_loops, 1)
+        self.assertLessEqual(inner_loops, perf._timeit._MAX_INNER_LOOPS)
+
+    def test_create_timer(self):
+        runner = perf.text_runner.TextRunner('bench')
+        runner.parse_args([])
+        runner.args.setup = ['x = []']
+        runner.args.stmt = ['x.append(1)']
+
+        # the statement is copied inner_loops times
+        runner.inner_loops = 3
+        timer = perf._timeit.create_timer(runner)
+        self.assertEqual(timer.src.count('x.append(1)'), 3)
+
+        timer = perf._timeit.create_timer(runner, inner_loops=1)
+        self.assertEqual(timer.src.count('x.append(1)'), 1)
+
+    def test_statements(self):
+        with tests.temporary_directory() as tmpdir:
+            filename = os.path.join(tmpdir, 'test.json')
+            args = [sys.executable,
+                    '-m', 'perf', 'timeit',
+                    '-p', '2',
+                    '-n', '2',
+                    '-l', '1',
+                    '-w', '0',
+                    '--output', filename,
+                    '-s', 'import time',
+                    '--statement', 'short', SLEEP,
+                    '--statement', 'long', 'time.sleep(2e-3)']
+            proc = subprocess.Popen(args,
+                                    stdout=subprocess.PIPE,
+                                    universal_newlines=True)
+            stdout = proc.communicate()[0]
+            self.assertEqual(proc.returncode, 0)
+            suite = perf.BenchmarkSuite.load(filename)
+
+        self.assertEqual(suite.get_benchmark_names(), ['short', 'long'])
+        for bench in suite:
+            self.assertEqual(len(bench.get_runs()), 2)
+            self.assertEqual(bench.get_nsample(), 4)
+        bench = suite.get_benchmark('long')
+        self.assertEqual(bench.get_metadata()['timeit_stmt'].value,
+                         "'time.sleep(2e-3)'")
+
+        self.assertIn('Ranking (fastest first):\n'
+                      '1. short: ', stdout)
+        self.assertRegex(stdout, r'2\. long: .*: [0-9.]+x slower')
+
+    def test_statements_error(self):
+        args = [sys.executable,
+                '-m', 'perf', 'timeit',
+                '--statement', 'a', 'pass',
+                '--statement', 'a', 'pass']
+        proc = subprocess.Popen(args,
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE,
+                                universal_newlines=True)
+        stdout, stderr = proc.communicate()
+        self.assertNotEqual(proc.returncode, 0)
+        self.assertIn("ERROR: statement names must be unique", stdout)
+
+        args = [sys.executable,
+                '-m', 'perf', 'timeit',
+                '--statement', 'a', 'pass', 'pass']
+        proc = subprocess.Popen(args,
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE,
+                                universal_newlines=True)
+        stdout, stderr = proc.communicate()
+        self.assertNotEqual(proc.returncode, 0)
+        self.assertIn("ERROR: statements cannot be passed both", stdout)
+
     def test_cli_snippet_error(self):
         args = [sys.executable,
                 '-m', 'perf', 'timeit', 'x+1']
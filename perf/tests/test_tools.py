@@ -1,10 +1,13 @@
 import datetime
 import os.path
+import random
 import sys
 
 import six
+import statistics
 
 import perf
+from perf import _stats
 from perf._utils import format_filesize
 from perf import _utils as utils
 from perf.tests import mock
@@ -48,6 +51,344 @@ class TestStatistics(unittest.TestCase):
         self.assertTrue(significant)
         self.assertEqual(tscore2, -tscore)
 
+    def test_is_significant_tests(self):
+        # different number of samples, expected scores computed by scipy
+        DATA1 = [89.2, 78.2, 89.3, 88.3, 87.3, 90.1, 95.2, 94.3, 78.3, 89.3]
+        DATA2 = [79.3, 78.3, 85.3, 79.3, 88.9, 91.2, 87.2]
+
+        significant, score = perf.is_significant(DATA1, DATA2)
+        self.assertFalse(significant)
+        self.assertAlmostEqual(score, 1.3755126255173287)
+
+        significant, score = perf.is_significant(DATA1, DATA2, 'welch')
+        self.assertFalse(significant)
+        self.assertAlmostEqual(score, 1.3974590192938396)
+
+        significant, score = perf.is_significant(DATA1, DATA2, 'mann-whitney')
+        self.assertFalse(significant)
+        self.assertAlmostEqual(score, 1.2710086592045604)
+
+        inflated = [x * 10 for x in DATA1]
+        for test in ('student', 'welch', 'mann-whitney'):
+            significant, score = perf.is_significant(DATA1, inflated, test)
+            self.assertTrue(significant)
+            self.assertLess(score, 0)
+
+        with self.assertRaises(ValueError):
+            perf.is_significant(DATA1, DATA2, 'unknown')
+
+        # summaries give the same score
+        summaries = _stats.summarize([DATA1, DATA2])
+        self.assertAlmostEqual(utils._is_significant_summary(*summaries)[1],
+                               1.3755126255173287)
+        self.assertAlmostEqual(
+            utils._is_significant_welch_summary(*summaries)[1],
+            1.3974590192938396)
+
+    def test_mann_whitney_u(self):
+        u, z = _stats.mann_whitney_u([1.0, 2.0, 3.0], [4.0, 5.0, 6.0, 7.0])
+        self.assertEqual(u, 0.0)
+        self.assertLess(z, 0)
+
+        # ties
+        self.assertEqual(_stats.mann_whitney_u([1.0, 1.0], [1.0, 1.0]),
+                         (2.0, 0.0))
+
+    def test_hodges_lehmann(self):
+        DATA1 = [89.2, 78.2, 89.3, 88.3, 87.3, 90.1, 95.2, 94.3, 78.3, 89.3]
+        DATA2 = [79.3, 78.3, 85.3, 79.3, 88.9, 91.2, 87.2]
+        self.assertAlmostEqual(_stats.hodges_lehmann(DATA1, DATA2), -3.5)
+        self.assertAlmostEqual(_stats.hodges_lehmann(DATA2, DATA1), 3.5)
+
+        samples = [float(index) for index in range(5000)]
+        shifted = [sample + 10.0 for sample in samples]
+        self.assertAlmostEqual(_stats.hodges_lehmann(samples, shifted), 10.0,
+                               delta=1.0)
+
+    def test_pvalues(self):
+        # critical values of the two-tailed Student's t-test, alpha=0.05
+        self.assertAlmostEqual(_stats.t_test_pvalue(12.706, 1), 0.05,
+                               places=4)
+        self.assertAlmostEqual(_stats.t_test_pvalue(-2.228, 10), 0.05,
+                               places=4)
+        self.assertAlmostEqual(_stats.t_test_pvalue(1.96, 10 ** 6), 0.05,
+                               places=4)
+        self.assertEqual(_stats.t_test_pvalue(0.0, 5), 1.0)
+        self.assertAlmostEqual(_stats.normal_pvalue(-1.96), 0.05, places=4)
+
+    def test_adjust_pvalues(self):
+        pvalues = [0.01, 0.04, 0.03, 0.005]
+        for adjusted, expected in zip(_stats.adjust_pvalues(pvalues, 'holm'),
+                                      [0.03, 0.06, 0.06, 0.02]):
+            self.assertAlmostEqual(adjusted, expected)
+        for adjusted, expected in zip(_stats.adjust_pvalues(pvalues, 'fdr'),
+                                      [0.02, 0.04, 0.04, 0.02]):
+            self.assertAlmostEqual(adjusted, expected)
+        self.assertEqual(_stats.adjust_pvalues([0.5, 0.9], 'holm'), [1.0, 1.0])
+        with self.assertRaises(ValueError):
+            _stats.adjust_pvalues(pvalues, 'bonferroni')
+
+    def test_quantile_sorted(self):
+        samples = [float(index) for index in range(11)]
+        self.assertEqual(_stats.quantile_sorted(samples, 0.0), 0.0)
+        self.assertEqual(_stats.quantile_sorted(samples, 0.25), 2.5)
+        self.assertEqual(_stats.quantile_sorted(samples, 0.5), 5.0)
+        self.assertEqual(_stats.quantile_sorted(samples, 1.0), 10.0)
+        self.assertEqual(_stats.quantile_sorted([3.0], 0.3), 3.0)
+        with self.assertRaises(ValueError):
+            _stats.quantile_sorted(samples, 1.5)
+
+    def test_outlier_bounds(self):
+        # expected values computed by numpy.percentile() and numpy.median()
+        DATA = [89.2, 78.2, 89.3, 88.3, 87.3, 90.1, 95.2, 94.3, 78.3, 89.3]
+
+        low, high = _stats.outlier_bounds(DATA)
+        self.assertAlmostEqual(low, 84.025)
+        self.assertAlmostEqual(high, 93.425)
+        low, high = _stats.outlier_bounds(DATA, 'iqr', 3.0)
+        self.assertAlmostEqual(low, 80.5)
+        self.assertAlmostEqual(high, 96.95)
+
+        low, high = _stats.outlier_bounds(DATA, 'mad')
+        self.assertAlmostEqual(low, 82.80069)
+        self.assertAlmostEqual(high, 95.69931)
+
+        low, high = _stats.outlier_bounds(DATA, 'trim', 10)
+        self.assertAlmostEqual(low, 78.29)
+        self.assertAlmostEqual(high, 94.39)
+
+        with self.assertRaises(ValueError):
+            _stats.outlier_bounds(DATA, 'stdev')
+        with self.assertRaises(ValueError):
+            _stats.outlier_bounds(DATA, 'iqr', -1.0)
+        with self.assertRaises(ValueError):
+            _stats.outlier_bounds(DATA, 'trim', 50)
+
+    def test_is_steady_state(self):
+        # warmup curve: the first samples are slower
+        samples = [1.0 + 2.0 * 0.7 ** index for index in range(40)]
+        self.assertFalse(_stats.is_steady_state(samples[:10]))
+        self.assertTrue(_stats.is_steady_state(samples))
+
+        # noise without trend
+        samples = [1.0 + ((index * 7) % 5 - 2) * 0.02 for index in range(10)]
+        self.assertTrue(_stats.is_steady_state(samples))
+
+        # slow trend
+        samples = [1.0 + index * 0.01 for index in range(40)]
+        self.assertFalse(_stats.is_steady_state(samples))
+        # the trend is not mistaken for noise on a short window
+        for nsample in range(4, 12):
+            self.assertFalse(_stats.is_steady_state(samples[:nsample], 4))
+
+        # not enough samples
+        self.assertFalse(_stats.is_steady_state([1.0] * 9))
+        self.assertTrue(_stats.is_steady_state([1.0] * 10))
+        self.assertFalse(_stats.is_steady_state([1.0] * 3, 4))
+        self.assertTrue(_stats.is_steady_state([1.0] * 4, 4))
+        with self.assertRaises(ValueError):
+            _stats.is_steady_state([1.0] * 10, 3)
+
+    def test_find_modes(self):
+        # two modes: 2/3 of samples around 1.0 and 1/3 around 1.2
+        samples = [(1.0 if index % 3 else 1.2)
+                   * (1 + ((index * 7) % 5 - 2) * 0.005)
+                   for index in range(90)]
+        modes = _stats.find_modes(samples)
+        self.assertEqual(len(modes), 2)
+        self.assertAlmostEqual(modes[0].location, 1.0, delta=0.005)
+        self.assertAlmostEqual(modes[0].weight, 2 / 3)
+        self.assertAlmostEqual(modes[1].location, 1.2, delta=0.005)
+        self.assertAlmostEqual(modes[1].weight, 1 / 3)
+        self.assertEqual(modes[0].low, float('-inf'))
+        self.assertEqual(modes[0].high, modes[1].low)
+        self.assertTrue(1.01 < modes[0].high < 1.19)
+        self.assertEqual(modes[1].high, float('inf'))
+
+        # a single mode
+        samples = [1.0 + ((index * 7919) % 101) / 1000.0
+                   for index in range(200)]
+        self.assertEqual(_stats.find_modes(samples),
+                         [_stats.Mode(statistics.median(samples), 1.0,
+                                      float('-inf'), float('inf'))])
+
+        # an outlier is not a mode
+        modes = _stats.find_modes(samples + [10.0])
+        self.assertEqual(len(modes), 1)
+
+        # samples quantized by the timer resolution
+        samples = [1.0 + (index % 5) * 0.01 for index in range(1000)]
+        self.assertEqual(len(_stats.find_modes(samples)), 1)
+
+        # not enough samples
+        self.assertEqual(len(_stats.find_modes([1.0] * 20 + [2.0] * 20)), 1)
+        self.assertEqual(len(_stats.find_modes([1.0] * 100)), 1)
+
+    def test_find_modes_many_samples(self):
+        # the bandwidth of many samples is estimated on evenly spaced samples
+        rand = random.Random(0)
+        samples = [rand.gauss(1.0 if index % 3 else 1.2, 0.01)
+                   for index in range(1000)]
+        modes = _stats.find_modes(samples)
+        self.assertEqual(len(modes), 2)
+        # evenly spaced samples with a single value
+        samples2 = [1.0] * 1000
+        samples2[1] = 2.0
+        with mock.patch('perf._stats._KDE_MAX_SORT', 100):
+            self.assertEqual(_stats.find_modes(samples2),
+                             [_stats.Mode(1.0, 1.0,
+                                          float('-inf'), float('inf'))])
+
+        with mock.patch('perf._stats._KDE_MAX_SORT', 100):
+            modes2 = _stats.find_modes(samples)
+        self.assertEqual(len(modes2), 2)
+        for mode, mode2 in zip(modes, modes2):
+            self.assertAlmostEqual(mode2.location, mode.location, delta=0.005)
+            self.assertAlmostEqual(mode2.weight, mode.weight, delta=0.01)
+
+    def test_is_significant_summary(self):
+        DATA1 = [89.2, 78.2, 89.3, 88.3, 87.3, 90.1, 95.2, 94.3, 78.3, 89.3]
+        DATA2 = [79.3, 78.3, 85.3, 79.3, 88.9, 91.2, 87.2, 89.2, 93.3, 79.9]
+        summary1, summary2 = _stats.summarize([DATA1, DATA2])
+
+        significant, tscore = utils._is_significant_summary(summary1,
+                                                            summary2)
+        expected = perf.is_significant(DATA1, DATA2)
+        self.assertEqual(significant, expected[0])
+        self.assertAlmostEqual(tscore, expected[1])
+
+    def check_summarize(self):
+        samples_list = [[float(1 + (index * 7919 + size) % 1013)
+                         for index in range(size)]
+                        for size in (1, 2, 3, 10, 10, 10, 101, 5000)]
+        samples_list.append(tuple(samples_list[-1]))
+
+        summaries = _stats.summarize(samples_list)
+        self.assertEqual(len(summaries), len(samples_list))
+        for samples, summary in zip(samples_list, summaries):
+            self.assertEqual(summary.nsample, len(samples))
+            self.assertAlmostEqual(summary.mean, statistics.mean(samples))
+            self.assertEqual(summary.median, statistics.median(samples))
+            if len(samples) >= 2:
+                self.assertAlmostEqual(summary.stdev,
+                                       statistics.stdev(samples))
+            else:
+                self.assertIsNone(summary.stdev)
+
+    def test_summarize(self):
+        with mock.patch('perf._stats._get_numpy', return_value=None):
+            self.check_summarize()
+
+    @unittest.skipIf(_stats._get_numpy() is None, 'need numpy')
+    def test_summarize_numpy(self):
+        with mock.patch('perf._stats._NUMPY_MIN_SAMPLES', 1):
+            self.check_summarize()
+
+    def test_bootstrap_median_ci(self):
+        samples = [1.0 + (index * 7919) % 101 / 1000.0 for index in range(200)]
+        median = statistics.median(samples)
+
+        low, high = perf.bootstrap_median_ci(samples)
+        self.assertLessEqual(low, median)
+        self.assertLessEqual(median, high)
+        self.assertLess(high - low, 0.05)
+        # fixed seed
+        self.assertEqual(perf.bootstrap_median_ci(samples), (low, high))
+
+        low99, high99 = perf.bootstrap_median_ci(samples, confidence=0.99)
+        self.assertLessEqual(low99, low)
+        self.assertGreaterEqual(high99, high)
+
+    def test_bootstrap_median_ci_many_samples(self):
+        # above _BOOTSTRAP_MAX_DRAWS, the middle indexes of resamples are
+        # drawn from their distribution: same interval than drawing indexes
+        samples = [1.0 + (index * 7919) % 101 / 1000.0 for index in range(201)]
+        low, high = perf.bootstrap_median_ci(samples)
+        with mock.patch('perf._stats._BOOTSTRAP_MAX_DRAWS', 1):
+            low2, high2 = perf.bootstrap_median_ci(samples)
+        self.assertAlmostEqual(low2, low, delta=0.005)
+        self.assertAlmostEqual(high2, high, delta=0.005)
+
+        for nsample in (10, 11):
+            lows, highs = _stats._median_order_statistics(nsample, 100, 0)
+            self.assertEqual(len(lows), 100)
+            for low, high in zip(lows, highs):
+                self.assertTrue(0 <= low <= high < nsample, (low, high))
+                if nsample % 2:
+                    self.assertEqual(low, high)
+
+    def test_bootstrap_ratio_ci(self):
+        samples1 = [1.0 + (index * 7919) % 101 / 1000.0 for index in range(200)]
+        samples2 = [sample * 2 for sample in samples1]
+
+        low, high = perf.bootstrap_ratio_ci(samples1, samples2)
+        self.assertLess(low, 0.5)
+        self.assertGreater(high, 0.5)
+        self.assertLess(high - low, 0.05)
+
+        low, high = perf.bootstrap_ratio_ci(samples1, samples1)
+        self.assertLess(low, 1.0)
+        self.assertGreater(high, 1.0)
+
+    def test_geometric_mean_speed(self):
+        samples = [1.0 + (index * 7919) % 101 / 1000.0 for index in range(200)]
+        faster = [sample / 4 for sample in samples]
+        same = list(samples)
+        pairs = [(samples, faster), (samples, same)]
+
+        mean = perf.geometric_mean_speed(pairs)
+        self.assertAlmostEqual(mean.speed, 2.0)
+        self.assertLess(mean.low, 2.0)
+        self.assertGreater(mean.high, 2.0)
+        self.assertLess(mean.high - mean.low, 0.1)
+        # fixed seed
+        self.assertEqual(perf.geometric_mean_speed(pairs), mean)
+
+        mean = perf.geometric_mean_speed(pairs, weights=[1, 0])
+        self.assertAlmostEqual(mean.speed, 4.0)
+        mean = perf.geometric_mean_speed(pairs, weights=[1, 3])
+        self.assertAlmostEqual(mean.speed, 4.0 ** 0.25)
+
+        with self.assertRaises(ValueError):
+            perf.geometric_mean_speed(pairs, weights=[1])
+        with self.assertRaises(ValueError):
+            perf.geometric_mean_speed(pairs, weights=[1, -1])
+        with self.assertRaises(ValueError):
+            perf.geometric_mean_speed(pairs, weights=[0, 0])
+
+    def check_geometric_mean_many_pairs(self):
+        # more pairs than resamples: pairs must be resampled independently,
+        # otherwise all resampled means are equal
+        rand = random.Random(0)
+        pairs = [([rand.gauss(1.0, 0.01) for _ in range(5)],
+                  [rand.gauss(2.0, 0.02) for _ in range(5)])
+                 for _ in range(300)]
+        mean = perf.geometric_mean_speed(pairs, nresample=100)
+        self.assertLess(mean.low, mean.speed)
+        self.assertGreater(mean.high, mean.speed)
+        self.assertLess(mean.high - mean.low, 0.01)
+
+    def test_geometric_mean_many_pairs(self):
+        with mock.patch('perf._stats._get_numpy', return_value=None):
+            self.check_geometric_mean_many_pairs()
+
+    @unittest.skipIf(_stats._get_numpy() is None, 'need numpy')
+    def test_geometric_mean_many_pairs_numpy(self):
+        self.check_geometric_mean_many_pairs()
+
+    def test_bootstrap_cis(self):
+        samples1 = [1.0 + (index * 7919) % 101 / 1000.0 for index in range(50)]
+        samples2 = [sample * 2 for sample in samples1]
+        tasks = [(samples1,), (samples1, samples2)]
+
+        cis = _stats.bootstrap_cis(tasks, processes=1)
+        self.assertEqual(cis, [perf.bootstrap_median_ci(samples1),
+                               perf.bootstrap_ratio_ci(samples1, samples2)])
+
+        # the pool of processes gives the same results
+        with mock.patch('perf._stats._BOOTSTRAP_POOL_MIN_TASKS', 1):
+            self.assertEqual(_stats.bootstrap_cis(tasks, processes=2), cis)
+
     def test_is_significant_FIXME(self):
         # FIXME: _TScore() division by zero: error=0
         # n = 100
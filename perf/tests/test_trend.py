@@ -0,0 +1,74 @@
+import datetime
+
+import perf
+from perf import _trend
+from perf.tests import unittest
+
+
+def create_suite(filename, date, samples):
+    suite = perf.BenchmarkSuite(filename)
+    bench = perf.Benchmark()
+    for sample in samples:
+        bench.add_run(perf.Run((sample,),
+                               metadata={'name': 'bench', 'date': date},
+                               collect_metadata=False))
+    suite.add_benchmark(bench)
+    return suite
+
+
+class TestTrend(unittest.TestCase):
+    def test_build_series(self):
+        suites = [create_suite('new.json', '2016-10-01T10:00:00',
+                               (2.0, 3.0, 4.0)),
+                  create_suite('old.json', '2016-09-01T10:00:00', (1.0,))]
+        # no date: ignored
+        bench = perf.Benchmark()
+        bench.add_run(perf.Run((5.0,), metadata={'name': 'bench'},
+                               collect_metadata=False))
+        suite = perf.BenchmarkSuite('nodate.json')
+        suite.add_benchmark(bench)
+        suites.append(suite)
+
+        series = _trend.build_series(suites)
+        self.assertEqual(list(series), ['bench'])
+        self.assertEqual(series['bench'],
+                         [_trend.TrendPoint(datetime.datetime(2016, 9, 1, 10),
+                                            1.0, 'old.json'),
+                          _trend.TrendPoint(datetime.datetime(2016, 10, 1, 10),
+                                            3.0, 'new.json')])
+
+    def test_change_points(self):
+        noise = (0.0, 0.01, -0.01, 0.005, -0.005, 0.0)
+        values = [1.0 + delta for delta in noise * 3]
+        self.assertEqual(_trend.change_points(values), [])
+
+        # shift of +10% at index 10, and of -20% at index 15
+        values[10:] = [value * 1.1 for value in values[10:]]
+        values[15:] = [value * 0.8 for value in values[15:]]
+        changes = _trend.change_points(values)
+        self.assertEqual([change.index for change in changes], [10, 15])
+        self.assertAlmostEqual(changes[0].before, 1.0)
+        self.assertAlmostEqual(changes[0].after, 1.1)
+        self.assertAlmostEqual(changes[1].before, 1.1)
+        self.assertAlmostEqual(changes[1].after, 0.88)
+
+        # shifts smaller than min_shift are merged
+        changes = _trend.change_points(values, 0.11)
+        self.assertEqual([change.index for change in changes], [15])
+        self.assertAlmostEqual(changes[0].before, 1.0, delta=0.01)
+        self.assertAlmostEqual(changes[0].after, 0.88)
+        self.assertEqual(_trend.change_points(values, 0.15), [])
+
+    def test_change_points_outlier(self):
+        # a single outlier is not a change point
+        values = [1.0, 1.01, 0.99, 1.0, 1.5, 1.0, 0.99, 1.01, 1.0]
+        self.assertEqual(_trend.change_points(values), [])
+
+        # too short series
+        self.assertEqual(_trend.change_points([1.0, 1.0, 2.0, 2.0, 2.0]), [])
+        # constant series
+        self.assertEqual(_trend.change_points([1.0] * 10), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
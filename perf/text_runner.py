@@ -1,16 +1,18 @@
 from __future__ import division, print_function, absolute_import
 
 import argparse
+import collections
 import errno
 import math
 import os
-import subprocess
+import shlex
 import sys
 
 import six
 
 import perf
-from perf._cli import display_run, display_benchmark
+from perf import _stats
+from perf._cli import display_run, display_benchmark, display_ranking
 from perf._utils import (format_timedelta, format_number,
                          format_cpu_list, parse_cpu_list,
                          get_isolated_cpus, set_cpu_affinity,
@@ -23,7 +25,18 @@ except ImportError:
     psutil = None
 
 
+# Configuration of worker processes in the matrix mode: python is the
+# Python executable (None means program_args[0]), flags is a list of command
+# line options of Python, environ is a list of (name, value) environment
+# variables
+_Config = collections.namedtuple('_Config', 'python flags environ label')
+
+
 def _run_cmd(args, env):
+    # only the main process spawns processes: worker processes don't need
+    # to import subprocess
+    import subprocess
+
     proc = subprocess.Popen(args,
                             universal_newlines=True,
                             stdout=subprocess.PIPE,
@@ -59,7 +72,7 @@ class TextRunner:
     # and so a total duration of 5 seconds by default
     def __init__(self, name, samples=None, warmups=None, processes=None,
                  loops=0, min_time=0.1, max_time=1.0, metadata=None,
-                 inner_loops=None, _argparser=None):
+                 inner_loops=None, max_warmups=100, _argparser=None):
         if not name:
             raise ValueError("name must be a non-empty string")
 
@@ -105,6 +118,11 @@ class TextRunner:
         # (sys.executable, '-m', 'perf', 'timeit').
         self.program_args = (sys.executable, sys.argv[0])
 
+        # Callback called by worker processes after samples are computed to
+        # complete metadata of the run: func(runner, metadata). metadata must
+        # be modified in-place.
+        self._complete_run_metadata = None
+
         # Number of inner-loops of the sample_func for bench_sample_func()
         self.inner_loops = inner_loops
 
@@ -120,10 +138,27 @@ class TextRunner:
                 raise ValueError("value must be >= 0")
             return value
 
+        def warmups_type(value):
+            if value == 'auto':
+                return value
+            return positive_or_nul(value)
+
         def comma_separated(values):
             values = [value.strip() for value in values.split(',')]
             return list(filter(None, values))
 
+        def loops_list(values):
+            return [positive_or_nul(value) for value in values.split(',')]
+
+        def environ_vars(values):
+            environ = []
+            for value in comma_separated(values):
+                name, sep, value = value.partition('=')
+                if not sep or not name:
+                    raise ValueError("invalid variable: %r" % name)
+                environ.append((name, value))
+            return tuple(environ)
+
         if _argparser is not None:
             parser = _argparser
         else:
@@ -145,10 +180,16 @@ class TextRunner:
                             help='number of samples per process (default: %s)'
                                  % samples)
         parser.add_argument('-w', '--warmups', dest="warmups",
-                            type=positive_or_nul, default=warmups,
+                            type=warmups_type, default=warmups,
                             help='number of skipped samples per run used '
-                                 'to warmup the benchmark (default: %s)'
-                                 % warmups)
+                                 'to warmup the benchmark, "auto" means '
+                                 'until the steady state is reached '
+                                 '(default: %s)' % warmups)
+        parser.add_argument('--max-warmups',
+                            type=strictly_positive, default=max_warmups,
+                            help='maximum number of warmups with '
+                                 '--warmups=auto (default: %s)'
+                                 % max_warmups)
         parser.add_argument('-l', '--loops',
                             type=positive_or_nul, default=loops,
                             help='number of loops per sample, 0 means '
@@ -192,6 +233,31 @@ class TextRunner:
                                  'variables inherited by worker child '
                                  'processes.')
 
+        # matrix of configurations of workers
+        parser.add_argument('--python', action='append', metavar='PYTHON',
+                            help='Python executable of worker processes '
+                                 '(default: current Python). Use the option '
+                                 'multiple times to compare interpreters.')
+        parser.add_argument('--python-flags', action='append',
+                            metavar='FLAGS',
+                            help='command line options of the Python '
+                                 'executable of workers, ex: "-X dev". '
+                                 'Use the option multiple times to compare '
+                                 'options.')
+        parser.add_argument('--env', action='append', metavar='VARS',
+                            type=environ_vars,
+                            help='comma-separated list of NAME=VALUE '
+                                 'environment variables set in worker '
+                                 'processes. Use the option multiple times '
+                                 'to compare environments.')
+
+        # internal options of workers running multiple benchmarks: number of
+        # loops of each benchmark, and index of the first benchmark
+        parser.add_argument('--worker-loops', type=loops_list,
+                            help=argparse.SUPPRESS)
+        parser.add_argument('--worker-rotate', type=positive_or_nul,
+                            default=0, help=argparse.SUPPRESS)
+
         memory = parser.add_mutually_exclusive_group()
         memory.add_argument('--tracemalloc', action="store_true",
                             help='Trace memory allocations using tracemalloc')
@@ -223,6 +289,13 @@ class TextRunner:
             args.loops = 1
             args.min_time = 1e-9
 
+        self._matrix = self._create_matrix()
+        labels = [config.label for config in self._matrix]
+        if len(set(labels)) != len(labels):
+            print("ERROR: duplicated configurations in the matrix of "
+                  "--python, --python-flags and --env options")
+            sys.exit(1)
+
         filename = args.output
         if filename and os.path.exists(filename):
             print("ERROR: The JSON file %r already exists" % filename)
@@ -246,6 +319,32 @@ class TextRunner:
                       "(--track-memory): %s" % err_msg)
                 sys.exit(1)
 
+    def _create_matrix(self):
+        # Configurations of workers: all combinations of --python,
+        # --python-flags and --env values. The label of a configuration
+        # only contains the parameters which have multiple values.
+        args = self.args
+        pythons = args.python or [None]
+        flags_list = args.python_flags or ['']
+        environs = args.env or [()]
+
+        matrix = []
+        for python in pythons:
+            for flags in flags_list:
+                for environ in environs:
+                    label = []
+                    if len(pythons) > 1:
+                        label.append(python)
+                    if len(flags_list) > 1 and flags:
+                        label.append(flags)
+                    if len(environs) > 1 and environ:
+                        label.extend('%s=%s' % item for item in environ)
+                    label = ' '.join(label) or 'default'
+                    config = _Config(python, shlex.split(flags), environ,
+                                     label)
+                    matrix.append(config)
+        return matrix
+
     def parse_args(self, args=None):
         if self.args is None:
             self.args = self.argparser.parse_args(args)
@@ -301,7 +400,12 @@ class TextRunner:
                       file=stream)
 
     def _run_bench(self, bench, sample_func, loops, nsample,
-                   is_warmup=False, is_calibrate=False, calibrate=False):
+                   is_warmup=False, is_calibrate=False, calibrate=False,
+                   until_steady=False):
+        # Return (loops, samples). With until_steady=True, stop when the
+        # steady state is reached and return (loops, samples, steady) where
+        # steady is False if nsample samples were measured before the steady
+        # state was reached.
         args = self.args
         stream = self._stream()
         if loops <= 0:
@@ -315,6 +419,13 @@ class TextRunner:
             sample_name = 'Sample'
 
         samples = []
+        # samples per loop iteration, used to detect the steady state
+        steady_samples = []
+        # the steady state is checked on as many samples as a run measures,
+        # a run of a few samples doesn't need 10 warmups
+        steady_window = min(max(args.samples, _stats._STEADY_MIN_WINDOW),
+                            _stats._STEADY_WINDOW)
+        steady = False
         index = 1
         inner_loops = self.inner_loops or 1
         while True:
@@ -353,8 +464,16 @@ class TextRunner:
                 if loops > 2 ** 32:
                     raise ValueError("error in calibration, loops is "
                                      "too big: %s" % loops)
-                # need more samples for the calibration
-                nsample += 1
+                if not until_steady:
+                    # need more samples for the calibration
+                    nsample += 1
+            elif until_steady:
+                steady_samples.append(sample)
+                if _stats.is_steady_state(steady_samples, steady_window):
+                    if args.verbose:
+                        print("Steady state reached", file=stream)
+                    steady = True
+                    break
 
             index += 1
 
@@ -362,6 +481,8 @@ class TextRunner:
             print(file=stream)
 
         # Run collects metadata
+        if until_steady:
+            return (loops, samples, steady)
         return (loops, samples)
 
     def _calibrate(self, bench, sample_func):
@@ -370,10 +491,14 @@ class TextRunner:
                                calibrate=True,
                                is_calibrate=True, is_warmup=True)
 
-    def _worker(self, bench, sample_func):
+    def _worker(self, bench, sample_func, name=None, metadata=None,
+                display=True):
         args = self.args
         loops = args.loops
-        metadata = dict(self.metadata)
+        if metadata is not None:
+            metadata = dict(self.metadata, **metadata)
+        else:
+            metadata = dict(self.metadata)
         start_time = perf.monotonic_clock()
 
         calibrate = (not loops)
@@ -397,7 +522,15 @@ class TextRunner:
             import tracemalloc
             tracemalloc.start()
 
-        if args.warmups:
+        if args.warmups == 'auto':
+            loops, warmups, steady = self._run_bench(bench, sample_func,
+                                                     loops, args.max_warmups,
+                                                     is_warmup=True,
+                                                     calibrate=calibrate,
+                                                     until_steady=True)
+            metadata['auto_warmups'] = len(warmups)
+            metadata['steady_state'] = int(steady)
+        elif args.warmups:
             loops, warmups = self._run_bench(bench, sample_func, loops,
                                              args.warmups,
                                              is_warmup=True, calibrate=calibrate)
@@ -407,6 +540,8 @@ class TextRunner:
             warmups = calibrate_warmups + warmups
         loops, samples = self._run_bench(bench, sample_func, loops,
                                          args.samples)
+        if self._complete_run_metadata is not None:
+            self._complete_run_metadata(self, metadata)
 
         if args.tracemalloc:
             traced_peak = tracemalloc.get_traced_memory()[1]
@@ -438,14 +573,15 @@ class TextRunner:
 
         duration = perf.monotonic_clock() - start_time
         metadata['duration'] = duration
-        metadata['name'] = self.name
+        metadata['name'] = name or self.name
         metadata['loops'] = loops
         if self.inner_loops is not None and self.inner_loops != 1:
             metadata['inner_loops'] = self.inner_loops
 
         run = perf.Run(samples, warmups=warmups, metadata=metadata)
         bench.add_run(run)
-        self._display_result(bench, check_unstable=False)
+        if display:
+            self._display_result(bench, check_unstable=False)
 
         # Save loops into args
         args.loops = loops
@@ -460,6 +596,8 @@ class TextRunner:
         try:
             if args.worker:
                 self._worker(bench, sample_func)
+            elif len(self._matrix) > 1:
+                return self._spawn_workers_matrix()
             else:
                 self._spawn_workers(bench, sample_func)
         except KeyboardInterrupt:
@@ -468,6 +606,153 @@ class TextRunner:
 
         return bench
 
+    def _worker_suite(self, sample_funcs):
+        args = self.args
+        nfunc = len(sample_funcs)
+        if args.worker_loops:
+            if len(args.worker_loops) != nfunc:
+                raise ValueError("--worker-loops expects %s values" % nfunc)
+            loops_list = args.worker_loops
+        else:
+            loops_list = [args.loops] * nfunc
+
+        # Rotate the order of benchmarks in each worker to not always run the
+        # same benchmark first
+        benchmarks = [None] * nfunc
+        for shift in range(nfunc):
+            index = (args.worker_rotate + shift) % nfunc
+            name, sample_func, metadata = sample_funcs[index]
+            args.loops = loops_list[index]
+            bench = perf.Benchmark()
+            self._worker(bench, sample_func, name, metadata, display=False)
+            benchmarks[index] = bench
+
+        suite = perf.BenchmarkSuite()
+        for bench in benchmarks:
+            suite.add_benchmark(bench)
+        self._display_suite_result(suite, check_unstable=False)
+
+    def _spawn_workers_matrix(self, names=None):
+        """Spawn workers of all configurations of the matrix.
+
+        names is the list of benchmark names of a suite, or None for a single
+        benchmark. Configurations are interleaved: each round spawns one
+        worker per configuration, starting with a different configuration,
+        to spread the drift of the system over all configurations. Return a
+        BenchmarkSuite with one benchmark per benchmark and configuration.
+        With a single configuration, benchmarks are not renamed.
+        """
+        args = self.args
+        verbose = args.verbose
+        quiet = args.quiet
+        stream = self._stream()
+        nprocess = args.processes
+        matrix = self._matrix
+        nconfig = len(matrix)
+        if names is not None:
+            nfunc = len(names)
+        else:
+            nfunc = 1
+
+        def format_name(name, config):
+            if nconfig > 1:
+                return '%s [%s]' % (name, config.label)
+            else:
+                return name
+
+        # loops of each benchmark of each configuration, calibrated by the
+        # first worker of the configuration
+        loops_lists = [[args.loops] * nfunc for config in matrix]
+        benchmarks = [collections.OrderedDict() for config in matrix]
+
+        for process in range(nprocess):
+            for shift in range(nconfig):
+                index = (process + shift) % nconfig
+                config = matrix[index]
+                loops_list = loops_lists[index]
+                if names is not None:
+                    worker_suite = self._spawn_worker_suite(loops_list,
+                                                            process % nfunc,
+                                                            config)
+                else:
+                    args.loops = loops_list[0]
+                    worker_suite = self._spawn_worker_suite(config=config)
+
+                for func_index, worker_bench in enumerate(worker_suite):
+                    name = worker_bench.get_name()
+                    bench = benchmarks[index].get(name)
+                    if bench is None:
+                        bench = perf.Benchmark()
+                        benchmarks[index][name] = bench
+                    bench.add_runs(worker_bench)
+
+                    if verbose:
+                        run = bench.get_runs()[-1]
+                        run_index = ('%s %s/%s'
+                                     % (format_name(name, config),
+                                        1 + process, nprocess))
+                        display_run(bench, run_index, run, file=stream)
+
+                    if not loops_list[func_index]:
+                        # Use the first worker to calibrate each benchmark
+                        first_run = worker_bench.get_runs()[0]
+                        loops_list[func_index] = first_run._get_loops()
+                        if verbose:
+                            print("Calibration of %s: use %s loops"
+                                  % (format_name(name, config),
+                                     format_number(loops_list[func_index])),
+                                  file=stream)
+
+                    if self.inner_loops is None:
+                        # all benchmarks and configurations use the same
+                        # number of inner loops
+                        first_run = worker_bench.get_runs()[0]
+                        self.inner_loops = first_run._get_inner_loops()
+
+            if not verbose and not quiet:
+                print(".", end='', file=stream)
+                stream.flush()
+
+        if not quiet:
+            print(file=stream)
+
+        suite = perf.BenchmarkSuite()
+        for config, config_benchmarks in zip(matrix, benchmarks):
+            for name, bench in config_benchmarks.items():
+                if nconfig > 1:
+                    bench.update_metadata({'name': format_name(name, config)})
+                if args.warmups == 'auto':
+                    self._warn_steady_state(bench)
+                suite.add_benchmark(bench)
+        self._display_suite_result(suite)
+        return suite
+
+    def _bench_sample_funcs(self, sample_funcs):
+        """Benchmark multiple functions: return a BenchmarkSuite.
+
+        sample_funcs is a list of (name, sample_func, metadata) tuples,
+        metadata is a dict or None. Each worker process runs all functions
+        (see bench_sample_func()), so all benchmarks use the same processes.
+        """
+        if not sample_funcs:
+            raise ValueError("need at least one sample function")
+        names = [name for name, sample_func, metadata in sample_funcs]
+        if len(set(names)) != len(names):
+            raise ValueError("benchmark names must be unique")
+
+        args = self.parse_args()
+        self._cpu_affinity()
+
+        try:
+            if args.worker:
+                self._worker_suite(sample_funcs)
+                return None
+            else:
+                return self._spawn_workers_matrix(names)
+        except KeyboardInterrupt:
+            print("Interrupted: exit", file=sys.stderr)
+            sys.exit(1)
+
     def bench_sample_func(self, sample_func, *args):
         """"Benchmark sample_func(loops, *args)
 
@@ -540,16 +825,24 @@ class TextRunner:
                 env[name] = os.environ[name]
         return env
 
-    def _spawn_worker_suite(self):
+    def _spawn_worker_suite(self, loops_list=None, rotate=0, config=None):
         args = self.args
+        if config is None:
+            config = self._matrix[0]
 
         cmd = []
-        cmd.extend(self.program_args)
+        cmd.append(config.python or self.program_args[0])
+        cmd.extend(config.flags)
+        cmd.extend(self.program_args[1:])
         cmd.extend(('--worker', '--stdout',
                      '--samples', str(args.samples),
                      '--warmups', str(args.warmups),
+                     '--max-warmups', str(args.max_warmups),
                      '--loops', str(args.loops),
                      '--min-time', str(args.min_time)))
+        if loops_list is not None:
+            cmd.extend(('--worker-loops', ','.join(map(str, loops_list)),
+                        '--worker-rotate', str(rotate)))
         if args.verbose:
             cmd.append('-' + 'v' * args.verbose)
         if args.affinity:
@@ -563,6 +856,7 @@ class TextRunner:
             self.prepare_subprocess_args(self, cmd)
 
         env = self._create_environ()
+        env.update(config.environ)
         stdout = _run_cmd(cmd, env=env)
         return perf.BenchmarkSuite.loads(stdout)
 
@@ -613,6 +907,64 @@ class TextRunner:
         if args.output:
             bench.dump(args.output)
 
+    def _display_suite_result(self, suite, check_unstable=True):
+        stream = self._stream()
+        args = self.args
+
+        if self.args.quiet:
+            check_unstable = False
+        benchmarks = list(suite)
+        for index, bench in enumerate(benchmarks):
+            if index:
+                print(file=stream)
+            name = bench.get_name()
+            print(name, file=stream)
+            print('-' * len(name), file=stream)
+            print(file=stream)
+            display_benchmark(bench,
+                              file=stream,
+                              check_unstable=check_unstable,
+                              metadata=args.metadata,
+                              dump=args.dump,
+                              stats=args.stats,
+                              hist=args.hist)
+        if len(benchmarks) > 1:
+            print(file=stream)
+            display_ranking(benchmarks, file=stream)
+
+        stream.flush()
+        if args.append:
+            perf.add_runs(args.append, suite)
+
+        if args.stdout:
+            try:
+                suite.dump(sys.stdout)
+            except IOError as exc:
+                if exc.errno != errno.EPIPE:
+                    raise
+                # ignore broken pipe error
+                try:
+                    sys.stdout.close()
+                except IOError:
+                    pass
+
+        if args.output:
+            suite.dump(args.output)
+
+    def _warn_steady_state(self, bench):
+        nrun = 0
+        for run in bench.get_runs():
+            if run._get_metadata('steady_state', 1) == 0:
+                nrun += 1
+        if nrun:
+            print("WARNING: %s runs reached the maximum number of warmups "
+                  "(%s) before the steady state"
+                  % (nrun, self.args.max_warmups),
+                  file=self._stream())
+            print("Try to rerun the benchmark with more warmups "
+                  "(--max-warmups)", file=self._stream())
+            print(file=self._stream())
+
     def _spawn_workers(self, bench, sample_func):
         args = self.args
         verbose = args.verbose
@@ -642,7 +994,15 @@ class TextRunner:
                     print("Calibration: use %s loops" % format_number(args.loops),
                           file=stream)
 
+            if self.inner_loops is None:
+                # The first worker can also compute the number of inner
+                # loops, ex: "perf timeit --inner-loops=auto"
+                self.inner_loops = worker_bench.get_runs()[0]._get_inner_loops()
+
         if not quiet:
             print(file=stream)
 
+        if args.warmups == 'auto':
+            self._warn_steady_state(bench)
+
         self._display_result(bench)